@@ -1,53 +1,247 @@
+ROUND_HALF_EVEN = 'ROUND_HALF_EVEN'
+ROUND_HALF_UP = 'ROUND_HALF_UP'
+ROUND_DOWN = 'ROUND_DOWN'
+ROUND_UP = 'ROUND_UP'
+ROUND_FLOOR = 'ROUND_FLOOR'
+ROUND_CEILING = 'ROUND_CEILING'
+
+MIN_SCALE = 2
+
+
 class ExactFloat:
+    '''Exact decimal number stored as a scaled integer: value = scaled / 10**scale'''
+    __slots__ = ('scaled', 'scale')
+
     def __init__(self, number):
-        self.sign = True if number[0] != '-' else False
-        if number[0] == '-' or number[0] == '+':
+        if isinstance(number, ExactFloat):
+            self.scaled = number.scaled
+            self.scale = number.scale
+            return
+        if isinstance(number, int):
+            self.scaled = number * 10 ** MIN_SCALE
+            self.scale = MIN_SCALE
+            return
+        number = number.strip()
+        negative = number[0] == '-'
+        if negative or number[0] == '+':
             number = number[1:]
-        number_parts = number.split('.')
-        self.decimal = str(int(number_parts[0])) if len(number_parts[0]) else '0'
-        aux_fraction = number_parts[1] if len(number_parts) > 1 else '00'
-        self.fraction = aux_fraction if len(aux_fraction)>1 else f'{aux_fraction}0'
+        decimal, _, fraction = number.partition('.')
+        digits = decimal + fraction
+        if not digits.isdigit():
+            raise ValueError(f'invalid literal for ExactFloat: {number!r}')
+        scale = len(fraction)
+        scaled = int(digits)
+        if scale < MIN_SCALE:
+            scaled *= 10 ** (MIN_SCALE - scale)
+            scale = MIN_SCALE
+        self.scaled = -scaled if negative else scaled
+        self.scale = scale
+
+    @classmethod
+    def from_scaled(cls, scaled, scale=MIN_SCALE):
+        '''Build an ExactFloat from an already scaled integer, e.g. cents with scale 2'''
+        result = cls.__new__(cls)
+        result.scaled = scaled
+        result.scale = scale
+        return result
+
+    @staticmethod
+    def sum(iterable):
+        '''Sum ExactFloat (or numeric string) values without building intermediate objects'''
+        scaled = 0
+        scale = MIN_SCALE
+        for value in iterable:
+            if not isinstance(value, ExactFloat):
+                value = ExactFloat(value)
+            if value.scale == scale:
+                scaled += value.scaled
+            elif value.scale < scale:
+                scaled += value.scaled * 10 ** (scale - value.scale)
+            else:
+                scaled = scaled * 10 ** (value.scale - scale) + value.scaled
+                scale = value.scale
+        return ExactFloat.from_scaled(scaled, scale)
+
+    @property
+    def sign(self):
+        return self.scaled >= 0
+
+    @property
+    def decimal(self):
+        return str(abs(self.scaled) // 10 ** self.scale)
+
+    @property
+    def fraction(self):
+        return str(abs(self.scaled) % 10 ** self.scale).rjust(self.scale, '0')
 
     def copy(self):
-        return(ExactFloat(self.__str__()))
+        return ExactFloat.from_scaled(self.scaled, self.scale)
+
+    def rescale(self, scale, rounding=ROUND_HALF_EVEN):
+        '''Return a copy with the given number of fraction digits, rounding if digits are dropped'''
+        if scale >= self.scale:
+            return ExactFloat.from_scaled(self.scaled * 10 ** (scale - self.scale), scale)
+        return ExactFloat.from_scaled(round_division(self.scaled, 10 ** (self.scale - scale), rounding), scale)
+
+    def divide(self, obj, scale=None, rounding=ROUND_HALF_EVEN):
+        '''Divide by obj and round the quotient to scale fraction digits (default: the larger operand scale)'''
+        obj = _coerce(obj)
+        if obj is NotImplemented:
+            raise TypeError('ExactFloat can only be divided by ExactFloat or int')
+        if obj.scaled == 0:
+            raise ZeroDivisionError('ExactFloat division by zero')
+        if scale is None:
+            scale = max(self.scale, obj.scale)
+        numerator = self.scaled * 10 ** (scale + obj.scale)
+        denominator = obj.scaled * 10 ** self.scale
+        return ExactFloat.from_scaled(round_division(numerator, denominator, rounding), scale)
 
     def __add__(self, obj):
-        addend1, addend2, float_len = format_variables(self, obj)
-        result = str(addend1 + addend2)
-        decimal, fraction, sign = format_result(result, float_len)
-        return ExactFloat(f'{sign}{decimal}.{fraction}')
+        obj = _coerce(obj)
+        if obj is NotImplemented:
+            return obj
+        addend1, addend2, scale = align(self, obj)
+        return ExactFloat.from_scaled(addend1 + addend2, scale)
+
+    __radd__ = __add__
 
     def __sub__(self, obj):
-        minuend, subtrahend, float_len = format_variables(self, obj)
-        result = str(minuend - subtrahend)
-        decimal, fraction, sign = format_result(result, float_len)
-        return ExactFloat(f'{sign}{decimal}.{fraction}')
+        obj = _coerce(obj)
+        if obj is NotImplemented:
+            return obj
+        minuend, subtrahend, scale = align(self, obj)
+        return ExactFloat.from_scaled(minuend - subtrahend, scale)
+
+    def __rsub__(self, obj):
+        obj = _coerce(obj)
+        if obj is NotImplemented:
+            return obj
+        return obj - self
+
+    def __mul__(self, obj):
+        if isinstance(obj, int) and not isinstance(obj, bool):
+            return ExactFloat.from_scaled(self.scaled * obj, self.scale)
+        obj = _coerce(obj)
+        if obj is NotImplemented:
+            return obj
+        return ExactFloat.from_scaled(self.scaled * obj.scaled, self.scale + obj.scale)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, obj):
+        return self.divide(obj)
+
+    def __neg__(self):
+        return ExactFloat.from_scaled(-self.scaled, self.scale)
+
+    def __pos__(self):
+        return self.copy()
+
+    def __abs__(self):
+        return ExactFloat.from_scaled(abs(self.scaled), self.scale)
+
+    def __bool__(self):
+        return self.scaled != 0
+
+    def __eq__(self, obj):
+        if obj.__class__ is not ExactFloat or obj.scale != self.scale:
+            obj = _coerce(obj)
+            if obj is NotImplemented:
+                return obj
+            value1, value2, _ = align(self, obj)
+            return value1 == value2
+        return self.scaled == obj.scaled
+
+    def __lt__(self, obj):
+        if obj.__class__ is not ExactFloat or obj.scale != self.scale:
+            obj = _coerce(obj)
+            if obj is NotImplemented:
+                return obj
+            value1, value2, _ = align(self, obj)
+            return value1 < value2
+        return self.scaled < obj.scaled
+
+    def __le__(self, obj):
+        if obj.__class__ is not ExactFloat or obj.scale != self.scale:
+            obj = _coerce(obj)
+            if obj is NotImplemented:
+                return obj
+            value1, value2, _ = align(self, obj)
+            return value1 <= value2
+        return self.scaled <= obj.scaled
+
+    def __gt__(self, obj):
+        if obj.__class__ is not ExactFloat or obj.scale != self.scale:
+            obj = _coerce(obj)
+            if obj is NotImplemented:
+                return obj
+            value1, value2, _ = align(self, obj)
+            return value1 > value2
+        return self.scaled > obj.scaled
+
+    def __ge__(self, obj):
+        if obj.__class__ is not ExactFloat or obj.scale != self.scale:
+            obj = _coerce(obj)
+            if obj is NotImplemented:
+                return obj
+            value1, value2, _ = align(self, obj)
+            return value1 >= value2
+        return self.scaled >= obj.scaled
+
+    def __hash__(self):
+        '''Equal values hash equally whatever their scale (1.5 == 1.50) and whole values like the int they equal'''
+        scaled, scale = self.scaled, self.scale
+        while scale and scaled % 10 == 0:
+            scaled //= 10
+            scale -= 1
+        return hash(scaled) if scale == 0 else hash((scaled, scale))
+
+    def __repr__(self):
+        return f"ExactFloat('{self}')"
 
     def __str__(self):
-        symbol = '' if self.sign else '-'
-        fraction = str(self.fraction) if len(str(self.fraction)) >= 2 else str(self.fraction) + '0'
-        return f'{symbol}{self.decimal}.{fraction}'
-
-
-def format_variables(var1:ExactFloat, var2:ExactFloat):
-    var1_fraction = var1.fraction + ('0' *(len(var1.fraction) - len(var2.fraction)))
-    var2_fraction = var2.fraction + ('0' *(len(var2.fraction) - len(var1.fraction)))
-    var1_total = int(var1.decimal + var1_fraction)
-    var1_total = var1_total if var1.sign else var1_total * -1
-
-    var2_total = int(var2.decimal + var2_fraction)
-    var2_total = var2_total if var2.sign else var2_total * -1
-    return var1_total, var2_total, len(var1_fraction)
-
-def format_result(result, float_len):
-    sign = ''
-    if result[0] == '-':
-        sign = '-'
-        result = result[1:]
-    if len(result) <= float_len:
-        fraction = ('0' *(float_len - len(result))) + result
-        decimal = '0'
-    else:
-        fraction = result[len(result) - float_len:]
-        decimal = result[:len(result) - float_len]
-    return decimal, fraction, sign
\ No newline at end of file
+        decimal, fraction = divmod(abs(self.scaled), 10 ** self.scale)
+        symbol = '-' if self.scaled < 0 else ''
+        return f'{symbol}{decimal}.{fraction:0{self.scale}d}'
+
+
+def _coerce(obj):
+    if isinstance(obj, ExactFloat):
+        return obj
+    if isinstance(obj, int) and not isinstance(obj, bool):
+        return ExactFloat.from_scaled(obj * 10 ** MIN_SCALE)
+    return NotImplemented
+
+def align(var1:ExactFloat, var2:ExactFloat):
+    '''Return both scaled integers expressed at the larger of the two scales, and that scale'''
+    if var1.scale == var2.scale:
+        return var1.scaled, var2.scaled, var1.scale
+    if var1.scale > var2.scale:
+        return var1.scaled, var2.scaled * 10 ** (var1.scale - var2.scale), var1.scale
+    return var1.scaled * 10 ** (var2.scale - var1.scale), var2.scaled, var2.scale
+
+def round_division(numerator, denominator, rounding=ROUND_HALF_EVEN):
+    '''Integer division of numerator by denominator rounded with the given rounding mode'''
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)
+    if remainder == 0:
+        return quotient
+    if rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return quotient + 1 if quotient < 0 else quotient
+    if rounding == ROUND_UP:
+        return quotient if quotient < 0 else quotient + 1
+    double = remainder * 2
+    if double > denominator:
+        return quotient + 1
+    if double < denominator:
+        return quotient
+    if rounding == ROUND_HALF_UP:
+        return quotient if quotient < 0 else quotient + 1
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + (quotient & 1)
+    raise ValueError(f'Unknown rounding mode {rounding}')
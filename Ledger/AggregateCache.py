@@ -0,0 +1,155 @@
+import os
+import json
+
+from ExactCalc.ExactFloat import ExactFloat, MIN_SCALE
+from Ledger.Files import get_file_stamp, get_sidecar_path, write_atomic
+from Ledger.Journal import Journal
+from Ledger.Profile import timed
+
+KEY_SEPARATOR = '\t'
+
+
+def get_cache_path(tsv_path):
+    '''File holding the aggregates of a TSV ledger, e.g. finance.csv -> finance.aggregates.json'''
+    return get_sidecar_path(tsv_path, '.aggregates.json')
+
+def get_bucket_key(row):
+    '''Return ("yyyy-mm", "category<TAB>essential") for a ledger row with Date stored as yyyy-mm-dd'''
+    return str(row['Date'])[:7], f"{row['Category'] or ''}{KEY_SEPARATOR}{row['Essential'] or ''}"
+
+def format_total(total, scale):
+    '''Decimal string of an integer total in units of 10**-scale, without fraction zeros past MIN_SCALE digits'''
+    while scale > MIN_SCALE and total % 10 == 0:
+        total //= 10
+        scale -= 1
+    return str(ExactFloat.from_scaled(total, scale))
+
+
+class AggregateCache:
+    '''Exact totals and row counts of a bill ledger per (year, month, category, essential).
+
+    The cache remembers size and mtime of the ledger it was computed from. Open it before
+    writing to the ledger: if it was current, add()/remove() keep it current, otherwise it is
+    rebuilt on the next lookup. A journaled delete calls remove() with the number of rows its
+    tombstone hides; when they cannot be counted, invalidate() marks the month stale and it is
+    recomputed on its next lookup.
+    '''
+    def __init__(self, tsv_path, fields):
+        self.tsv_path = tsv_path
+        self.cache_path = get_cache_path(tsv_path)
+        self.fields = fields
+        self.months = dict()
+        self.stale = set()
+        self.current = False
+        if os.path.exists(self.cache_path) and os.path.exists(tsv_path):
+            with open(self.cache_path, 'r') as file:
+                data = json.load(file)
+            if data['source'] == get_file_stamp(tsv_path):
+                '''Totals stay strings until a bucket is updated or summed'''
+                self.months = data['months']
+                self.stale = set(data.get('stale', []))
+                self.current = True
+
+    @timed('aggregate cache rebuild')
+    def rebuild(self):
+        '''Recompute every bucket from the ledger in one grouped pass over integer totals and save the cache'''
+        import pandas as pd
+        from Ledger.ColumnStore import to_scaled
+        table = pd.read_csv(self.tsv_path, sep='\t', header=0, dtype=str, keep_default_na=False)
+        dates = table['Date']
+        table['Date'] = pd.to_datetime(dates)
+        table = Journal(self.tsv_path, self.fields).apply(table)
+        totals, scale = to_scaled(table['Total'])
+        grouped = pd.DataFrame({
+            'Month': dates[table.index].str[:7], 'Category': table['Category'], 'Essential': table['Essential'], 'Total': totals
+        }).groupby(['Month', 'Category', 'Essential'], sort=False)['Total'].agg(['sum', 'count'])
+        months = dict()
+        for (month, category, essential), total, count in zip(grouped.index, grouped['sum'].tolist(), grouped['count'].tolist()):
+            months.setdefault(month, dict())[f'{category}{KEY_SEPARATOR}{essential}'] = [format_total(total, scale), count]
+        self.months = months
+        self.stale = set()
+        self.current = True
+        self.save()
+
+    def save(self):
+        '''Write the cache stamped with the current size and mtime of the ledger'''
+        data = {
+            'source': get_file_stamp(self.tsv_path),
+            'months': {month: {key: [str(total), count] for key, (total, count) in buckets.items()} for month, buckets in self.months.items()},
+            'stale': sorted(self.stale)
+        }
+        write_atomic(self.cache_path, json.dumps(data))
+
+    def update(self, row, count):
+        '''Add count times row (a dict with Category, Essential, Date and Total) to its bucket'''
+        month, key = get_bucket_key(row)
+        buckets = self.months.setdefault(month, dict())
+        total, rows = buckets.get(key, [ExactFloat('0'), 0])
+        total = ExactFloat(total) + ExactFloat(str(row['Total'])) * count
+        rows += count
+        if rows:
+            buckets[key] = [total, rows]
+        else:
+            buckets.pop(key, None)
+
+    def add(self, row, count=1):
+        '''Record rows appended to the ledger, call after writing them'''
+        if self.current:
+            self.update(row, count)
+            self.save()
+
+    def add_rows(self, rows):
+        '''Record many rows appended to the ledger at once, call after writing them'''
+        if self.current:
+            added = dict()
+            for row in rows:
+                month, key = get_bucket_key(row)
+                added.setdefault(month, dict()).setdefault(key, []).append(row['Total'])
+            for month, buckets in added.items():
+                for key, totals in buckets.items():
+                    total, count = self.months.setdefault(month, dict()).get(key, [ExactFloat('0'), 0])
+                    self.months[month][key] = [ExactFloat(total) + ExactFloat.sum(totals), count + len(totals)]
+            self.save()
+
+    def remove(self, row, count=1):
+        '''Record rows removed from the ledger, call after writing the ledger'''
+        if self.current:
+            self.update(row, -count)
+            self.save()
+
+    def invalidate(self, row):
+        '''Mark the month of row (a dict with Date) as stale after a deletion whose rows could not be counted'''
+        if self.current:
+            self.stale.add(get_bucket_key(row)[0])
+            self.save()
+
+    def frame(self, first_month, last_month):
+        '''DataFrame of the buckets of months first_month to last_month ("yyyy-mm") with columns Month, Category,
+        Essential, Total (exact int64 in units of 10**-scale) and Count. Return (DataFrame, scale)'''
+        import pandas as pd
+        from Ledger.ColumnStore import to_scaled
+        if not self.current or any(first_month <= month <= last_month for month in self.stale):
+            self.rebuild()
+        rows = [
+            [month, *key.split(KEY_SEPARATOR), str(total), count]
+            for month, buckets in self.months.items() if first_month <= month <= last_month
+            for key, (total, count) in buckets.items()
+        ]
+        table = pd.DataFrame(rows, columns=['Month', 'Category', 'Essential', 'Total', 'Count'])
+        table['Total'], scale = to_scaled(table['Total'])
+        table['Count'] = table['Count'].astype('int64')
+        return table, scale
+
+    def total(self, year, month, query=None):
+        '''Return (ExactFloat total, row count) for a month, of the buckets whose Category and Essential satisfy query
+        (a Ledger.Query Query on those fields) when given'''
+        import pandas as pd
+        month_key = f'{int(year):04d}-{int(month):02d}'
+        if not self.current or month_key in self.stale:
+            self.rebuild()
+        buckets = list(self.months.get(month_key, dict()).items())
+        '''Empty values are NaN in the ledger table the query is also evaluated on'''
+        keys = pd.DataFrame([key.split(KEY_SEPARATOR) for key, _ in buckets], columns=['Category', 'Essential']).replace('', None)
+        mask = query.mask(keys) if query is not None else [True] * len(buckets)
+        matched = [bucket for bucket, keep in zip(buckets, mask) if keep]
+        return ExactFloat.sum([total for _, (total, _) in matched]), sum(rows for _, (_, rows) in matched)
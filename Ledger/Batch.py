@@ -0,0 +1,75 @@
+'''Same command run over the ledgers of many directories (each with its finance.csv and savings.csv) with a pool of processes.
+
+Directories are sent to the workers in chunks, so a worker keeps pandas and the modules it needs imported and
+answers many ledgers per task. Every ledger runs on its own: the error it raises is returned with its directory
+instead of a result and the other ledgers go on. If a worker process dies the pool stops and the ledgers not
+answered yet fail with an error too. Results come back in the order of the directories.
+'''
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+'''Most ledgers sent to a worker at once'''
+MAX_CHUNK = 64
+
+
+def read_directories(path):
+    '''Ledger directories listed in file path (- for standard input), one per line. Blank lines and lines starting
+    with # are skipped'''
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r') as file:
+            lines = file.read().splitlines()
+    directories = [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+    if not directories:
+        raise ValueError('Ledger directories not defined.')
+    return directories
+
+def get_ledger_names(directories):
+    '''Names of the ledgers of directories in a combined result: their path from the directory holding all of them,
+    e.g. /home/ana/finances, /home/luis/finances -> ana/finances, luis/finances'''
+    if not directories:
+        return []
+    paths = [os.path.abspath(os.path.expanduser(directory)) for directory in directories]
+    common = os.path.commonpath(paths)
+    root = os.path.dirname(common) if common in paths else common
+    return [os.path.relpath(path, root) for path in paths]
+
+def get_error(error):
+    '''Message of an exception for the result of a ledger'''
+    return str(error) or type(error).__name__
+
+def run_chunk(task):
+    '''Run function(*ledger) on every ledger of a chunk, in a worker process. Return list of (result, error)'''
+    function, ledgers = task
+    results = []
+    for ledger in ledgers:
+        try:
+            results.append((function(*ledger), None))
+        except Exception as error:
+            results.append((None, get_error(error)))
+    return results
+
+def run_ledgers(function, ledgers, workers=None, chunk_size=None):
+    '''Run function(*ledger) (a picklable module level function) on every ledger (tuple of arguments) with up to
+    workers processes, all CPUs when None. Return list of (result, None) or (None, error message), in the order of
+    ledgers'''
+    if not ledgers:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(ledgers))
+    chunk_size = chunk_size or min(max(len(ledgers) // (workers * 4), 1), MAX_CHUNK)
+    chunks = [ledgers[start:start + chunk_size] for start in range(0, len(ledgers), chunk_size)]
+    if workers <= 1:
+        return [result for chunk in chunks for result in run_chunk((function, chunk))]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_chunk, (function, chunk)) for chunk in chunks]
+        for future, chunk in zip(futures, chunks):
+            try:
+                results.extend(future.result())
+            except BrokenProcessPool:
+                results.extend((None, 'Worker process stopped.') for _ in chunk)
+    return results
@@ -0,0 +1,118 @@
+'''Bulk delete and update of the rows of a TSV ledger matching a Query, in one streaming pass.
+
+The ledger is read in chunks of CHUNK_SIZE lines. Each chunk is typed (Ledger.Schema), the journal
+is applied with cutoffs computed once and the query evaluated as one mask, so the cost is linear in
+the size of the ledger whatever the number of matching rows. Rows that do not match are copied as
+their original line, matching rows are dropped (delete) or written with the changed fields (update)
+and rows deleted by the journal are dropped too, so the rewrite also compacts the ledger. The new
+file replaces the ledger with one rename and the journal is removed, like Journal.compact.
+'''
+
+import io
+import os
+import csv
+import stat
+from itertools import compress
+
+import numpy as np
+import pandas as pd
+
+from Ledger.Files import CHUNK_SIZE, get_temp_path, is_blank, read_chunks
+from Ledger.Journal import Journal
+from Ledger.Profile import timed, count_rows
+from Ledger.Schema import read_frame, to_typed
+from Ledger.Writer import FSYNC_ALWAYS, recover, sync, sync_directory
+
+'''Line end and characters that make csv.writer quote a value, with the default dialect ledgers are written with'''
+LINE_END = '\r\n'
+SPECIAL_CHARACTERS = ('\t', '"', '\r', '\n')
+
+
+def read_rows(lines, header, start):
+    '''Typed DataFrame (see Ledger.Schema) of ledger lines without the header, indexed by row position from start.
+    The C parser reads the lines, like read_typed'''
+    table = read_frame(io.StringIO(''.join(lines)), sep='\t', header=None, names=header, keep_default_na=False)
+    table.index = pd.RangeIndex(start, start + len(table))
+    return to_typed(table)
+
+def needs_quotes(value):
+    '''True if csv.writer quotes value'''
+    return any(character in value for character in SPECIAL_CHARACTERS)
+
+def format_line(line, columns, plain=False):
+    '''Ledger line with the values of columns (dict column number -> value as stored in the TSV) replaced.
+    With plain (no new value needs quotes) lines without quotes are split and joined directly, the csv module
+    handles the others'''
+    if plain and '"' not in line:
+        values = line.rstrip('\r\n').split('\t')
+        for column, value in columns.items():
+            values[column] = value
+        return '\t'.join(values) + LINE_END
+    values = next(csv.reader([line], delimiter='\t'))
+    for column, value in columns.items():
+        values[column] = value
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter='\t').writerow(values)
+    return buffer.getvalue()
+
+@timed('bulk rewrite')
+def rewrite_ledger(tsv_path, fields, query, changes=None, dry_run=False, fsync=FSYNC_ALWAYS, chunk_size=CHUNK_SIZE, moved=None):
+    '''Delete the live rows of the ledger matching query or, with changes (dict field -> value as stored in the TSV),
+    set those fields on them. Return the number of matching rows; with dry_run only count them. With moved (a list)
+    updated rows are appended to it as lines instead of written back, for rows that belong to another ledger.
+    Call holding the ledger lock'''
+    journal = Journal(tsv_path, fields)
+    cutoffs = journal.cutoffs()
+    if not dry_run:
+        recover(tsv_path, fsync)
+    temp_path = None if dry_run else get_temp_path(tsv_path)
+    matched = 0
+    try:
+        with open(tsv_path, 'r', newline='') as file, open(temp_path or os.devnull, 'w', newline='') as temp_file:
+            header_line = file.readline()
+            header = next(csv.reader([header_line], delimiter='\t'))
+            temp_file.write(header_line)
+            columns = {header.index(field): value for field, value in (changes or dict()).items()}
+            plain = not any(needs_quotes(value) for value in columns.values())
+            position = 0
+            for lines in read_chunks(file, chunk_size):
+                '''Blank lines are not rows, like for read_csv'''
+                lines = [line for line in lines if not is_blank(line)]
+                if not lines:
+                    continue
+                table = read_rows(lines, header, position)
+                position += len(lines)
+                live = journal.apply(table, cutoffs) if cutoffs else table
+                mask = query.mask(live)
+                matched += int(mask.sum())
+                count_rows(len(lines))
+                if dry_run:
+                    continue
+                '''Positions in the chunk of the live rows, the others were deleted by the journal'''
+                offsets = live.index.to_numpy() - position + len(lines)
+                keep = np.zeros(len(lines), dtype=bool)
+                keep[offsets[~mask]] = True
+                if changes and moved is not None:
+                    moved.extend(format_line(lines[row], columns, plain) for row in offsets[mask].tolist())
+                elif changes:
+                    keep[offsets[mask]] = True
+                    for row in offsets[mask].tolist():
+                        lines[row] = format_line(lines[row], columns, plain)
+                temp_file.writelines(compress(lines, keep))
+            if dry_run:
+                return matched
+            if not matched and not cutoffs:
+                '''Nothing to change: keep the ledger (and every cache stamped with it) as it is'''
+                os.remove(temp_path)
+                return 0
+            os.chmod(temp_path, stat.S_IMODE(os.stat(tsv_path).st_mode))
+            sync(temp_file, fsync)
+        os.replace(temp_path, tsv_path)
+    except BaseException:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    sync_directory(tsv_path, fsync)
+    if os.path.exists(journal.journal_path):
+        os.remove(journal.journal_path)
+    return matched
@@ -0,0 +1,212 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from ExactCalc.ExactFloat import ExactFloat, MIN_SCALE
+from Ledger.Files import CATEGORY_COLUMNS, DATE_COLUMN, MERGE_THRESHOLD, STORE_SUFFIX, TOTAL_COLUMN, TSV_DATE_FORMAT, get_sidecar_path
+from Ledger.Journal import normalize_total
+from Ledger.Sidecar import Sidecar, read_appended_rows
+
+'''Version of the store layout, stores of another version are rebuilt'''
+FORMAT_VERSION = 2
+
+
+def get_store_path(tsv_path):
+    '''Directory holding the columnar copy of a TSV ledger, e.g. finance.csv -> finance.cols'''
+    return get_sidecar_path(tsv_path, STORE_SUFFIX)
+
+def to_scaled(series, scale=None):
+    '''Convert a Series of decimal strings ("12.5", "-3", ".75") to exact int64 integers in units of 10**-scale,
+    scale being the largest number of fraction digits when None. Return (array, scale), raise ValueError if not valid'''
+    if not len(series):
+        return np.zeros(0, dtype=np.int64), MIN_SCALE if scale is None else scale
+    values = np.char.strip(series.astype(str).to_numpy().astype(str))
+    decimal, _, fraction = np.char.partition(values, '.').T
+    digits = np.char.lstrip(decimal, '+-')
+    negative = np.char.startswith(decimal, '-')
+    fraction = np.char.rstrip(fraction, '0')
+    valid = (np.char.str_len(decimal) - np.char.str_len(digits) <= 1) & (np.char.isdecimal(digits) | (digits == ''))
+    valid &= (np.char.isdecimal(fraction) | (fraction == '')) & ((digits != '') | (np.char.find(values, '.') >= 0))
+    valid &= (values != '.') & (values != '')
+    if scale is None:
+        scale = max(int(np.char.str_len(fraction[valid]).max()) if valid.any() else 0, MIN_SCALE)
+    valid &= np.char.str_len(fraction) <= scale
+    if not valid.all():
+        raise ValueError(f'Total not valid: {str(values[~valid][0])!r}')
+    digits = np.where(digits == '', '0', digits).astype(np.int64)
+    fraction = np.char.ljust(fraction, scale, '0').astype(np.int64)
+    scaled = digits * 10 ** scale + fraction
+    return np.where(negative, -scaled, scaled), scale
+
+def to_cents(series):
+    '''Convert a Series of decimal strings ("12.5", "-3", ".75") to exact int64 cents, raise ValueError otherwise'''
+    return to_scaled(series, 2)[0]
+
+def format_scaled(values, scale):
+    '''Format an array of int64 integers in units of 10**-scale as decimal strings with scale fraction digits'''
+    values = np.asarray(values, dtype=np.int64)
+    if not len(values):
+        return np.array([], dtype=str)
+    absolute = np.abs(values)
+    sign = np.where(values < 0, '-', '')
+    decimal = (absolute // 10 ** scale).astype(str)
+    fraction = np.char.zfill((absolute % 10 ** scale).astype(str), scale)
+    return np.char.add(np.char.add(np.char.add(sign, decimal), '.'), fraction)
+
+def format_cents(cents):
+    '''Format an array of int64 cents as decimal strings with two fraction digits'''
+    return format_scaled(cents, 2)
+
+def to_exact(values, scale=MIN_SCALE):
+    '''Object array of ExactFloat of an array of int64 integers in units of 10**-scale'''
+    exact = np.empty(len(values), dtype=object)
+    exact[:] = [ExactFloat.from_scaled(value, scale) for value in np.asarray(values).tolist()]
+    return exact
+
+def get_code_dtype(size):
+    '''Integer type pandas keeps the codes of a Categorical of size categories in, so they are used without a copy'''
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def encode_text(values, dictionary):
+    '''Codes of ledger strings values in dictionary (a list, extended with the values it does not hold yet), -1 for empty values'''
+    codes = {value: code for code, value in enumerate(dictionary)}
+    codes[''] = -1
+    for value in pd.unique(values):
+        if value not in codes:
+            codes[value] = len(dictionary)
+            dictionary.append(str(value))
+    return pd.Series(values).map(codes).to_numpy(dtype=get_code_dtype(len(dictionary)))
+
+def encode_columns(table, dictionaries, scale=None):
+    '''Return (stored columns as dict field -> array, scale of Total) of a DataFrame of ledger strings, text fields
+    coded into dictionaries. Totals are integers in units of 10**-scale, scale being the largest number of fraction
+    digits (at least cents) when None'''
+    columns = dict()
+    for field in table.columns:
+        if field == DATE_COLUMN:
+            dates = pd.to_datetime(table[field], format=TSV_DATE_FORMAT, errors='coerce')
+            if dates.isna().any():
+                raise ValueError('Date not valid in ledger.')
+            columns[field] = dates.to_numpy().astype('datetime64[ns]')
+        elif field == TOTAL_COLUMN:
+            columns[field], scale = to_scaled(table[field], scale)
+        else:
+            columns[field] = encode_text(table[field].to_numpy(dtype=object), dictionaries[field])
+    return columns, scale
+
+class ColumnStore(Sidecar):
+    '''Memory-mapped columnar copy of a TSV ledger.
+
+    Date is stored as datetime64[ns], Total as int64 cents (or in units of the finest total of the ledger, read back
+    as ExactFloat objects) and every other field as codes (of the
+    integer type pandas keeps Categorical codes in) into a per-column dictionary (-1 for empty values),
+    so the columns are handed to pandas as read-only memory maps without copying them. Like the date
+    index, rows appended to the ledger after the store was written form a tail that is parsed on each
+    read and merged into the store once it has MERGE_THRESHOLD rows; the store is rebuilt when the
+    ledger was rewritten rather than appended to.
+    '''
+    VERSION = FORMAT_VERSION
+
+    @property
+    def fields(self):
+        return self.meta['fields']
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def dictionaries(self):
+        return self.meta['dictionaries']
+
+    @property
+    def scale(self):
+        return self.meta.get('scale', MIN_SCALE)
+
+    @classmethod
+    def build(cls, tsv_path, directory=None):
+        '''Create (or replace) the columnar copy of tsv_path and return it'''
+        directory = directory or get_store_path(tsv_path)
+        size = os.path.getsize(tsv_path)
+        table = pd.read_csv(tsv_path, sep='\t', header=0, dtype=str, keep_default_na=False)
+        dictionaries = {field: [] for field in table.columns if field not in (DATE_COLUMN, TOTAL_COLUMN)}
+        columns, scale = encode_columns(table, dictionaries)
+        return cls.save(directory, tsv_path, list(table.columns), columns, dictionaries, size, scale)
+
+    @classmethod
+    def save(cls, directory, tsv_path, fields, columns, dictionaries, size, scale=MIN_SCALE):
+        '''Write columns (dict field -> array, Total in units of 10**-scale) covering the first size bytes of tsv_path
+        as the store in directory'''
+        store = cls(directory, dict())
+        store.write(tsv_path, {field: columns[field] for field in fields}, size, {
+            'fields': fields, 'rows': len(columns[fields[0]]) if fields else 0, 'dictionaries': dictionaries, 'scale': scale
+        })
+        return store
+
+    def read_tail(self, tsv_path):
+        '''Return (dict field -> array, dictionaries extended with their new values, size) of the rows appended to
+        tsv_path after the stored part'''
+        rows, _, size = read_appended_rows(tsv_path, self.meta['size'])
+        dictionaries = {field: list(values) for field, values in self.dictionaries.items()}
+        if not rows:
+            return None, dictionaries, size
+        return encode_columns(pd.DataFrame(rows, columns=self.fields), dictionaries, self.scale)[0], dictionaries, size
+
+    def read(self, tsv_path, columns=None):
+        '''Typed DataFrame of tsv_path (see Ledger.Schema), rows appended since the store was written included,
+        reading only the given columns. The tail is merged into the store once it has MERGE_THRESHOLD rows. The store
+        is rebuilt when the tail has totals finer than the stored ones'''
+        try:
+            tail, dictionaries, size = self.read_tail(tsv_path)
+        except ValueError:
+            return ColumnStore.build(tsv_path, self.directory).to_frame(columns)
+        if tail is not None and len(tail[self.fields[0]]) >= MERGE_THRESHOLD:
+            merged = {field: np.concatenate([self.column(field), tail[field]]) for field in self.fields}
+            store = ColumnStore.save(self.directory, tsv_path, self.fields, merged, dictionaries, size, self.scale)
+            return store.to_frame(columns)
+        return self.to_frame(columns, tail, dictionaries)
+
+    def to_frame(self, columns=None, tail=None, dictionaries=None):
+        '''Build a DataFrame typed like the TSV reader output (see Ledger.Schema) reading only the given columns.
+        Columns are the memory-mapped arrays themselves, they are copied only to add the rows of a tail'''
+        dictionaries = dictionaries or self.dictionaries
+        data = dict()
+        for field in columns or self.fields:
+            column = self.column(field)
+            if tail is not None:
+                column = np.concatenate([column, tail[field]])
+            if field in CATEGORY_COLUMNS:
+                data[field] = pd.Categorical.from_codes(column, dictionaries[field])
+            elif field not in (DATE_COLUMN, TOTAL_COLUMN):
+                '''Code -1 (empty) takes the NaN appended at the end, every row shares the string of its code'''
+                data[field] = np.append(np.asarray(dictionaries[field], dtype=object), np.nan)[column]
+            elif field == TOTAL_COLUMN and self.scale != MIN_SCALE:
+                data[field] = to_exact(column, self.scale)
+            else:
+                data[field] = column
+        rows = self.rows + (0 if tail is None else len(tail[self.fields[0]]))
+        return pd.DataFrame(data, index=pd.RangeIndex(rows), copy=False)
+
+    def to_tsv(self, tsv_path):
+        '''Write the store back to the TSV format used by the ledger'''
+        data = dict()
+        for field in self.fields:
+            column = self.column(field)
+            if field == DATE_COLUMN:
+                data[field] = pd.to_datetime(column).strftime(TSV_DATE_FORMAT)
+            elif field == TOTAL_COLUMN and self.scale != MIN_SCALE:
+                data[field] = [normalize_total(value) for value in to_exact(column, self.scale)]
+            elif field == TOTAL_COLUMN:
+                data[field] = format_cents(column)
+            else:
+                data[field] = pd.Categorical.from_codes(column, self.dictionaries[field])
+        pd.DataFrame(data, columns=self.fields).to_csv(tsv_path, sep='\t', index=False)
+
+    def drop(self):
+        '''Remove the store from disk'''
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,160 @@
+'''Local daemon protocol: one command per connection on a Unix socket, as JSON lines.
+
+The client sends {"argv": [...], "cwd": "..."}. While the command runs the daemon sends
+{"out": text} and {"err": text} for output, {"input": true} when the command reads a line of
+input, answered by the client with {"in": line} ("" at end of input), and {"exit": code} last.
+'''
+
+import io
+import os
+import sys
+import json
+import signal
+import socket
+import traceback
+
+BUFFER_SIZE = 1 << 16
+
+
+def send(connection, message):
+    connection.sendall(f'{json.dumps(message)}\n'.encode())
+
+def receive(reader):
+    '''Next message read from a connection, None when it was closed'''
+    line = reader.readline()
+    return json.loads(line) if line else None
+
+
+class ClientOutput(io.TextIOBase):
+    '''stdout or stderr of a command, relayed to the client when flushed'''
+    def __init__(self, connection, stream):
+        self.connection = connection
+        self.stream = stream
+        self.buffer = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= BUFFER_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            send(self.connection, {self.stream: ''.join(self.buffer)})
+            self.buffer = []
+            self.size = 0
+
+
+class ClientInput(io.TextIOBase):
+    '''stdin of a command, every line is asked to the client'''
+    def __init__(self, connection, reader):
+        self.connection = connection
+        self.reader = reader
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        send(self.connection, {'input': True})
+        message = receive(self.reader)
+        return message['in'] if message else ''
+
+
+def answer(connection, handle):
+    '''Run the command requested on connection with its input and output bound to the client'''
+    reader = connection.makefile('r', encoding='utf-8', newline='\n')
+    request = receive(reader)
+    if request is None:
+        return
+    streams = sys.stdin, sys.stdout, sys.stderr
+    stdout, stderr = ClientOutput(connection, 'out'), ClientOutput(connection, 'err')
+    sys.stdin, sys.stdout, sys.stderr = ClientInput(connection, reader), stdout, stderr
+    cwd = os.getcwd()
+    code = 0
+    try:
+        os.chdir(request.get('cwd') or cwd)
+        handle(request['argv'])
+    except SystemExit as error:
+        code = error.code if isinstance(error.code, int) else (0 if error.code is None else 1)
+        if isinstance(error.code, str):
+            print(error.code, file=sys.stderr)
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os.chdir(cwd)
+        sys.stdin, sys.stdout, sys.stderr = streams
+    stdout.flush()
+    stderr.flush()
+    send(connection, {'exit': code})
+
+def is_serving(socket_path):
+    '''True if a daemon accepts connections on socket_path'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+def serve(socket_path, handle):
+    '''Answer commands on socket_path one at a time until interrupted (Ctrl-C or SIGTERM).
+    handle(argv) runs one command, reading sys.stdin and writing sys.stdout/sys.stderr'''
+    if is_serving(socket_path):
+        raise ValueError(f'Daemon already running on {socket_path}.')
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(16)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                try:
+                    answer(connection, handle)
+                except OSError:
+                    '''The client went away, the next one is served'''
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+def forward(socket_path, argv):
+    '''Run argv on the daemon listening on socket_path, relaying output and input.
+    Return the exit code, None if no daemon is listening'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    with client:
+        send(client, {'argv': list(argv), 'cwd': os.getcwd()})
+        reader = client.makefile('r', encoding='utf-8', newline='\n')
+        while True:
+            message = receive(reader)
+            if message is None:
+                print('Error: Daemon closed the connection', file=sys.stderr)
+                return 1
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'input' in message:
+                send(client, {'in': sys.stdin.readline()})
+            elif 'exit' in message:
+                return message['exit']
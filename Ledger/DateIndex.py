@@ -0,0 +1,106 @@
+import os
+import csv
+
+import numpy as np
+import pandas as pd
+
+from Ledger.Files import DATE_INDEX_SUFFIX, MERGE_THRESHOLD, get_sidecar_path
+from Ledger.Profile import timed
+from Ledger.Schema import to_typed
+from Ledger.Sidecar import Sidecar, find_row_starts, read_appended_rows
+
+
+def get_index_path(tsv_path):
+    '''Directory holding the date index of a TSV ledger, e.g. finance.csv -> finance.dateidx'''
+    return get_sidecar_path(tsv_path, DATE_INDEX_SUFFIX)
+
+def to_days(dates):
+    '''Convert date strings to int64 days since 1970-01-01'''
+    return pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def read_lines(tsv_path, header, positions, offsets):
+    '''DataFrame of the ledger lines at the given byte offsets (indexed by row position), typed like the TSV reader output'''
+    order = np.argsort(offsets)
+    lines = [None] * len(offsets)
+    with open(tsv_path, 'rb') as file:
+        for index in order:
+            file.seek(int(offsets[index]))
+            lines[index] = file.readline().decode()
+    return to_typed(pd.DataFrame(list(csv.reader(lines, delimiter='\t')), columns=header, index=pd.Index(positions)))
+
+
+class DateIndex(Sidecar):
+    '''Rows of a TSV ledger sorted by date, kept as memory-mapped arrays next to it.
+
+    days, positions and offsets hold, ordered by (date, row position), the date of each
+    row as days since 1970-01-01, its position in the ledger and the byte offset of its line.
+    Rows appended after the index was written form a tail that is read and sorted on each
+    query and merged into the index once it has MERGE_THRESHOLD rows. The index is rebuilt
+    when the ledger was rewritten rather than appended to.
+    '''
+    def __init__(self, tsv_path):
+        super().__init__(get_index_path(tsv_path))
+        self.tsv_path = tsv_path
+        if not self.is_valid(tsv_path):
+            self.build()
+
+    def save(self, days, positions, offsets, size, header):
+        '''Write index arrays covering the first size bytes of the ledger'''
+        order = np.lexsort((positions, days))
+        arrays = {'days': days[order], 'positions': positions[order], 'offsets': offsets[order]}
+        self.write(self.tsv_path, arrays, size, {'rows': len(days), 'header': header})
+
+    @timed('date index build')
+    def build(self):
+        '''Index the whole ledger'''
+        size = os.path.getsize(self.tsv_path)
+        starts = find_row_starts(self.tsv_path)
+        table = pd.read_csv(self.tsv_path, sep='\t', header=0, usecols=['Date'], dtype=str)
+        with open(self.tsv_path, 'r', newline='') as file:
+            header = next(csv.reader(file, delimiter='\t'))
+        days = to_days(table['Date'])
+        self.save(days, np.arange(len(days), dtype=np.int64), starts[1:len(days) + 1], size, header)
+
+    def read_tail(self):
+        '''Return (days, positions, offsets, size) of rows appended after the indexed part'''
+        rows, offsets, size = read_appended_rows(self.tsv_path, self.meta['size'])
+        date_column = self.meta['header'].index('Date')
+        days = to_days([row[date_column] for row in rows]) if rows else np.zeros(0, dtype=np.int64)
+        positions = np.arange(self.meta['rows'], self.meta['rows'] + len(rows), dtype=np.int64)
+        return days, positions, offsets, size
+
+    def search(self, low=None, high=None):
+        '''Return (positions, offsets) of the rows with low <= date <= high (datetime64 or None), sorted by date'''
+        tail_days, tail_positions, tail_offsets, size = self.read_tail()
+        if len(tail_days) >= MERGE_THRESHOLD:
+            days = np.concatenate([self.column('days'), tail_days])
+            positions = np.concatenate([self.column('positions'), tail_positions])
+            offsets = np.concatenate([self.column('offsets'), tail_offsets])
+            self.save(days, positions, offsets, size, self.meta['header'])
+            tail_days = tail_positions = tail_offsets = np.zeros(0, dtype=np.int64)
+        days = self.column('days')
+        first = 0 if low is None else int(np.searchsorted(days, np.datetime64(low, 'D').astype(np.int64), side='left'))
+        last = len(days) if high is None else int(np.searchsorted(days, np.datetime64(high, 'D').astype(np.int64), side='right'))
+        positions = np.asarray(self.column('positions')[first:last])
+        offsets = np.asarray(self.column('offsets')[first:last])
+        if len(tail_days):
+            in_range = np.ones(len(tail_days), dtype=bool)
+            if low is not None:
+                in_range &= tail_days >= np.datetime64(low, 'D').astype(np.int64)
+            if high is not None:
+                in_range &= tail_days <= np.datetime64(high, 'D').astype(np.int64)
+            slice_days = np.asarray(days[first:last])
+            all_days = np.concatenate([slice_days, tail_days[in_range]])
+            positions = np.concatenate([positions, tail_positions[in_range]])
+            offsets = np.concatenate([offsets, tail_offsets[in_range]])
+            order = np.lexsort((positions, all_days))
+            positions, offsets = positions[order], offsets[order]
+        return positions, offsets
+
+    def read(self, low=None, high=None, max_fraction=None):
+        '''DataFrame of the rows with low <= date <= high, typed like the TSV reader output, in date order.
+        None when more than max_fraction of the rows match, reading the whole file is then faster than seeking'''
+        positions, offsets = self.search(low, high)
+        if max_fraction is not None and len(positions) > max_fraction * max(self.meta['rows'], 1):
+            return None
+        return read_lines(self.tsv_path, self.meta['header'], positions, offsets)
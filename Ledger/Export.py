@@ -0,0 +1,113 @@
+'''Report files of bills, one per month (and per category), as TSV and optionally Parquet or Feather.
+
+A bulk export partitions the ledger table once and writes the parts with a pool of processes. The
+Date column is formatted once for every TSV file and Total is written as money strings; Parquet and
+Feather keep the typed columns of Ledger.Schema (Date as date type, Total as int64 cents, or money strings when a
+total has more fraction digits than cents).
+'''
+
+import os
+import re
+import json
+import hashlib
+from importlib.util import find_spec
+from concurrent.futures import ProcessPoolExecutor
+
+from ExactCalc.ExactFloat import ExactFloat
+from Ledger.ColumnStore import format_cents
+from Ledger.Files import READ_BLOCK, TSV_DATE_FORMAT, write_atomic
+from Ledger.Schema import format_totals
+
+TSV = 'tsv'
+PARQUET = 'parquet'
+FEATHER = 'feather'
+EXTENSIONS = {TSV: '.csv', PARQUET: '.parquet', FEATHER: '.feather'}
+'''Engines pandas can write each columnar format with'''
+ENGINES = {PARQUET: ('pyarrow', 'fastparquet'), FEATHER: ('pyarrow',)}
+'''Characters of a category filter (e.g. "Housing|Transport", "!Food") replaced in file names'''
+UNSAFE_PATTERN = re.compile(r'[^\w.-]')
+
+
+def get_formats(formats):
+    '''Convert "tsv,parquet" to ['tsv', 'parquet'], raise ValueError for unknown formats or missing engines'''
+    formats = [name.strip().lower() for name in formats.split(',') if name.strip()] if isinstance(formats, str) else list(formats)
+    if not formats or any(name not in EXTENSIONS for name in formats):
+        raise ValueError(f'Format not valid, use a comma separated list of {list(EXTENSIONS)}.')
+    for name in formats:
+        if name in ENGINES and not any(find_spec(engine) for engine in ENGINES[name]):
+            raise ValueError(f'Format {name} needs {" or ".join(ENGINES[name])} installed.')
+    return list(dict.fromkeys(formats))
+
+def get_report_stem(category, month):
+    '''File name without extension of the report of month ("yyyy-mm") and category (None for all, or a category
+    filter expression)'''
+    category = '' if category is None else f'_{UNSAFE_PATTERN.sub("-", category)}'
+    return f'finance_report{category}_{month[5:]}-{month[:4]}'
+
+def get_sha256(path):
+    '''Hex SHA-256 of the file in path'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(READ_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_total(table):
+    '''Exact sum of the Total column (int64 cents or ExactFloat) as a decimal string'''
+    if table['Total'].dtype == object:
+        return str(ExactFloat.sum(table['Total']))
+    return str(format_cents([table['Total'].sum()])[0])
+
+def write_report(table, stem, formats, date_text=None):
+    '''Write typed table (see Ledger.Schema) to stem plus the extension of every format. date_text is the Date column
+    already formatted for TSV, formatted here when None. Return the manifest entry of every file'''
+    entries = []
+    total = get_total(table)
+    columns = table if table['Total'].dtype.kind in 'iu' else format_totals(table)
+    for name in formats:
+        path = f'{stem}{EXTENSIONS[name]}'
+        if name == TSV:
+            text = table['Date'].dt.strftime(TSV_DATE_FORMAT) if date_text is None else date_text
+            format_totals(table).assign(Date=text).to_csv(path, sep='\t', index=False)
+        elif name == PARQUET:
+            columns.to_parquet(path, index=False)
+        else:
+            columns.reset_index(drop=True).to_feather(path)
+        entries.append({
+            'file': os.path.basename(path), 'format': name, 'rows': len(table), 'total': total,
+            'bytes': os.path.getsize(path), 'sha256': get_sha256(path)
+        })
+    return entries
+
+def write_part(task):
+    '''Write one part of a bulk export, run in a worker process'''
+    month, category, stem, table, date_text, formats = task
+    return [{'month': f'{month[5:]}/{month[:4]}', 'category': category, **entry} for entry in write_report(table, stem, formats, date_text)]
+
+def export_months(table, directory, category=None, by_category=False, formats=(TSV,), workers=None):
+    '''Write one report per month of typed table (rows in date order), one per month and category
+    with by_category, in every format, with up to workers processes (all CPUs when None). category is the
+    category filter already applied, used in file names. Return the manifest entries of the files'''
+    if not len(table):
+        return []
+    date_text = table['Date'].dt.strftime(TSV_DATE_FORMAT)
+    months = date_text.str[:7]
+    keys = [months, table['Category']] if by_category else [months]
+    tasks = []
+    for key, part in table.groupby(keys, sort=True, observed=True):
+        key = key if isinstance(key, tuple) else (key,)
+        month, part_category = key[0], (key[1] if by_category else category)
+        stem = os.path.join(directory, get_report_stem(part_category, month))
+        tasks.append((month, part_category, stem, part, date_text[part.index], formats))
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = map(write_part, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(write_part, tasks, chunksize=max(len(tasks) // (workers * 4), 1)))
+    return [entry for entries in results for entry in entries]
+
+def write_manifest(path, description, entries):
+    '''Write the manifest of a bulk export: description (dict) plus the list of files, return path'''
+    write_atomic(path, json.dumps({**description, 'files': entries}, indent=2))
+    return path
@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import tempfile
+from itertools import islice
+
+CHUNK_SIZE = 100000
+READ_BLOCK = 1 << 22
+TSV_DATE_FORMAT = '%Y-%m-%d'
+DATE_COLUMN = 'Date'
+TOTAL_COLUMN = 'Total'
+CATEGORY_COLUMNS = ('Category', 'Essential')
+'''Rows appended to a ledger after a sidecar directory was written are merged into it once there are this many'''
+MERGE_THRESHOLD = 10000
+'''Number of bytes before the end of the covered part compared to check that a ledger was only appended to'''
+TAIL_CHECK_BYTES = 64
+'''Characters of the lines read_csv skips as blank, a tab-only line is a row of empty fields'''
+BLANK_CHARACTERS = ' \r\n'
+'''Suffixes of the sidecar directories of a ledger: columnar store, date index and name index'''
+STORE_SUFFIX = '.cols'
+DATE_INDEX_SUFFIX = '.dateidx'
+NAME_INDEX_SUFFIX = '.nameidx'
+SIDECAR_DIRECTORY_SUFFIXES = (STORE_SUFFIX, DATE_INDEX_SUFFIX, NAME_INDEX_SUFFIX)
+'''File describing the arrays of a sidecar directory (columnar store, indexes)'''
+META_FILE = 'meta.json'
+
+
+def get_sidecar_path(tsv_path, suffix):
+    '''Path of a file kept next to a TSV ledger, e.g. (finance.csv, .cols) -> finance.cols'''
+    return f'{os.path.splitext(tsv_path)[0]}{suffix}'
+
+def get_file_stamp(path):
+    '''Size and modification time used to detect changes to a file'''
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def get_temp_path(path):
+    '''New empty file next to path with a unique name, to be moved over path with os.replace'''
+    descriptor, temp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    os.close(descriptor)
+    return temp_path
+
+def write_atomic(path, text):
+    '''Replace the content of path with text, readers see either the old or the new content'''
+    temp_path = get_temp_path(path)
+    with open(temp_path, 'w') as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+def make_temp_directory(directory):
+    '''New empty directory next to directory with a unique name, to be moved over it with replace_directory'''
+    return tempfile.mkdtemp(prefix=f'{os.path.basename(directory)}.', suffix='.tmp', dir=os.path.dirname(directory) or '.')
+
+def replace_directory(temp_directory, directory):
+    '''Move temp_directory over directory. The old directory is renamed aside and removed only after the new one is in
+    place, so a reader finds a complete directory except between the two renames. If another process put a directory
+    there first, that one is kept'''
+    old_directory = f'{temp_directory}.old'
+    try:
+        os.rename(directory, old_directory)
+    except OSError:
+        old_directory = None
+    try:
+        os.replace(temp_directory, directory)
+    except OSError:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+    if old_directory:
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+def read_meta(directory):
+    '''Meta file of a sidecar directory as a dict, None when it is missing or partly written'''
+    try:
+        with open(os.path.join(directory, META_FILE), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def read_tail_check(path, size):
+    '''Last bytes before size, used to check that a file was only appended to'''
+    with open(path, 'rb') as file:
+        file.seek(max(size - TAIL_CHECK_BYTES, 0))
+        return list(file.read(min(size, TAIL_CHECK_BYTES)))
+
+def is_appended(path, meta):
+    '''True if path is the file meta (inode, size and tail_check of a sidecar) was written from, possibly with
+    rows appended'''
+    if meta is None or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    size = meta['size']
+    return stat.st_ino == meta['inode'] and stat.st_size >= size and read_tail_check(path, size) == meta['tail_check']
+
+def is_blank(line):
+    '''True if a line (str or bytes) is not a row of the ledger, holding only BLANK_CHARACTERS'''
+    return not line.strip(BLANK_CHARACTERS if isinstance(line, str) else BLANK_CHARACTERS.encode())
+
+def count_lines(data):
+    '''Number of complete lines of data (bytes starting at a line start) that are not blank'''
+    lines = data.count(b'\n')
+    '''Only a line starting with a blank character can be blank'''
+    if any(data.startswith(character) or b'\n' + character in data for character in map(str.encode, BLANK_CHARACTERS)):
+        lines -= sum(1 for line in data.split(b'\n')[:-1] if is_blank(line))
+    return lines
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    '''Yield lists of up to chunk_size lines of an open file'''
+    while True:
+        lines = list(islice(file, chunk_size))
+        if not lines:
+            return
+        yield lines
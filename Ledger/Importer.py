@@ -0,0 +1,107 @@
+import os
+import csv
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+
+from Ledger.Files import CHUNK_SIZE, TSV_DATE_FORMAT
+from Ledger.Sidecar import find_lines
+from Ledger.Writer import FSYNC_ALWAYS, sync
+
+TOTAL_PATTERN = r'^([+-]?)(\d*)(?:\.(\d*))?$'
+
+
+def get_reject_path(source_path):
+    '''File receiving the rows of source_path that could not be imported'''
+    return f'{os.path.splitext(source_path)[0]}.rejects.tsv'
+
+def get_delimiter(source_path):
+    '''Tab for TSV files, comma otherwise (decided by the header line)'''
+    with open(source_path, 'r', newline='') as file:
+        header = file.readline()
+    return '\t' if '\t' in header else ','
+
+def normalize_totals(series):
+    '''Validate totals like ExactFloat does and format them as it prints them, return (Series, invalid mask)'''
+    parts = series.str.extract(TOTAL_PATTERN)
+    invalid = parts[1].isna() | ((parts[1] == '') & (parts[2].fillna('') == ''))
+    decimal = parts[1].fillna('').str.lstrip('0').replace('', '0')
+    fraction = parts[2].fillna('').str.ljust(2, '0')
+    sign = parts[0].fillna('').replace('+', '')
+    sign = sign.where(((decimal != '0') | (fraction.str.strip('0') != '')), '')
+    return sign + decimal + '.' + fraction, invalid
+
+def validate_chunk(chunk, fields, categories, date_format):
+    '''Return (valid rows formatted for the ledger, rejected rows with their reason)'''
+    reasons = pd.Series('', index=chunk.index)
+    name = chunk['Name'].str.strip()
+    reasons = reasons.mask((reasons == '') & (name == ''), 'Name not defined.')
+    if 'Category' in fields:
+        reasons = reasons.mask((reasons == '') & (chunk['Category'] == ''), 'Category not defined.')
+        reasons = reasons.mask((reasons == '') & ~chunk['Category'].isin(categories), 'Category not valid.')
+    date = chunk['Date'].str.strip()
+    dates = pd.to_datetime(date, format=date_format, errors='coerce')
+    reasons = reasons.mask((reasons == '') & (date == ''), 'Date not defined.')
+    reasons = reasons.mask((reasons == '') & dates.isna(), 'Date not valid.')
+    total = chunk['Total'].str.strip()
+    totals, invalid_totals = normalize_totals(total)
+    reasons = reasons.mask((reasons == '') & (total == ''), 'Total not defined.')
+    reasons = reasons.mask((reasons == '') & invalid_totals, 'Total not valid.')
+    valid = reasons == ''
+    rows = chunk.loc[valid, fields].copy()
+    rows['Name'] = name[valid]
+    rows['Date'] = dates[valid].dt.strftime(TSV_DATE_FORMAT)
+    rows['Total'] = totals[valid]
+    rejects = chunk.loc[~valid, fields].copy()
+    rejects.insert(0, 'Reason', reasons[~valid])
+    return rows, rejects
+
+def import_ledger(source_path, ledger_path, fields, categories=None, date_format='%d/%m/%Y', chunk_size=CHUNK_SIZE, on_rows=None, fsync=FSYNC_ALWAYS, get_path=None):
+    '''Append the valid rows of a CSV/TSV file to a ledger chunk by chunk, write rejected rows with their
+    line number to a reject file and return (imported rows, rejected rows, reject file or None).
+    on_rows is called with the list of row dicts of every chunk after it is written. The caller holds the ledger lock.
+    With get_path (a function of a yyyy-mm-dd date returning the existing ledger of that date, e.g. a shard) every
+    row goes to the ledger of its date instead of ledger_path and on_rows is called with (ledger, row dicts)'''
+    delimiter = get_delimiter(source_path)
+    reader = pd.read_csv(source_path, sep=delimiter, header=0, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    reject_path = get_reject_path(source_path)
+    imported = 0
+    rejected = 0
+    ledgers = dict()
+    line_numbers = None
+    with ExitStack() as files, open(reject_path, 'w', newline='') as reject_file:
+        reject_writer = csv.writer(reject_file, delimiter='\t')
+        reject_writer.writerow(['Line', 'Reason', *fields])
+        for chunk in reader:
+            missing = [field for field in fields if field not in chunk.columns]
+            if missing:
+                raise ValueError(f'Columns {missing} not found in {source_path}.')
+            rows, rejects = validate_chunk(chunk, fields, categories, date_format)
+            values = rows.values.tolist()
+            parts = {ledger_path: values} if get_path is None else dict()
+            if get_path is not None:
+                for path, row in zip(map(get_path, rows['Date']), values):
+                    parts.setdefault(path, []).append(row)
+            for path, part in parts.items():
+                if path not in ledgers:
+                    ledgers[path] = files.enter_context(open(path, 'a', newline=''))
+                csv.writer(ledgers[path], delimiter='\t').writerows(part)
+                ledgers[path].flush()
+            '''Line number in the source file of every row read_csv reads, header first (it skips blank lines)'''
+            if len(rejects) and line_numbers is None:
+                line_numbers = np.flatnonzero(find_lines(source_path)[1]) + 1
+            reject_writer.writerows([[int(line_numbers[index + 1]), *row] for index, row in zip(rejects.index, rejects.values.tolist())])
+            imported += len(values)
+            rejected += len(rejects)
+            for path, part in parts.items():
+                if on_rows and part and get_path is None:
+                    on_rows([dict(zip(fields, row)) for row in part])
+                elif on_rows and part:
+                    on_rows(path, [dict(zip(fields, row)) for row in part])
+        for ledger in ledgers.values():
+            sync(ledger, fsync)
+    if not rejected:
+        os.remove(reject_path)
+        reject_path = None
+    return imported, rejected, reject_path
@@ -0,0 +1,196 @@
+import os
+import csv
+import stat
+
+from ExactCalc.ExactFloat import ExactFloat, MIN_SCALE
+from Ledger.Files import READ_BLOCK, count_lines, get_sidecar_path, get_temp_path, is_blank
+from Ledger.Writer import FSYNC_ALWAYS, recover, sync, sync_directory
+
+COMPACT_THRESHOLD = 256
+
+
+def get_journal_path(tsv_path):
+    '''File holding the tombstones of a TSV ledger, e.g. finance.csv -> finance.journal'''
+    return get_sidecar_path(tsv_path, '.journal')
+
+def normalize_total(value):
+    '''Canonical text of a total in row keys, without zeros past the cents, e.g. 5.000 -> 5.00. Text that is not a
+    number is kept as is'''
+    try:
+        value = value if isinstance(value, ExactFloat) else ExactFloat(str(value))
+    except (ValueError, IndexError):
+        return str(value)
+    scaled, scale = value.scaled, value.scale
+    while scale > MIN_SCALE and scaled % 10 == 0:
+        scaled, scale = scaled // 10, scale - 1
+    return str(ExactFloat.from_scaled(scaled, scale))
+
+def get_row_key(row, fields):
+    '''Normalized tuple of a ledger row as stored in the TSV, used to match tombstones'''
+    key = []
+    for field in fields:
+        value = row[field]
+        value = '' if value is None else str(value)
+        if field == 'Total' and value:
+            value = normalize_total(value)
+        key.append(value)
+    return tuple(key)
+
+def get_cents(key):
+    '''Cents of the total of a row key, None when it is not a whole number of cents'''
+    try:
+        value = ExactFloat(key)
+    except (ValueError, IndexError):
+        return None
+    return value.rescale(2).scaled if value == value.rescale(2) else None
+
+def get_key_values(field, column, keys):
+    '''Return the values of a table column and the tombstone keys (Series of text as in row keys) of field in a
+    comparable dtype. Keys that cannot match any value of the column are NaN'''
+    import pandas as pd
+    kind = column.dtype.kind
+    if field == 'Date' and kind == 'M':
+        return column, pd.to_datetime(keys, errors='coerce').astype(column.dtype)
+    if field == 'Total' and kind in 'iu':
+        return column, pd.Series([get_cents(key) for key in keys], index=keys.index, dtype=object)
+    if field == 'Total' and kind == 'f':
+        return column, pd.to_numeric(keys, errors='coerce')
+    if field == 'Total':
+        return column.map(normalize_total).where(column.notna(), '').astype(str), keys
+    return column.astype(object).where(column.notna(), '').astype(str), keys
+
+def count_rows(path, sizes):
+    '''Return, for each byte size in sizes, the number of data rows (lines after the header, blank lines skipped like
+    read_csv does) before it'''
+    counts = dict()
+    rows = 0
+    position = 0
+    with open(path, 'rb') as file:
+        for size in sorted(set(sizes)):
+            while position < size:
+                block = file.read(min(READ_BLOCK, size - position))
+                if not block:
+                    break
+                '''Blocks end at a line end, so that count_lines sees whole lines'''
+                if not block.endswith(b'\n') and position + len(block) < size:
+                    block += file.readline(size - position - len(block))
+                rows += count_lines(block)
+                position += len(block)
+            counts[size] = max(rows - 1, 0)
+    return counts
+
+def read_rows(file):
+    '''DictReader of the rows of an open ledger file, without the blank lines read_csv skips, so the position of a
+    row is the one in the typed table'''
+    return csv.DictReader((line for line in file if not is_blank(line)), delimiter='\t')
+
+
+class Journal:
+    '''Append-only journal of deletions (tombstones) for a TSV ledger.
+
+    Deleting appends one line: the inode and byte size of the ledger at that moment and the
+    deleted row. A tombstone removes every matching row written before it, so rows added
+    later with the same values survive. Tombstones recorded against another inode were
+    already applied by a compaction and are ignored.
+    '''
+    def __init__(self, tsv_path, fields):
+        self.tsv_path = tsv_path
+        self.journal_path = get_journal_path(tsv_path)
+        self.fields = fields
+
+    def append(self, row, fsync=FSYNC_ALWAYS):
+        '''Record the deletion of every row equal to row (a dict of fields), return number of tombstones'''
+        ledger = os.stat(self.tsv_path)
+        with open(self.journal_path, 'a', newline='') as file:
+            writer = csv.writer(file, delimiter='\t')
+            writer.writerow([ledger.st_ino, ledger.st_size, *get_row_key(row, self.fields)])
+            sync(file, fsync)
+        return len(self.tombstones())
+
+    def tombstones(self):
+        '''Return list of (ledger size, row key) that still apply to the ledger'''
+        if not os.path.exists(self.journal_path):
+            return []
+        inode = os.stat(self.tsv_path).st_ino
+        with open(self.journal_path, 'r', newline='') as file:
+            tombstones = [(int(line[1]), line[2:]) for line in csv.reader(file, delimiter='\t') if line and int(line[0]) == inode]
+        '''Journals written before totals had one canonical text can hold e.g. 5.000 for 5.00'''
+        if 'Total' in self.fields:
+            total = self.fields.index('Total')
+            for _, key in tombstones:
+                if len(key) > total and key[total]:
+                    key[total] = normalize_total(key[total])
+        return [(size, tuple(key)) for size, key in tombstones]
+
+    def cutoffs(self):
+        '''Return dict row key -> row position before which rows with that key are deleted'''
+        tombstones = self.tombstones()
+        if not tombstones:
+            return dict()
+        rows = count_rows(self.tsv_path, [size for size, _ in tombstones])
+        cutoffs = dict()
+        for size, key in tombstones:
+            cutoffs[key] = max(cutoffs.get(key, 0), rows[size])
+        return cutoffs
+
+    def apply(self, table, cutoffs=None):
+        '''Drop deleted rows from a DataFrame read from the ledger (index = row position, typed Date, Total as int64 cents or strings).
+        cutoffs, when given, are the ones of cutoffs() computed once for many chunks of the ledger'''
+        import numpy as np
+        import pandas as pd
+        cutoffs = self.cutoffs() if cutoffs is None else cutoffs
+        if not cutoffs or table.empty:
+            return table
+        deleted = pd.DataFrame(list(cutoffs), columns=self.fields)
+        deleted['cutoff'] = list(cutoffs.values())
+        '''Only rows before the last cutoff can be deleted. Every field keeps the rows with a value some tombstone
+        has, so the keys are built for few rows and joined with the tombstones at once'''
+        positions = np.flatnonzero(table.index < deleted['cutoff'].max())
+        keys = dict()
+        for field in self.fields:
+            if not len(positions):
+                return table
+            values, deleted[field] = get_key_values(field, table[field].iloc[positions], deleted[field])
+            deleted = deleted[deleted[field].notna()].astype({field: values.dtype})
+            found = values.isin(deleted[field]).to_numpy()
+            positions = positions[found]
+            keys = {name: column[found] for name, column in keys.items()}
+            keys[field] = values.to_numpy()[found]
+        keys = pd.DataFrame(keys)
+        keys['position'] = positions
+        matched = keys.merge(deleted, on=self.fields)
+        matched = matched[table.index.to_numpy()[matched['position'].to_numpy()] < matched['cutoff'].to_numpy()]
+        keep = np.ones(len(table), dtype=bool)
+        keep[matched['position'].to_numpy()] = False
+        return table[keep]
+
+    def iter_rows(self, file):
+        '''Yield the live rows of an open ledger file as dicts, skipping deleted rows'''
+        cutoffs = self.cutoffs()
+        for position, row in enumerate(read_rows(file)):
+            if cutoffs and position < cutoffs.get(get_row_key(row, self.fields), 0):
+                continue
+            yield row
+
+    def compact(self, fsync=FSYNC_ALWAYS):
+        '''Rewrite the ledger without deleted rows (atomically) and empty the journal, return rows removed'''
+        if not os.path.exists(self.journal_path):
+            return 0
+        recover(self.tsv_path, fsync)
+        temp_path = get_temp_path(self.tsv_path)
+        os.chmod(temp_path, stat.S_IMODE(os.stat(self.tsv_path).st_mode))
+        removed = 0
+        with open(self.tsv_path, 'r', newline='') as file, open(temp_path, 'w', newline='') as temp_file:
+            writer = csv.DictWriter(temp_file, self.fields, delimiter='\t')
+            writer.writeheader()
+            cutoffs = self.cutoffs()
+            for position, row in enumerate(read_rows(file)):
+                if cutoffs and position < cutoffs.get(get_row_key(row, self.fields), 0):
+                    removed += 1
+                    continue
+                writer.writerow(row)
+            sync(temp_file, fsync)
+        os.replace(temp_path, self.tsv_path)
+        sync_directory(self.tsv_path, fsync)
+        os.remove(self.journal_path)
+        return removed
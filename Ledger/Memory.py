@@ -0,0 +1,59 @@
+import io
+import os
+
+import pandas as pd
+
+from Ledger.Files import get_file_stamp, is_appended, read_tail_check
+from Ledger.Sidecar import read_appended_rows
+from Ledger.Journal import Journal, get_journal_path
+from Ledger.Schema import to_typed, read_typed, concat_typed
+
+
+def to_table(rows, header, start):
+    '''DataFrame of ledger rows given as lists of strings, indexed by row position from start, typed like the TSV reader output'''
+    return to_typed(pd.DataFrame(rows, columns=header, index=pd.RangeIndex(start, start + len(rows))))
+
+
+class LedgerMemory:
+    '''Typed tables of TSV ledgers kept in memory between commands.
+
+    Every read checks the files: rows appended to a ledger are parsed and added to its table,
+    a rewritten ledger is read again and deleted rows are dropped again when the journal changed.
+    '''
+    def __init__(self):
+        self.ledgers = dict()
+
+    def load(self, path):
+        '''Read the complete lines of a ledger'''
+        with open(path, 'rb') as file:
+            data = file.read()
+        size = data.rfind(b'\n') + 1
+        table = read_typed(io.BytesIO(data[:size]))
+        return {
+            'inode': os.stat(path).st_ino, 'size': size, 'tail_check': read_tail_check(path, size),
+            'header': list(table.columns), 'table': table, 'journal': None, 'live': None
+        }
+
+    def append(self, path, ledger):
+        '''Add the rows appended to a ledger since it was read'''
+        rows, _, size = read_appended_rows(path, ledger['size'])
+        if rows:
+            tail = to_table(rows, ledger['header'], len(ledger['table']))
+            ledger['table'] = concat_typed([ledger['table'], tail])
+            ledger['live'] = None
+        ledger['size'] = size
+        ledger['tail_check'] = read_tail_check(path, size)
+
+    def read(self, path, fields):
+        '''Typed DataFrame of the ledger in path (see Ledger.Schema), without deleted rows'''
+        ledger = self.ledgers.get(path)
+        if not is_appended(path, ledger):
+            ledger = self.ledgers[path] = self.load(path)
+        elif os.path.getsize(path) > ledger['size']:
+            self.append(path, ledger)
+        journal_path = get_journal_path(path)
+        journal = get_file_stamp(journal_path) if os.path.exists(journal_path) else None
+        if ledger['live'] is None or journal != ledger['journal']:
+            ledger['live'] = Journal(path, fields).apply(ledger['table'])
+            ledger['journal'] = journal
+        return ledger['live']
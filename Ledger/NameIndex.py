@@ -0,0 +1,116 @@
+import os
+import csv
+
+import numpy as np
+import pandas as pd
+
+from Ledger.Files import MERGE_THRESHOLD, NAME_INDEX_SUFFIX, get_sidecar_path
+from Ledger.DateIndex import read_lines
+from Ledger.Query import normalize_name, REGEX
+from Ledger.Profile import timed
+from Ledger.Sidecar import Sidecar, find_row_starts, read_appended_rows
+
+
+def get_index_path(tsv_path):
+    '''Directory holding the name index of a TSV ledger, e.g. finance.csv -> finance.nameidx'''
+    return get_sidecar_path(tsv_path, NAME_INDEX_SUFFIX)
+
+def get_trigrams(name):
+    '''Set of the three character substrings of the normalized name'''
+    name = normalize_name(name)
+    return {name[index:index + 3] for index in range(len(name) - 2)}
+
+
+class NameIndex(Sidecar):
+    '''Rows of a TSV ledger grouped by name, with a trigram index over the distinct names, kept next to it.
+
+    The meta file holds the distinct names and, for every trigram of a normalized (case folded)
+    name, the ids of the names containing it. positions and offsets hold the row position and line
+    byte offset of every row grouped by name id, starts[id]:starts[id + 1] being the rows of a name.
+    A lookup narrows the names by trigrams, checks the candidates and reads only their rows.
+    Rows appended after the index was written form a tail that is checked on each lookup and
+    merged once it has MERGE_THRESHOLD rows. The index is rebuilt when the ledger was rewritten.
+    '''
+    def __init__(self, tsv_path):
+        super().__init__(get_index_path(tsv_path))
+        self.tsv_path = tsv_path
+        if not self.is_valid(tsv_path):
+            self.build()
+
+    def save(self, names, codes, offsets, size, header):
+        '''Write index of the first size bytes of the ledger, codes[position] being the name id of each row'''
+        order = np.argsort(codes, kind='stable')
+        starts = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(np.bincount(codes, minlength=len(names)))]).astype(np.int64)
+        trigrams = dict()
+        for name_id, name in enumerate(names):
+            for trigram in get_trigrams(name):
+                trigrams.setdefault(trigram, []).append(name_id)
+        arrays = {'positions': order.astype(np.int64), 'offsets': offsets[order], 'starts': starts}
+        self.write(self.tsv_path, arrays, size, {'rows': len(codes), 'header': header, 'names': names, 'trigrams': trigrams})
+
+    @timed('name index build')
+    def build(self):
+        '''Index the whole ledger'''
+        size = os.path.getsize(self.tsv_path)
+        starts = find_row_starts(self.tsv_path)
+        table = pd.read_csv(self.tsv_path, sep='\t', header=0, usecols=['Name'], dtype=str, keep_default_na=False)
+        with open(self.tsv_path, 'r', newline='') as file:
+            header = next(csv.reader(file, delimiter='\t'))
+        codes, names = pd.factorize(table['Name'])
+        self.save(list(names), codes.astype(np.int64), starts[1:len(codes) + 1], size, header)
+
+    @timed('name index merge')
+    def merge(self, tail_names, tail_offsets, size):
+        '''Add the appended rows to the index'''
+        names = list(self.meta['names'])
+        ids = {name: name_id for name_id, name in enumerate(names)}
+        starts = self.column('starts')
+        codes = np.empty(self.meta['rows'], dtype=np.int64)
+        codes[np.asarray(self.column('positions'))] = np.repeat(np.arange(len(names), dtype=np.int64), np.diff(starts))
+        offsets = np.empty(self.meta['rows'], dtype=np.int64)
+        offsets[np.asarray(self.column('positions'))] = self.column('offsets')
+        tail_codes = [ids.setdefault(name, len(ids)) for name in tail_names]
+        names.extend(list(ids)[len(names):])
+        self.save(names, np.concatenate([codes, np.asarray(tail_codes, dtype=np.int64)]), np.concatenate([offsets, tail_offsets]), size, self.meta['header'])
+
+    def candidates(self, match):
+        '''Ids of the indexed names that can match, narrowed by the trigrams of literal matches'''
+        trigrams = get_trigrams(match.value)
+        if match.mode == REGEX or not trigrams:
+            return range(len(self.meta['names']))
+        postings = sorted((self.meta['trigrams'].get(trigram, []) for trigram in trigrams), key=len)
+        ids = set(postings[0])
+        for posting in postings[1:]:
+            ids.intersection_update(posting)
+        return ids
+
+    def search(self, match):
+        '''Return (positions, offsets) of the rows whose name satisfies match (a Query Match), in ledger order'''
+        rows, tail_offsets, size = read_appended_rows(self.tsv_path, self.meta['size'])
+        name_column = self.meta['header'].index('Name')
+        tail_names = [row[name_column] if len(row) > name_column else '' for row in rows]
+        if len(tail_names) >= MERGE_THRESHOLD:
+            self.merge(tail_names, tail_offsets, size)
+            tail_names, tail_offsets = [], np.zeros(0, dtype=np.int64)
+        names = self.meta['names']
+        starts, row_positions, row_offsets = self.column('starts'), self.column('positions'), self.column('offsets')
+        positions, offsets = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for name_id in self.candidates(match):
+            if match.matches(names[name_id]):
+                first, last = int(starts[name_id]), int(starts[name_id + 1])
+                positions.append(np.asarray(row_positions[first:last]))
+                offsets.append(np.asarray(row_offsets[first:last]))
+        tail = [index for index, name in enumerate(tail_names) if match.matches(name)]
+        positions.append(np.asarray(tail, dtype=np.int64) + self.meta['rows'])
+        offsets.append(tail_offsets[tail])
+        positions, offsets = np.concatenate(positions), np.concatenate(offsets)
+        order = np.argsort(positions, kind='stable')
+        return positions[order], offsets[order]
+
+    def read(self, match, max_fraction=None):
+        '''DataFrame of the rows whose name satisfies match, shaped like the TSV reader output, in ledger order.
+        None when more than max_fraction of the rows match, reading the whole file is then faster than seeking'''
+        positions, offsets = self.search(match)
+        if max_fraction is not None and len(positions) > max_fraction * max(self.meta['rows'], 1):
+            return None
+        return read_lines(self.tsv_path, self.meta['header'], positions, offsets)
@@ -0,0 +1,81 @@
+'''Multi-period pivot of bill aggregates.
+
+Works on the (month, category, essential) buckets of the aggregate cache, totals being exact
+int64 integers in units of 10**-scale, so every figure is an integer sum of the ledger totals.
+'''
+
+import pandas as pd
+
+from Ledger.ColumnStore import format_scaled
+
+GROUPS = {'month': 'Month', 'category': 'Category', 'essential': 'Essential'}
+ESSENTIAL_VALUE = 'Yes'
+SUMS = ['Total', 'Count', 'Essential total', 'Non-essential total']
+
+
+def get_group_columns(group_by):
+    '''Convert "month,category" to the bucket columns ['Month', 'Category'], raise ValueError for unknown groups'''
+    groups = [group.strip().lower() for group in group_by.split(',') if group.strip()]
+    if not groups or any(group not in GROUPS for group in groups) or len(set(groups)) != len(groups):
+        raise ValueError(f'Group by not valid, use a comma separated list of {list(GROUPS)}.')
+    return [GROUPS[group] for group in groups]
+
+def get_month_key(str_month):
+    '''Convert "mm/yyyy" to "yyyy-mm"'''
+    try:
+        month, year = str_month.split('/')
+        if not 1 <= int(month) <= 12:
+            raise ValueError
+        return f'{int(year):04d}-{int(month):02d}'
+    except ValueError:
+        raise ValueError('Date filter in wrong format.')
+
+def get_months(first_month, last_month):
+    '''List of "yyyy-mm" from first_month to last_month included'''
+    return [str(period) for period in pd.period_range(first_month, last_month, freq='M')]
+
+def get_previous_month(month):
+    '''"yyyy-mm" of the month before month'''
+    return str(pd.Period(month, freq='M') - 1)
+
+def pivot(buckets, scale, first_month, last_month, group_by):
+    '''Group buckets of first_month to last_month by the columns group_by (a subset of Month, Category, Essential).
+
+    Return a DataFrame with the group columns, Total, Count, the Essential/Non-essential split of Total and,
+    when grouped by month, Delta against the previous month of the same group. buckets may hold the month
+    before first_month, used only for the first Delta. Every month of the range is listed, empty ones as 0.
+    '''
+    buckets = buckets.copy()
+    essential = buckets['Essential'] == ESSENTIAL_VALUE
+    buckets['Essential total'] = buckets['Total'].where(essential, 0)
+    buckets['Non-essential total'] = buckets['Total'] - buckets['Essential total']
+    if 'Month' not in group_by:
+        buckets = buckets[buckets['Month'] >= first_month]
+    if not group_by:
+        table = buckets[SUMS].sum().to_frame().T
+    else:
+        table = buckets.groupby(group_by, sort=True)[SUMS].sum()
+    if 'Month' in group_by:
+        others = [column for column in group_by if column != 'Month']
+        months = [get_previous_month(first_month), *get_months(first_month, last_month)]
+        if others:
+            combinations = table.index.droplevel('Month').unique()
+            index = pd.MultiIndex.from_tuples(
+                [(month, *combination) if isinstance(combination, tuple) else (month, combination) for month in months for combination in combinations],
+                names=['Month', *others]
+            ).reorder_levels(group_by)
+            table = table.reindex(index, fill_value=0).sort_index()
+            previous = table.groupby(others, sort=False)['Total'].shift(1, fill_value=0)
+        else:
+            table = table.reindex(pd.Index(months, name='Month'), fill_value=0)
+            previous = table['Total'].shift(1, fill_value=0)
+        table['Delta'] = table['Total'] - previous
+        table = table[table.index.get_level_values('Month') >= first_month]
+    table = table.reset_index() if group_by else table.reset_index(drop=True)
+    for column in ('Total', 'Essential total', 'Non-essential total', 'Delta'):
+        if column in table:
+            table[column] = format_scaled(table[column].to_numpy(), scale)
+    table['Count'] = table['Count'].astype('int64')
+    if 'Month' in table:
+        table['Month'] = table['Month'].str[5:] + '/' + table['Month'].str[:4]
+    return table
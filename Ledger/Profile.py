@@ -0,0 +1,141 @@
+'''Phase timers, row counts and peak memory of one command.
+
+Code marks its phases with `with phase('read_csv'):` or by decorating a function with
+@timed('name'), and reports the rows a phase produced with count_rows(). Phases nest: a phase opened inside another one is reported under it. Nothing is
+recorded until start() is called; until then phase() returns one shared no-op context manager,
+so instrumented code pays a function call per phase and nothing per row.
+'''
+
+import sys
+import json
+import time
+from functools import wraps
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:
+    '''Windows has no getrusage: the peak of the memory traced by tracemalloc is reported instead'''
+    resource = None
+    import tracemalloc
+
+TEXT = 'text'
+JSON = 'json'
+FORMATS = (TEXT, JSON)
+
+NULL_PHASE = nullcontext()
+PROFILER = None
+
+
+def get_peak_rss():
+    '''Peak resident memory of the process in bytes, peak memory traced since start() on Windows'''
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    '''Linux reports kilobytes, macOS bytes'''
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Phase:
+    '''Timer of one run of a named phase'''
+    __slots__ = ('profiler', 'name', 'entry', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.entry = self.profiler.get_entry()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.stack.pop()
+        entry = self.entry
+        entry['seconds'] += elapsed
+        entry['calls'] += 1
+        entry['peak_rss'] = get_peak_rss()
+        return False
+
+
+class Profiler:
+    '''Phases recorded since start(), keyed by their path of nested phase names, in the order they were opened'''
+    def __init__(self):
+        self.phases = dict()
+        self.stack = []
+        self.start = time.perf_counter()
+
+    def get_entry(self):
+        '''Totals of the innermost open phase, created when the phase is first opened'''
+        return self.phases.setdefault(tuple(self.stack), {'seconds': 0.0, 'calls': 0, 'rows': None, 'peak_rss': 0})
+
+    def count_rows(self, rows):
+        '''Add rows to the row count of the innermost open phase'''
+        if self.stack:
+            entry = self.get_entry()
+            entry['rows'] = (entry['rows'] or 0) + int(rows)
+
+    def report(self):
+        '''Dict with the total time, peak RSS and every phase (name, depth, seconds, calls, rows, peak RSS at its end)'''
+        return {
+            'seconds': time.perf_counter() - self.start,
+            'peak_rss': get_peak_rss(),
+            'phases': [
+                {'phase': ' / '.join(path), 'depth': len(path) - 1, **entry}
+                for path, entry in self.phases.items()
+            ]
+        }
+
+
+def start():
+    '''Start recording phases, dropping what was recorded before'''
+    global PROFILER
+    if resource is None:
+        tracemalloc.start()
+    PROFILER = Profiler()
+
+def stop():
+    '''Stop recording phases, return the report of what was recorded (None if start() was not called)'''
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    report = profiler.report() if profiler is not None else None
+    if resource is None:
+        tracemalloc.stop()
+    return report
+
+def phase(name):
+    '''Context manager timing the phase name while recording, a no-op otherwise'''
+    if PROFILER is None:
+        return NULL_PHASE
+    return Phase(PROFILER, name)
+
+def timed(name):
+    '''Decorator running every call of the decorated function as the phase name'''
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILER is None:
+                return function(*args, **kwargs)
+            with Phase(PROFILER, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count_rows(rows):
+    '''Record rows produced by the innermost open phase while recording'''
+    if PROFILER is not None:
+        PROFILER.count_rows(rows)
+
+def format_report(report, output_format=TEXT):
+    '''Report as an indented table of phases or as JSON'''
+    if output_format == JSON:
+        return json.dumps(report, indent=2)
+    lines = [f'{"phase":<40}{"ms":>10}{"calls":>8}{"rows":>12}{"peak MB":>10}']
+    for entry in report['phases']:
+        name = '  ' * entry['depth'] + entry['phase'].split(' / ')[-1]
+        rows = '' if entry['rows'] is None else entry['rows']
+        lines.append(f'{name:<40}{entry["seconds"] * 1000:>10.1f}{entry["calls"]:>8}{rows:>12}{entry["peak_rss"] / 2 ** 20:>10.1f}')
+    lines.append(f'{"total":<40}{report["seconds"] * 1000:>10.1f}{"":>8}{"":>12}{report["peak_rss"] / 2 ** 20:>10.1f}')
+    return '\n'.join(lines)
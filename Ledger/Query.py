@@ -0,0 +1,298 @@
+'''Compiler for the filter syntax of --date, --total, --category and --essential.
+
+An expression is parsed once into a small typed predicate tree and evaluated as one
+vectorized boolean mask over typed DataFrame columns:
+
+    12/10/2021                     equal
+    >=12/10/2021  <120.00          compare with >, >=, <, <= (or = explicitly)
+    12/10/2021~14/10/2021          inclusive range
+    a|b   a&b   !a   (a)           or, and, not and grouping of the above
+
+e.g. --date '01/01/2021~31/01/2021|01/03/2021~31/03/2021' or --total '!100.00~200.00'.
+
+Names are not parsed: they are matched as a literal substring (contains), a literal
+prefix (prefix) or a regular expression (regex), optionally ignoring case.
+'''
+
+import re
+import datetime
+from functools import lru_cache, reduce
+
+import numpy as np
+
+from ExactCalc.ExactFloat import ExactFloat
+from Ledger.Profile import phase
+
+DATE = 'date'
+TOTAL = 'total'
+TEXT = 'text'
+CONTAINS = 'contains'
+PREFIX = 'prefix'
+REGEX = 'regex'
+MATCHES = (CONTAINS, PREFIX, REGEX)
+
+ERRORS = {DATE: 'Date filter in wrong format.', TOTAL: 'Total filter in wrong format.', TEXT: 'Filter in wrong format.', REGEX: 'Name filter in wrong format.'}
+TOKEN_PATTERN = re.compile(r'\s*(>=|<=|>|<|=|~|\||&|!|\(|\)|[^><=~|&!()]+)')
+COMPARISONS = ('>=', '<=', '>', '<', '=')
+
+
+def parse_value(kind, value):
+    '''Convert the text of a value to the type used to compare it'''
+    value = value.strip()
+    if kind == DATE:
+        day, month, year = value.split('/')
+        return np.datetime64(datetime.date(int(year), int(month), int(day)))
+    if kind == TOTAL:
+        return ExactFloat(value)
+    return value
+
+def column_value(column, value):
+    '''Express a parsed total in the unit of the column: cents for integer columns (a float number of cents when it has
+    more fraction digits), ExactFloat for columns of ExactFloat, float otherwise'''
+    if isinstance(value, ExactFloat):
+        if column.dtype.kind in 'iu':
+            return value.rescale(2).scaled if value == value.rescale(2) else value.scaled / 10 ** (value.scale - 2)
+        if column.dtype == object:
+            return value
+        return float(str(value))
+    return value
+
+
+class Compare:
+    def __init__(self, operator, value):
+        self.operator = operator
+        self.value = value
+
+    def mask(self, column):
+        value = column_value(column, self.value)
+        if self.operator == '=':
+            return column == value
+        if self.operator == '>':
+            return column > value
+        if self.operator == '>=':
+            return column >= value
+        if self.operator == '<':
+            return column < value
+        return column <= value
+
+    def bounds(self):
+        if self.operator == '=':
+            return self.value, self.value
+        if self.operator in ('>', '>='):
+            return self.value, None
+        return None, self.value
+
+
+class Range:
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def mask(self, column):
+        return (column >= column_value(column, self.low)) & (column <= column_value(column, self.high))
+
+    def bounds(self):
+        return self.low, self.high
+
+
+def normalize_name(name):
+    '''Form of a name used for case-insensitive matching'''
+    return name.casefold()
+
+
+class Match:
+    '''Name matched as a literal substring, a literal prefix or a regular expression'''
+    def __init__(self, mode, value, ignore_case=False):
+        self.mode = mode
+        self.value = value
+        self.ignore_case = ignore_case
+        self.key = normalize_name(value) if ignore_case else value
+        if mode == REGEX:
+            try:
+                self.pattern = re.compile(value, re.IGNORECASE if ignore_case else 0)
+            except re.error:
+                raise ValueError(ERRORS[REGEX])
+
+    def matches(self, name):
+        '''True if the single name matches'''
+        if self.mode == REGEX:
+            return self.pattern.search(name) is not None
+        if self.ignore_case:
+            name = normalize_name(name)
+        if self.mode == PREFIX:
+            return name.startswith(self.key)
+        return self.key in name
+
+    def mask(self, column):
+        if self.mode == REGEX:
+            return np.fromiter((isinstance(name, str) and self.pattern.search(name) is not None for name in column), dtype=bool, count=len(column))
+        if self.ignore_case:
+            column = column.str.casefold()
+        if self.mode == PREFIX:
+            return column.str.startswith(self.key, na=False)
+        return column.str.contains(self.key, regex=False, na=False)
+
+    def bounds(self):
+        return None, None
+
+
+class Not:
+    def __init__(self, operand):
+        self.operand = operand
+
+    def mask(self, column):
+        return ~self.operand.mask(column)
+
+    def bounds(self):
+        return None, None
+
+
+class And:
+    def __init__(self, operands):
+        self.operands = operands
+
+    def mask(self, column):
+        return reduce(lambda mask, operand: mask & operand.mask(column), self.operands[1:], self.operands[0].mask(column))
+
+    def bounds(self):
+        lows, highs = zip(*[operand.bounds() for operand in self.operands])
+        lows = [low for low in lows if low is not None]
+        highs = [high for high in highs if high is not None]
+        return max(lows) if lows else None, min(highs) if highs else None
+
+
+class Or:
+    def __init__(self, operands):
+        self.operands = operands
+
+    def mask(self, column):
+        return reduce(lambda mask, operand: mask | operand.mask(column), self.operands[1:], self.operands[0].mask(column))
+
+    def bounds(self):
+        lows, highs = zip(*[operand.bounds() for operand in self.operands])
+        low = None if None in lows else min(lows)
+        high = None if None in highs else max(highs)
+        return low, high
+
+
+class Parser:
+    '''Recursive descent parser: or := and ('|' and)*, and := not ('&' not)*, not := '!' not | atom'''
+    def __init__(self, kind, expression):
+        self.kind = kind
+        self.tokens = [token.strip() for token in TOKEN_PATTERN.findall(expression) if token.strip()]
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(ERRORS[self.kind])
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(ERRORS[self.kind])
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == '|':
+            self.take()
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() == '&':
+            self.take()
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def parse_not(self):
+        if self.peek() == '!':
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.take()
+        if token == '(':
+            node = self.parse_or()
+            self.take(')')
+            return node
+        if token in COMPARISONS:
+            if self.kind == TEXT and token != '=':
+                raise ValueError(ERRORS[self.kind])
+            return Compare(token, self.value(self.take()))
+        if token in ('~', '|', '&', ')'):
+            raise ValueError(ERRORS[self.kind])
+        if self.peek() == '~':
+            self.take()
+            if self.kind == TEXT:
+                raise ValueError(ERRORS[self.kind])
+            return Range(self.value(token), self.value(self.take()))
+        return Compare('=', self.value(token))
+
+    def value(self, token):
+        if token in COMPARISONS or token in ('~', '|', '&', '!', '(', ')'):
+            raise ValueError(ERRORS[self.kind])
+        try:
+            return parse_value(self.kind, token)
+        except (ValueError, IndexError):
+            raise ValueError(ERRORS[self.kind])
+
+
+@lru_cache(maxsize=256)
+def compile_filter(kind, expression, ignore_case=False):
+    '''Parse an expression of the given kind (date, total, text or a name match) into a predicate tree, cached.
+    Name matches (contains, prefix, regex) are not parsed, ignore_case only applies to them.'''
+    if kind in MATCHES:
+        return Match(kind, expression, ignore_case)
+    return Parser(kind, expression).parse()
+
+
+class Query:
+    '''Conjunction of per-field predicates evaluated as one boolean mask'''
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+    def mask(self, table):
+        '''Boolean mask of the rows of table that satisfy every predicate'''
+        mask = np.ones(len(table), dtype=bool)
+        for field, predicate in self.predicates:
+            with phase(f'{field} mask'):
+                mask &= np.asarray(predicate.mask(table[field]), dtype=bool)
+        return mask
+
+    def filter(self, table):
+        '''Rows of table that satisfy every predicate'''
+        if not self.predicates:
+            return table
+        return table[self.mask(table)]
+
+    def predicate(self, field):
+        '''The predicate on field, None if there is none or several'''
+        predicates = [predicate for predicate_field, predicate in self.predicates if predicate_field == field]
+        return predicates[0] if len(predicates) == 1 else None
+
+    def bounds(self, field):
+        '''Conservative (low, high) limits of field values this query can match, None when unbounded'''
+        lows, highs = [], []
+        for predicate_field, predicate in self.predicates:
+            if predicate_field == field:
+                low, high = predicate.bounds()
+                if low is not None:
+                    lows.append(low)
+                if high is not None:
+                    highs.append(high)
+        return max(lows) if lows else None, min(highs) if highs else None
+
+
+@lru_cache(maxsize=256)
+def compile_query(conditions):
+    '''Compile a tuple of (field, kind, expression[, ignore_case]) into a Query, skipping None expressions, cached'''
+    return Query([(field, compile_filter(kind, expression, *options)) for field, kind, expression, *options in conditions if expression is not None])
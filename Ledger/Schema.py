@@ -0,0 +1,169 @@
+'''Typed schema of the ledger tables, shared by every reader of bills and savings.
+
+    Date                 datetime64, stored as yyyy-mm-dd and parsed with that explicit format
+    Total                int64 cents, exact; ExactFloat objects when a total has more fraction digits than cents
+    Category, Essential  category dtype
+    Name (other fields)  object strings, interned so repeated names share one object
+
+Empty values are missing (NaT / NaN). A row that does not match the schema is rejected
+with a ValueError naming its line in the ledger (the header is line 1).
+'''
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ExactCalc.ExactFloat import ExactFloat
+from Ledger.ColumnStore import format_cents, to_exact
+from Ledger.Files import CATEGORY_COLUMNS, DATE_COLUMN, TOTAL_COLUMN, TSV_DATE_FORMAT
+from Ledger.Profile import phase, count_rows
+
+'''Types read_csv reads the ledger fields as before to_typed: the C parser converts totals to floats and builds the
+categories, the other fields stay strings'''
+READ_DTYPES = {'Name': object, 'Category': 'category', 'Essential': 'category', 'Date': object, 'Total': np.float64}
+'''Totals up to 2**53 cents are exact as floats'''
+MAX_CENTS = 2 ** 53
+'''Below 10**15 cents the float nearest to cents / 100 rounds back to the exact cents when printed with 2 decimals'''
+MAX_FORMAT_CENTS = 10 ** 15
+
+
+def get_line(table, row):
+    '''Line of the ledger holding the row at position row of table (index = row position)'''
+    return int(table.index[row]) + 2
+
+def check(table, invalid, message):
+    '''Raise ValueError with the line of the first invalid row'''
+    if invalid.any():
+        raise ValueError(f'Line {get_line(table, int(np.argmax(invalid)))}: {message}')
+
+def intern_strings(values):
+    '''Object array of strings values with one shared string object per distinct value, NaN for empty values'''
+    codes, uniques = pd.factorize(values)
+    '''Code -1 (missing) takes the NaN appended at the end'''
+    uniques = np.append(np.asarray(uniques, dtype=object), np.nan)
+    empty = np.flatnonzero(uniques == '')
+    if len(empty):
+        codes[codes == empty[0]] = -1
+    return uniques[codes]
+
+def to_dates(values):
+    '''Parse yyyy-mm-dd strings, NaT for anything else'''
+    return pd.to_datetime(values, format=TSV_DATE_FORMAT, errors='coerce')
+
+def to_floats(table):
+    '''Total column of table as floats, raise ValueError with the line of the first total that is not a number'''
+    totals = table[TOTAL_COLUMN]
+    if totals.dtype.kind == 'f':
+        return totals.to_numpy()
+    try:
+        return totals.to_numpy(dtype=object).astype(float)
+    except ValueError:
+        for row, total in enumerate(totals):
+            try:
+                float(total)
+            except ValueError:
+                raise ValueError(f'Line {get_line(table, row)}: Total not valid.') from None
+        raise
+
+def get_cents(values):
+    '''Float totals as int64 cents, None when one is not a whole number of cents. A float equal to cents / 100 is the
+    nearest one to that number of cents'''
+    cents = np.round(values * 100)
+    if not ((np.abs(cents) < MAX_CENTS) & (cents / 100 == values)).all():
+        return None
+    return cents.astype(np.int64)
+
+def to_exact_totals(table):
+    '''Total column of table (strings) as an object array of ExactFloat, raise ValueError with the line of the first
+    total that is not a number'''
+    totals = table[TOTAL_COLUMN].to_numpy(dtype=object)
+    values = np.empty(len(totals), dtype=object)
+    for row, total in enumerate(totals):
+        try:
+            values[row] = ExactFloat(str(total))
+        except (ValueError, IndexError):
+            raise ValueError(f'Line {get_line(table, row)}: Total not valid.') from None
+    return values
+
+def to_totals(table):
+    '''Total column of table (strings or floats) as int64 cents when every total is a whole number of cents, else as
+    ExactFloat objects parsed from the strings. Raise ValueError with the line of the first total that is not a number'''
+    cents = get_cents(to_floats(table))
+    return to_exact_totals(table) if cents is None else cents
+
+def to_typed(table):
+    '''Convert a DataFrame of ledger strings (empty values as '', index = row position) to the typed schema.
+    Totals may already be floats and category columns categories of those strings, as read_typed reads them'''
+    data = dict()
+    for field in table.columns:
+        if field == DATE_COLUMN:
+            dates = to_dates(table[field])
+            check(table, dates.isna().to_numpy(), 'Date not valid.')
+            data[field] = dates.to_numpy()
+        elif field == TOTAL_COLUMN:
+            data[field] = to_totals(table)
+        elif field in CATEGORY_COLUMNS:
+            categories = pd.Categorical(table[field])
+            data[field] = categories.remove_categories(['']) if '' in categories.categories else categories
+        else:
+            data[field] = intern_strings(table[field].to_numpy(dtype=object))
+    return pd.DataFrame(data, columns=table.columns, index=table.index)
+
+def read_frame(source, **options):
+    '''read_csv of ledger rows with the C parser converting totals to floats. When a total is not a number (to report
+    its line) or not a whole number of cents (to keep it exact) the totals are read again as text'''
+    try:
+        table = pd.read_csv(source, dtype=READ_DTYPES, **options)
+        if get_cents(table[TOTAL_COLUMN].to_numpy()) is not None:
+            return table
+    except ValueError:
+        pass
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(source, dtype={**READ_DTYPES, TOTAL_COLUMN: object}, **options)
+
+def read_typed(source, chunksize=None):
+    '''Read a TSV ledger (path or buffer) into the typed schema, as an iterator of DataFrames of chunksize
+    rows when chunksize is given'''
+    options = dict(sep='\t', header=0, keep_default_na=False)
+    if chunksize:
+        dtypes = {**READ_DTYPES, TOTAL_COLUMN: object}
+        return (to_typed(chunk) for chunk in pd.read_csv(source, dtype=dtypes, chunksize=chunksize, **options))
+    with phase('read_csv'):
+        table = read_frame(source, **options)
+        count_rows(len(table))
+    with phase('to_typed'):
+        return to_typed(table)
+
+def to_object_categories(values):
+    '''Categorical of values with object categories, so that categoricals of empty and non-empty tables can be combined'''
+    values = pd.Categorical(values)
+    return values if values.categories.dtype == object else values.set_categories(values.categories.astype(object))
+
+def concat_typed(tables):
+    '''Concatenate typed tables keeping category columns as categories, and totals as ExactFloat objects when the
+    totals of a table are'''
+    kinds = {table[TOTAL_COLUMN].dtype.kind for table in tables if TOTAL_COLUMN in table.columns}
+    if len(kinds) > 1:
+        tables = [table.assign(**{TOTAL_COLUMN: to_exact(table[TOTAL_COLUMN].to_numpy())}) if table[TOTAL_COLUMN].dtype.kind in 'iu' else table for table in tables]
+    result = pd.concat(tables)
+    for field in CATEGORY_COLUMNS:
+        if field in result.columns and len(tables) > 1:
+            result[field] = pd.Categorical(union_categoricals([to_object_categories(table[field]) for table in tables], ignore_order=True))
+    return result
+
+def format_money(cents):
+    '''Money strings ("12.50") of an array of int64 cents, formatted from floats (faster than joining numpy strings)
+    when that is exact. ExactFloat totals print all their fraction digits'''
+    if np.asarray(cents).dtype == object:
+        return np.array([str(value) for value in cents], dtype=object)
+    cents = np.asarray(cents, dtype=np.int64)
+    if len(cents) and np.abs(cents).max() >= MAX_FORMAT_CENTS:
+        return format_cents(cents)
+    return np.array([f'{value:.2f}' for value in (cents / 100).tolist()], dtype=object)
+
+def format_totals(table):
+    '''Copy of a typed table with Total as money strings, for printing and TSV files'''
+    if TOTAL_COLUMN not in table.columns:
+        return table
+    return table.assign(**{TOTAL_COLUMN: format_money(table[TOTAL_COLUMN])})
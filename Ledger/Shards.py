@@ -0,0 +1,223 @@
+'''Ledger split by time into one TSV file per year or per month (shards), with a catalog of the shards.
+
+    finance.csv  ->  finance.shards/2021.csv, 2022.csv, ...       (year)
+                     finance.shards/2021-01.csv, 2021-02.csv, ...  (month)
+
+Every shard is a complete ledger with its header, journal, indexes, aggregate cache and writer lock,
+so adding or deleting a bill touches one shard and a query with a date window reads only the shards
+that can hold it. catalog.json keeps the period and, for every shard, its first and last date, its
+number of rows and the size and mtime they were counted at: like the other caches an entry is counted
+again when its shard changed, rows appended through add_rows() keep it current. Row positions of the
+whole ledger are the positions in each shard plus the rows of the shards before it.
+'''
+
+import os
+import re
+import csv
+import json
+import stat
+import shutil
+from contextlib import ExitStack
+
+from Ledger.AggregateCache import get_cache_path
+from Ledger.Files import SIDECAR_DIRECTORY_SUFFIXES, get_file_stamp, get_sidecar_path, get_temp_path, is_blank, make_temp_directory, replace_directory, read_chunks, write_atomic
+from Ledger.Journal import Journal
+from Ledger.Profile import timed
+from Ledger.Writer import FSYNC_ALWAYS, commit, ledger_lock, sync, sync_directory
+
+YEAR = 'year'
+MONTH = 'month'
+PERIODS = (YEAR, MONTH)
+CATALOG_FILE = 'catalog.json'
+'''Length of the yyyy or yyyy-mm key of a yyyy-mm-dd date'''
+KEY_LENGTHS = {YEAR: 4, MONTH: 7}
+KEY_PATTERNS = {YEAR: re.compile(r'\d{4}'), MONTH: re.compile(r'\d{4}-\d{2}')}
+
+
+def get_shard_directory(tsv_path):
+    '''Directory holding the shards of a TSV ledger, e.g. finance.csv -> finance.shards'''
+    return get_sidecar_path(tsv_path, '.shards')
+
+def is_sharded(tsv_path):
+    '''True if the ledger was moved to shards'''
+    return os.path.exists(os.path.join(get_shard_directory(tsv_path), CATALOG_FILE))
+
+def get_period_key(date, period):
+    '''Key of the shard of a date (date, datetime64, Timestamp or yyyy-mm-dd text): "yyyy" or "yyyy-mm"'''
+    key = str(date)[:KEY_LENGTHS[period]]
+    if not KEY_PATTERNS[period].fullmatch(key):
+        raise ValueError('Date not valid.')
+    return key
+
+def count_shard(path):
+    '''Catalog entry of a shard file: rows, first and last date (yyyy-mm-dd, None when empty) and file stamp'''
+    import pandas as pd
+    source = get_file_stamp(path)
+    dates = pd.read_csv(path, sep='\t', header=0, usecols=['Date'], dtype=str, keep_default_na=False)['Date']
+    dates = dates[dates != '']
+    return {'rows': len(dates), 'first': dates.min() if len(dates) else None, 'last': dates.max() if len(dates) else None, 'source': source}
+
+
+class ShardCatalog:
+    '''Shards of a ledger and their catalog, see the module documentation'''
+    def __init__(self, tsv_path, fields):
+        self.tsv_path = tsv_path
+        self.fields = fields
+        self.directory = get_shard_directory(tsv_path)
+        self.catalog_path = os.path.join(self.directory, CATALOG_FILE)
+        with open(self.catalog_path, 'r') as file:
+            data = json.load(file)
+        self.period = data['period']
+        self.shards = data['shards']
+        self.current = {key for key in self.names() if key in self.shards and self.shards[key]['source'] == get_file_stamp(self.path(key))}
+
+    def path(self, key):
+        '''Shard file of a key, it may not exist yet'''
+        return os.path.join(self.directory, f'{key}.csv')
+
+    def key(self, date):
+        return get_period_key(date, self.period)
+
+    def names(self):
+        '''Keys of the shard files, in date order'''
+        names = [name[:-4] for name in os.listdir(self.directory) if name.endswith('.csv')]
+        return sorted(name for name in names if KEY_PATTERNS[self.period].fullmatch(name))
+
+    def save(self):
+        write_atomic(self.catalog_path, json.dumps({'period': self.period, 'shards': self.shards}))
+
+    def refresh(self):
+        '''Count again the shards changed since their entry was written, drop the entries of removed shards'''
+        names = self.names()
+        stale = [key for key in names if key not in self.current]
+        for key in stale:
+            self.shards[key] = count_shard(self.path(key))
+            self.current.add(key)
+        removed = [key for key in self.shards if key not in names]
+        for key in removed:
+            del self.shards[key]
+        if stale or removed:
+            self.save()
+        return self.shards
+
+    def keys(self, low=None, high=None):
+        '''Keys of the shards that can hold rows with low <= date <= high (dates or None), in date order'''
+        low = None if low is None else str(low)[:10]
+        high = None if high is None else str(high)[:10]
+        shards = self.refresh()
+        return [
+            key for key in sorted(shards) if shards[key]['rows']
+            and (low is None or shards[key]['last'] >= low) and (high is None or shards[key]['first'] <= high)
+        ]
+
+    def offsets(self):
+        '''Dict key -> position in the whole ledger of the first row of the shard'''
+        offsets = dict()
+        position = 0
+        for key, entry in sorted(self.refresh().items()):
+            offsets[key] = position
+            position += entry['rows']
+        return offsets
+
+    def create(self, key):
+        '''Path of the shard of key, created with a header when missing. Call holding the ledger lock'''
+        path = self.path(key)
+        if not os.path.exists(path):
+            write_atomic(path, '\t'.join(self.fields) + '\r\n')
+            self.shards[key] = {'rows': 0, 'first': None, 'last': None, 'source': get_file_stamp(path)}
+            self.current.add(key)
+            self.save()
+        return path
+
+    def add_rows(self, rows):
+        '''Record rows (dicts with Date) appended to their shards, call after writing them. Entries that were not
+        current are counted again on the next lookup'''
+        touched = False
+        for row in rows:
+            key = self.key(row['Date'])
+            if key in self.current:
+                entry = self.shards[key]
+                date = str(row['Date'])[:10]
+                entry['rows'] += 1
+                entry['first'] = date if entry['first'] is None else min(entry['first'], date)
+                entry['last'] = date if entry['last'] is None else max(entry['last'], date)
+                touched = True
+        for key in {self.key(row['Date']) for row in rows} & self.current:
+            self.shards[key]['source'] = get_file_stamp(self.path(key))
+        if touched:
+            self.save()
+
+    @classmethod
+    @timed('shard split')
+    def split(cls, tsv_path, fields, period, fsync=FSYNC_ALWAYS):
+        '''Move the rows of a TSV ledger (deleted rows dropped) to shards of period, remove the TSV file and its
+        indexes and caches, return the catalog. Call holding the ledger lock'''
+        if period not in PERIODS:
+            raise ValueError('Period not valid.')
+        commit(tsv_path, fields, fsync=fsync)
+        Journal(tsv_path, fields).compact(fsync)
+        directory = get_shard_directory(tsv_path)
+        temp_directory = make_temp_directory(directory)
+        shards = dict()
+        with open(tsv_path, 'r', newline='') as file:
+            header_line = file.readline()
+            date_column = next(csv.reader([header_line], delimiter='\t')).index('Date')
+            line_number = 1
+            for lines in read_chunks(file):
+                parts = dict()
+                for line, row in zip(lines, csv.reader(lines, delimiter='\t')):
+                    line_number += 1
+                    if is_blank(line):
+                        continue
+                    try:
+                        key = get_period_key(row[date_column], period)
+                    except ValueError:
+                        raise ValueError(f'Line {line_number}: Date not valid.') from None
+                    part = parts.setdefault(key, ([], []))
+                    part[0].append(line)
+                    part[1].append(row[date_column])
+                for key, (part, dates) in parts.items():
+                    entry = shards.setdefault(key, {'rows': 0, 'first': min(dates), 'last': max(dates)})
+                    entry.update(rows=entry['rows'] + len(part), first=min(entry['first'], min(dates)), last=max(entry['last'], max(dates)))
+                    with open(os.path.join(temp_directory, f'{key}.csv'), 'a', newline='') as shard:
+                        if entry['rows'] == len(part):
+                            shard.write(header_line)
+                        shard.writelines(part)
+                        sync(shard, fsync)
+        mode = stat.S_IMODE(os.stat(tsv_path).st_mode)
+        for key, entry in shards.items():
+            os.chmod(os.path.join(temp_directory, f'{key}.csv'), mode)
+            entry['source'] = get_file_stamp(os.path.join(temp_directory, f'{key}.csv'))
+        with open(os.path.join(temp_directory, CATALOG_FILE), 'w') as file:
+            json.dump({'period': period, 'shards': shards}, file)
+        replace_directory(temp_directory, directory)
+        sync_directory(directory, fsync)
+        os.remove(tsv_path)
+        if os.path.exists(get_cache_path(tsv_path)):
+            os.remove(get_cache_path(tsv_path))
+        for suffix in SIDECAR_DIRECTORY_SUFFIXES:
+            shutil.rmtree(get_sidecar_path(tsv_path, suffix), ignore_errors=True)
+        return cls(tsv_path, fields)
+
+    @timed('shard merge')
+    def merge(self, fsync=FSYNC_ALWAYS):
+        '''Write the rows of every shard (deleted rows dropped), shard after shard, back to the TSV ledger and
+        remove the shards. Call holding the ledger lock, the lock of every shard is held until they are removed'''
+        temp_path = get_temp_path(self.tsv_path)
+        names = self.names()
+        with ExitStack() as locks, open(temp_path, 'w', newline='') as temp_file:
+            csv.writer(temp_file, delimiter='\t').writerow(self.fields)
+            for key in names:
+                path = self.path(key)
+                locks.enter_context(ledger_lock(path))
+                commit(path, self.fields, fsync=fsync)
+                Journal(path, self.fields).compact(fsync)
+                with open(path, 'r', newline='') as shard:
+                    shard.readline()
+                    shutil.copyfileobj(shard, temp_file)
+            sync(temp_file, fsync)
+            if names:
+                os.chmod(temp_path, stat.S_IMODE(os.stat(self.path(names[0])).st_mode))
+            os.replace(temp_path, self.tsv_path)
+            sync_directory(self.tsv_path, fsync)
+            shutil.rmtree(self.directory)
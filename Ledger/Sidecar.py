@@ -0,0 +1,92 @@
+import os
+import csv
+import json
+
+import numpy as np
+
+from Ledger.Files import BLANK_CHARACTERS, READ_BLOCK, META_FILE, is_appended, is_blank, make_temp_directory, read_meta, read_tail_check, replace_directory
+
+
+def find_lines(path):
+    '''Return (byte offset of the start, row mask) of every line of a file. A line is a row unless it is blank (see
+    Files.is_blank), blank lines are skipped by read_csv'''
+    newlines, blanks = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    position = 0
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(READ_BLOCK)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            blank = np.zeros(len(data), dtype=bool)
+            for character in BLANK_CHARACTERS.encode():
+                blank |= data == character
+            newlines.append(np.flatnonzero(data == 10).astype(np.int64) + position)
+            blanks.append(np.flatnonzero(blank).astype(np.int64) + position)
+            position += len(block)
+    newlines, blanks = np.concatenate(newlines), np.concatenate(blanks)
+    starts = np.concatenate([np.zeros(1, dtype=np.int64), newlines + 1])
+    ends = np.append(newlines + 1, position)
+    '''A line is a row when it holds fewer blank characters than bytes'''
+    return starts, np.searchsorted(blanks, ends) - np.searchsorted(blanks, starts) < ends - starts
+
+def find_row_starts(path):
+    '''Byte offset of the start of every row of a TSV file, header included, so the offset of data row i is at
+    index i + 1'''
+    starts, rows = find_lines(path)
+    return starts[rows]
+
+def read_appended_rows(tsv_path, size):
+    '''Return (rows as lists, byte offsets, end offset) of the complete lines written after the first size bytes'''
+    with open(tsv_path, 'rb') as file:
+        file.seek(size)
+        data = file.read()
+    lines = data.splitlines(keepends=True)
+    if lines and not lines[-1].endswith(b'\n'):
+        lines = lines[:-1]
+    offsets = np.cumsum([size] + [len(line) for line in lines[:-1]]).astype(np.int64)[:len(lines)]
+    rows = list(csv.reader([line.decode() for line in lines], delimiter='\t'))
+    keep = [index for index, line in enumerate(lines) if not is_blank(line)]
+    return [rows[index] for index in keep], offsets[keep], size + sum(len(line) for line in lines)
+
+
+class Sidecar:
+    '''Directory of arrays (one .npy file each) and a meta file derived from a TSV ledger, kept next to it.
+
+    The meta file holds the inode of the ledger, the size of the part the arrays cover and the last
+    bytes of that part, so the directory stays valid while the ledger is only appended to. The whole
+    directory is written aside and swapped in, readers see either the old or the new arrays.
+    '''
+    '''Layout version written to the meta file, directories of another version are not valid'''
+    VERSION = None
+
+    def __init__(self, directory, meta=None):
+        '''Arrays in directory, described by meta (read from the directory when None). A directory with a missing or
+        partial meta file is not valid'''
+        self.directory = directory
+        self.meta = read_meta(directory) if meta is None else meta
+
+    def is_valid(self, tsv_path):
+        '''True if tsv_path is the file the directory was written from, possibly with rows appended'''
+        return bool(self.meta) and self.meta.get('version') == self.VERSION and is_appended(tsv_path, self.meta)
+
+    def column(self, name):
+        '''Array of the directory as a read-only memory map (no copy)'''
+        path = os.path.join(self.directory, f'{name}.npy')
+        if self.meta['rows'] == 0:
+            return np.load(path)
+        return np.load(path, mmap_mode='r')
+
+    def write(self, tsv_path, arrays, size, meta):
+        '''Replace the directory with arrays (dict name -> array) and meta, covering the first size bytes of tsv_path'''
+        temp_directory = make_temp_directory(self.directory)
+        for name, values in arrays.items():
+            np.save(os.path.join(temp_directory, f'{name}.npy'), np.ascontiguousarray(values))
+        meta = {
+            'version': self.VERSION, **meta,
+            'inode': os.stat(tsv_path).st_ino, 'size': size, 'tail_check': read_tail_check(tsv_path, size)
+        }
+        with open(os.path.join(temp_directory, META_FILE), 'w') as file:
+            json.dump(meta, file)
+        replace_directory(temp_directory, self.directory)
+        self.meta = meta
@@ -0,0 +1,65 @@
+import os
+import csv
+import heapq
+import tempfile
+from itertools import islice
+
+from Ledger.Files import CHUNK_SIZE, TSV_DATE_FORMAT
+from Ledger.Journal import Journal
+from Ledger.Schema import read_typed, format_money
+
+MERGE_FAN_IN = 64
+
+
+def run_key(row):
+    '''Sort key of a run row: (yyyy-mm-dd date, position in the ledger)'''
+    return row[0], int(row[1])
+
+def read_run(path):
+    '''Yield the rows of a sorted run file'''
+    with open(path, 'r', newline='') as file:
+        yield from csv.reader(file, delimiter='\t')
+
+def write_run(rows, directory):
+    '''Write sorted rows to a new run file in directory, return its path'''
+    descriptor, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(descriptor, 'w', newline='') as file:
+        csv.writer(file, delimiter='\t').writerows(rows)
+    return path
+
+def merge_runs(paths, directory, limit=None):
+    '''Merge sorted run files into one (keeping at most limit rows), remove the inputs and return the new path'''
+    merged = islice(heapq.merge(*[read_run(path) for path in paths], key=run_key), limit)
+    path = write_run(merged, directory)
+    for run in paths:
+        os.remove(run)
+    return path
+
+def stream_ledger(path, fields, filter_chunk, limit=None, offset=0, chunk_size=CHUNK_SIZE):
+    '''Yield [position, *fields] of the ledger rows kept by filter_chunk, sorted by date, in bounded memory.
+
+    The ledger is read chunk_size rows at a time. Each chunk (typed, deleted rows dropped)
+    is filtered, sorted and written to a temporary run file; runs are merged with a k-way merge.
+    With a limit only the first offset + limit rows of every run are kept.
+    '''
+    keep = None if limit is None else offset + limit
+    journal = Journal(path, fields)
+    cutoffs = journal.cutoffs()
+    with tempfile.TemporaryDirectory(prefix='finances-') as directory:
+        runs = []
+        for chunk in read_typed(path, chunksize=chunk_size):
+            chunk = filter_chunk(journal.apply(chunk, cutoffs) if cutoffs else chunk)
+            if chunk.empty:
+                continue
+            chunk = chunk.sort_values(by='Date', kind='mergesort')
+            if keep is not None:
+                chunk = chunk.head(keep)
+            dates = chunk['Date'].dt.strftime(TSV_DATE_FORMAT)
+            columns = [dates if field == 'Date' else format_money(chunk[field]) if field == 'Total' else chunk[field].astype(object).fillna('') for field in fields]
+            runs.append(write_run(zip(dates, chunk.index, *columns), directory))
+            if len(runs) >= MERGE_FAN_IN:
+                runs = [merge_runs(runs, directory, keep)]
+        merged = heapq.merge(*[read_run(run) for run in runs], key=run_key)
+        stop = None if limit is None else offset + limit
+        for row in islice(merged, offset, stop):
+            yield [int(row[1]), *row[2:]]
@@ -0,0 +1,144 @@
+import os
+import json
+from bisect import bisect_left, bisect_right
+
+from ExactCalc.ExactFloat import ExactFloat, MIN_SCALE
+from Ledger.Files import get_file_stamp, get_sidecar_path, write_atomic
+from Ledger.Journal import Journal
+from Ledger.Profile import timed
+
+DAY = 'day'
+MONTH = 'month'
+
+
+def get_timeline_path(tsv_path):
+    '''File holding the running balances of a TSV ledger, e.g. savings.csv -> savings.timeline.json'''
+    return get_sidecar_path(tsv_path, '.timeline.json')
+
+
+class Timeline:
+    '''Running balance per name of a saving ledger, by day.
+
+    For every name the cache keeps the sorted days ("yyyy-mm-dd") that have rows and the
+    cumulative balance at the end of each of them, as integers in units of 10**-scale. The balance
+    as of a date is the entry of the last day before or on it, found by bisection. Like the
+    aggregate cache it remembers size and mtime of the ledger: open it before writing, add() and
+    remove() keep it current, otherwise it is rebuilt on the next lookup.
+    '''
+    def __init__(self, tsv_path, fields):
+        self.tsv_path = tsv_path
+        self.cache_path = get_timeline_path(tsv_path)
+        self.fields = fields
+        self.names = dict()
+        self.scale = MIN_SCALE
+        self.current = False
+        if os.path.exists(self.cache_path) and os.path.exists(tsv_path):
+            with open(self.cache_path, 'r') as file:
+                data = json.load(file)
+            if data['source'] == get_file_stamp(tsv_path):
+                self.names = data['names']
+                self.scale = data['scale']
+                self.current = True
+
+    @timed('timeline rebuild')
+    def rebuild(self):
+        '''Recompute every balance from the ledger with a grouped cumulative sum and save the cache'''
+        import pandas as pd
+        from Ledger.ColumnStore import to_scaled
+        table = pd.read_csv(self.tsv_path, sep='\t', header=0, dtype=str, keep_default_na=False)
+        days = table['Date']
+        table['Date'] = pd.to_datetime(days)
+        table = Journal(self.tsv_path, self.fields).apply(table)
+        totals, scale = to_scaled(table['Total'])
+        daily = pd.DataFrame({'Name': table['Name'], 'Day': days[table.index].str[:10], 'Total': totals}).groupby(['Name', 'Day'], sort=True)['Total'].sum()
+        balances = daily.groupby(level='Name', sort=False).cumsum()
+        names = {name: [[], []] for name in pd.unique(table['Name'])}
+        for (name, day), balance in zip(balances.index, balances.tolist()):
+            names[name][0].append(day)
+            names[name][1].append(balance)
+        self.names = names
+        self.scale = scale
+        self.current = True
+        self.save()
+
+    def save(self):
+        '''Write the cache stamped with the current size and mtime of the ledger'''
+        data = {'source': get_file_stamp(self.tsv_path), 'scale': self.scale, 'names': self.names}
+        write_atomic(self.cache_path, json.dumps(data))
+
+    def update(self, row, count):
+        '''Add count times row (a dict with Name, Date and Total) to the balances of its name from its day on'''
+        total = ExactFloat(str(row['Total']))
+        if total.scale > self.scale:
+            factor = 10 ** (total.scale - self.scale)
+            for _, balances in self.names.values():
+                balances[:] = [balance * factor for balance in balances]
+            self.scale = total.scale
+        amount = total.rescale(self.scale).scaled * count
+        day = str(row['Date'])[:10]
+        days, balances = self.names.setdefault(row['Name'], [[], []])
+        index = bisect_left(days, day)
+        if index == len(days) or days[index] != day:
+            days.insert(index, day)
+            balances.insert(index, balances[index - 1] if index else 0)
+        for position in range(index, len(balances)):
+            balances[position] += amount
+
+    def add(self, row, count=1):
+        '''Record rows appended to the ledger, call after writing them'''
+        if self.current:
+            self.update(row, count)
+            self.save()
+
+    def add_rows(self, rows):
+        '''Record many rows appended to the ledger at once, call after writing them'''
+        if self.current:
+            for row in rows:
+                self.update(row, 1)
+            self.save()
+
+    def remove(self, row, count=1):
+        '''Record count rows equal to row deleted from the ledger'''
+        if self.current and count:
+            self.update(row, -count)
+            self.save()
+
+    def balance(self, name, date=None):
+        '''Balance of name as of date (yyyy-mm-dd, the last day when None) as ExactFloat'''
+        if not self.current:
+            self.rebuild()
+        days, balances = self.names.get(name, [[], []])
+        index = len(days) if date is None else bisect_right(days, str(date))
+        return ExactFloat.from_scaled(balances[index - 1] if index else 0, self.scale)
+
+    def balances(self, date=None):
+        '''Dict name -> balance as ExactFloat as of date (yyyy-mm-dd, the last day when None)'''
+        if not self.current:
+            self.rebuild()
+        return {name: self.balance(name, date) for name in self.names}
+
+    def series(self, frequency=DAY):
+        '''DataFrame of the balance of every name (columns) at the end of every day or month (index "yyyy-mm-dd"
+        or "yyyy-mm") from the first row to the last one, balances as decimal strings'''
+        import numpy as np
+        import pandas as pd
+        from Ledger.ColumnStore import format_scaled
+        if not self.current:
+            self.rebuild()
+        all_days = sorted({day for days, _ in self.names.values() for day in days})
+        if not all_days:
+            return pd.DataFrame(columns=list(self.names))
+        if frequency == MONTH:
+            periods = pd.period_range(all_days[0][:7], all_days[-1][:7], freq='M')
+            labels = [str(period) for period in periods]
+            ends = np.array([str(period.end_time.date()) for period in periods])
+        else:
+            labels = all_days
+            ends = np.array(all_days)
+        table = pd.DataFrame(index=pd.Index(labels, name='Date'))
+        for name, (days, balances) in self.names.items():
+            positions = np.searchsorted(np.array(days, dtype=str), ends, side='right') - 1
+            '''Position -1 (before the first day of the name) picks the 0 appended at the end'''
+            values = np.array(balances + [0], dtype=np.int64)[positions]
+            table[name] = format_scaled(values, self.scale)
+        return table
@@ -0,0 +1,211 @@
+'''Coordination of processes writing to the same ledger.
+
+Every write (append, journaled delete, import, compaction) happens while holding an exclusive
+advisory lock (flock, or a msvcrt lock of its first byte on Windows) on the .lock file next to the ledger; readers take no lock, as the ledger
+only grows by whole lines or is replaced by a rename. Appends are group committed: a writer that
+finds the lock free appends its rows directly; otherwise its rows are dropped in the .spool
+directory next to the ledger, then whichever writer gets the lock appends every spooled row in
+one write and one fsync. A writer whose rows were committed by another one while it waited for
+the lock has nothing left to do. Before the write the spool files are renamed to .committing files
+named after the ledger inode and the offset their rows go to, so after a crash the next commit
+tells the rows that reached the ledger from those to append again.
+'''
+
+import io
+import os
+import csv
+import time
+from itertools import count
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from Ledger.Files import get_sidecar_path
+from Ledger.Profile import timed, count_rows
+
+FSYNC_ALWAYS = 'always'
+FSYNC_NEVER = 'never'
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_NEVER)
+
+HELD_LOCKS = set()
+SPOOL_NUMBERS = count()
+'''Wait between two attempts to take a lock held by another process, on Windows'''
+LOCK_RETRY_SECONDS = 0.01
+SPOOLED = '.rows'
+COMMITTING = '.committing'
+
+
+def get_lock_path(tsv_path):
+    '''File locked by writers of a TSV ledger, e.g. finance.csv -> finance.lock'''
+    return get_sidecar_path(tsv_path, '.lock')
+
+def get_spool_path(tsv_path):
+    '''Directory holding rows waiting to be appended to a TSV ledger, e.g. finance.csv -> finance.spool'''
+    return get_sidecar_path(tsv_path, '.spool')
+
+def lock_file(file, blocking=True):
+    '''Take the exclusive lock of an open file. Return True once held; with blocking False return False at once when
+    another process holds it'''
+    if fcntl is not None:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(LOCK_RETRY_SECONDS)
+
+def unlock_file(file):
+    '''Release the lock taken with lock_file()'''
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def ledger_lock(tsv_path, blocking=True):
+    '''Hold the exclusive writer lock of a ledger, re-entrant within a process. Yield True once held; with blocking
+    False yield False at once when another process holds it'''
+    if tsv_path in HELD_LOCKS:
+        yield True
+        return
+    with open(get_lock_path(tsv_path), 'a') as file:
+        if not lock_file(file, blocking):
+            yield False
+            return
+        HELD_LOCKS.add(tsv_path)
+        try:
+            yield True
+        finally:
+            HELD_LOCKS.discard(tsv_path)
+            unlock_file(file)
+
+def sync(file, fsync=FSYNC_ALWAYS):
+    '''Flush an open file and, with the always policy, force it to disk'''
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError('Fsync policy not valid.')
+    file.flush()
+    if fsync == FSYNC_ALWAYS:
+        os.fsync(file.fileno())
+
+def sync_directory(path, fsync=FSYNC_ALWAYS):
+    '''With the always policy, force to disk the directory entry of path after a rename. Windows cannot open a
+    directory, it commits renames itself'''
+    if fsync == FSYNC_ALWAYS and os.name != 'nt':
+        descriptor = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+def format_rows(fields, rows):
+    '''Ledger lines of rows (dicts of fields) as bytes'''
+    buffer = io.StringIO(newline='')
+    csv.DictWriter(buffer, fields, delimiter='\t').writerows(rows)
+    return buffer.getvalue().encode()
+
+def spool_rows(tsv_path, fields, rows):
+    '''Write rows (dicts of fields) as ledger lines to a new file of the spool, return its path'''
+    directory = get_spool_path(tsv_path)
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.join(directory, f'{time.time_ns():020d}-{os.getpid()}-{next(SPOOL_NUMBERS)}')
+    with open(f'{name}.tmp', 'w', newline='') as file:
+        csv.DictWriter(file, fields, delimiter='\t').writerows(rows)
+    '''The rename makes the file visible to committers only once it is complete'''
+    os.replace(f'{name}.tmp', f'{name}{SPOOLED}')
+    return f'{name}{SPOOLED}'
+
+def get_committing_path(path, inode, offset):
+    '''Name a spool file takes while its rows are appended at offset of the ledger of inode'''
+    return f'{path[:-len(SPOOLED)]}.{inode}-{offset}{COMMITTING}'
+
+def recover(tsv_path, fsync=FSYNC_ALWAYS):
+    '''Finish the commit of a writer that crashed, call with the lock held before writing or rewriting the ledger.
+    A .committing file whose rows are in the ledger at its offset was committed and is removed; the others are
+    spooled again, after cutting off the ledger the part of their rows a torn write left at its end'''
+    directory = get_spool_path(tsv_path)
+    committing = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith(COMMITTING):
+            stem, position = name[:-len(COMMITTING)].rsplit('.', 1)
+            inode, offset = map(int, position.split('-'))
+            committing.append((offset, inode, os.path.join(directory, name), os.path.join(directory, f'{stem}{SPOOLED}')))
+    if not committing:
+        return
+    ledger = os.stat(tsv_path)
+    for offset, inode, path, spooled_path in sorted(committing):
+        with open(path, 'rb') as file:
+            rows = file.read()
+        with open(tsv_path, 'rb') as file:
+            file.seek(offset)
+            written = file.read(len(rows))
+        if inode == ledger.st_ino and written == rows:
+            os.remove(path)
+            continue
+        if inode == ledger.st_ino and written and rows.startswith(written) and offset + len(written) == ledger.st_size:
+            os.truncate(tsv_path, offset)
+            ledger = os.stat(tsv_path)
+        os.replace(path, spooled_path)
+    sync_directory(path, fsync)
+
+@timed('group commit')
+def commit(tsv_path, fields, get_caches=None, fsync=FSYNC_ALWAYS, data=b''):
+    '''Append every spooled row, then the ledger lines data, to the ledger in one write, with the lock held.
+    get_caches is called before writing and returns the caches whose add_rows() records the rows after. Return the
+    committed rows as dicts. The rows of a crashed commit are committed once: see recover()'''
+    directory = get_spool_path(tsv_path)
+    recover(tsv_path, fsync)
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SPOOLED)) if os.path.isdir(directory) else []
+    if not paths and not data:
+        return []
+    caches = get_caches() if get_caches else []
+    spooled = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            spooled.append(file.read())
+    '''Each spool file records where its rows go before they are written'''
+    ledger = os.stat(tsv_path)
+    offset = ledger.st_size
+    committing = []
+    for path, rows in zip(paths, spooled):
+        committing.append(get_committing_path(path, ledger.st_ino, offset))
+        os.replace(path, committing[-1])
+        offset += len(rows)
+    if committing:
+        sync_directory(committing[0], fsync)
+    data = b''.join([*spooled, data])
+    with open(tsv_path, 'ab') as file:
+        file.write(data)
+        sync(file, fsync)
+    rows = list(csv.DictReader(io.StringIO(data.decode(), newline=''), fieldnames=fields, delimiter='\t'))
+    count_rows(len(rows))
+    for cache in caches:
+        cache.add_rows(rows)
+    for path in committing:
+        os.remove(path)
+    return rows
+
+def append_rows(tsv_path, fields, rows, get_caches=None, fsync=FSYNC_ALWAYS):
+    '''Append rows (dicts of fields) to a ledger, group committed with the rows of concurrent writers.
+    Return the number of rows this call wrote, 0 when another writer committed them first'''
+    with ledger_lock(tsv_path, blocking=False) as held:
+        if held:
+            '''No other writer: append the rows directly, with those spooled by writers that wait for the lock'''
+            return len(commit(tsv_path, fields, get_caches, fsync, format_rows(fields, rows)))
+    path = spool_rows(tsv_path, fields, rows)
+    with ledger_lock(tsv_path):
+        if os.path.exists(path):
+            return len(commit(tsv_path, fields, get_caches, fsync))
+    return 0
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+'''Ledgers per minute of --batch reports over many ledger directories.
+
+LEDGERS directories get a copy of one of a few ledgers of ROWS bills made by generate_ledger.py (different seeds), in
+a temporary directory. Every case runs finances.run_batch over all of them twice: "cold" builds the sidecar caches
+of every ledger (as the first report of a new ledger does), "warm" reads them.
+Run from the repository root: python3 benchmarks/bench_batch.py [--ledgers 2000] [--rows 2000] [--workers N] [--output batch.json]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import finances
+from bench_suite import get_metadata
+from generate_ledger import generate, get_span, FIRST_DAY
+
+LEDGERS = 2000
+ROWS = 2000
+SEEDS = 8
+
+
+def make_directories(ledgers, rows, directory):
+    '''Create ledgers directories user-N in directory with copies of SEEDS generated ledgers, return their paths'''
+    sources = [generate(os.path.join(directory, f'seed-{seed}'), rows, seed) for seed in range(SEEDS)]
+    directories = []
+    for number in range(ledgers):
+        user = os.path.join(directory, 'users', f'user-{number}')
+        os.makedirs(user)
+        for path in sources[number % SEEDS]:
+            shutil.copy(path, user)
+        directories.append(user)
+    return directories
+
+def get_cases(rows, export_directory):
+    '''Dict case name -> (API function, keyword arguments) run on every ledger'''
+    middle = pd.Timestamp(FIRST_DAY) + pd.Timedelta(days=get_span(rows) // 2)
+    month = middle.strftime('%m/%Y')
+    return {
+        'month total': (finances.get_bill_totals, dict(date=month, category='Food')),
+        'pivot year': (finances.get_bill_pivot, dict(first_month=(middle - pd.DateOffset(months=11)).strftime('%m/%Y'), last_month=month, group_by='month,category')),
+        'export month': (finances.write_bill_report, dict(path=export_directory, date=month, category=None)),
+        'saving totals': (finances.get_saving_totals, dict(date=None)),
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Ledgers per minute of --batch reports over many ledger directories.')
+    parser.add_argument('--ledgers', type=int, default=LEDGERS, help=f'Ledger directories, default {LEDGERS}.')
+    parser.add_argument('--rows', type=int, default=ROWS, help=f'Bills per ledger, default {ROWS}.')
+    parser.add_argument('--workers', type=int, required=False, help='Worker processes, all CPUs by default.')
+    parser.add_argument('--output', required=False, help='JSON file receiving the results.')
+    args = parser.parse_args()
+
+    results = dict()
+    print(f'{"case":<16}{"run":<6}{"seconds":>10}{"failed":>8}{"ledgers / min":>15}')
+    with tempfile.TemporaryDirectory() as directory:
+        directories = make_directories(args.ledgers, args.rows, directory)
+        for case, (function, kwargs) in get_cases(args.rows, os.path.join(directory, 'export')).items():
+            results[case] = dict()
+            for run in ('cold', 'warm'):
+                start = time.perf_counter()
+                table, errors = finances.run_batch(directories, function, kwargs, args.workers)
+                seconds = time.perf_counter() - start
+                results[case][run] = {'ledgers': len(directories), 'rows': len(table), 'failed': len(errors), 'seconds': seconds, 'ledgers_per_minute': len(directories) * 60 / seconds}
+                print(f'{case:<16}{run:<6}{seconds:>10.2f}{len(errors):>8}{len(directories) * 60 / seconds:>15.0f}')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': {**get_metadata(), 'ledgers': args.ledgers, 'rows': args.rows, 'workers': args.workers or os.cpu_count()}, 'results': results}, file, indent=2)
+        print('Results:', args.output)
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+'''Time of bulk --delete --where and --update against ledger size and number of matching rows.
+
+For every size a ledger made by generate_ledger.py (like in bench_suite.py) is copied to a temporary
+directory and rewritten by finances.delete_bills / update_bills with filters matching none, few, about
+a thirteenth and nearly all of the bills, each on a fresh copy. The time per million rows should stay
+flat across sizes and filters: the rewrite is one streaming pass whatever the number of matches.
+Run from the repository root: python3 benchmarks/bench_bulk.py [--sizes 100k,1m] [--fsync never] [--output bulk.json]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import finances
+from Ledger.Writer import FSYNC_NEVER, FSYNC_POLICIES
+from bench_suite import get_ledgers, get_metadata, SIZES
+
+FILTERS = {
+    'none': dict(name='No such bill'),
+    'few': dict(name='Supermarket', total='<5.00'),
+    'category': dict(category='Health'),
+    'almost all': dict(category='!Health'),
+}
+
+
+def get_cases():
+    '''Dict case name -> function(filters) rewriting the ledger, returning the matching rows'''
+    return {
+        'dry run': lambda filters: finances.delete_bills(**filters, dry_run=True),
+        'delete': lambda filters: finances.delete_bills(**filters),
+        'update': lambda filters: finances.update_bills(['Category=Personal', 'Essential=No'], **filters),
+    }
+
+def run_size(label, rows, data_directory):
+    '''Time every case and filter on a fresh copy of the ledger of rows bills, return dict case -> filter -> result'''
+    ledgers = get_ledgers(rows, data_directory)
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        finances.FILE_PATH_FINANCES = os.path.join(directory, 'finance.csv')
+        for case, function in get_cases().items():
+            results[case] = dict()
+            for name, filters in FILTERS.items():
+                shutil.copy(os.path.join(ledgers, 'finance.csv'), finances.FILE_PATH_FINANCES)
+                start = time.perf_counter()
+                matched = function(filters)
+                seconds = time.perf_counter() - start
+                results[case][name] = {'rows': rows, 'matched': matched, 'seconds': seconds, 'seconds_per_million': seconds * 1000000 / rows}
+                print(f'{label:<6}{case:<10}{name:<12}{matched:>10}{seconds:>10.2f}{seconds * 1000000 / rows:>12.2f}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Time of bulk delete and update against ledger size and matching rows.')
+    parser.add_argument('--sizes', default='100k,1m', help=f'Comma separated ledger sizes from {list(SIZES)}.')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_NEVER, help='Fsync policy of the rewrites, default never to time the pass itself.')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'finances-bench'), help='Directory keeping the generated ledgers between runs.')
+    parser.add_argument('--output', required=False, help='JSON file receiving the results.')
+    args = parser.parse_args()
+
+    finances.FSYNC = args.fsync
+    print(f'{"size":<6}{"case":<10}{"filter":<12}{"matched":>10}{"seconds":>10}{"s / 1M rows":>12}')
+    results = {label: run_size(label, SIZES[label], args.data) for label in args.sizes.split(',')}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': get_metadata(), 'results': results}, file, indent=2)
+        print('Results:', args.output)
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+'''Micro-benchmarks of ExactFloat against the previous string based implementation.
+
+Run from the repository root: python3 benchmarks/bench_exactfloat.py [--rows N]
+'''
+
+import os
+import sys
+import random
+import timeit
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ExactCalc.ExactFloat import ExactFloat
+
+
+class LegacyExactFloat:
+    '''String based ExactFloat as it was before the scaled integer rewrite, kept only for comparison'''
+    def __init__(self, number):
+        self.sign = True if number[0] != '-' else False
+        if number[0] == '-' or number[0] == '+':
+            number = number[1:]
+        number_parts = number.split('.')
+        self.decimal = str(int(number_parts[0])) if len(number_parts[0]) else '0'
+        aux_fraction = number_parts[1] if len(number_parts) > 1 else '00'
+        self.fraction = aux_fraction if len(aux_fraction)>1 else f'{aux_fraction}0'
+
+    def __add__(self, obj):
+        addend1, addend2, float_len = legacy_format_variables(self, obj)
+        result = str(addend1 + addend2)
+        decimal, fraction, sign = legacy_format_result(result, float_len)
+        return LegacyExactFloat(f'{sign}{decimal}.{fraction}')
+
+    def __sub__(self, obj):
+        minuend, subtrahend, float_len = legacy_format_variables(self, obj)
+        result = str(minuend - subtrahend)
+        decimal, fraction, sign = legacy_format_result(result, float_len)
+        return LegacyExactFloat(f'{sign}{decimal}.{fraction}')
+
+    def __str__(self):
+        symbol = '' if self.sign else '-'
+        fraction = str(self.fraction) if len(str(self.fraction)) >= 2 else str(self.fraction) + '0'
+        return f'{symbol}{self.decimal}.{fraction}'
+
+
+def legacy_format_variables(var1, var2):
+    var1_fraction = var1.fraction + ('0' *(len(var1.fraction) - len(var2.fraction)))
+    var2_fraction = var2.fraction + ('0' *(len(var2.fraction) - len(var1.fraction)))
+    var1_total = int(var1.decimal + var1_fraction)
+    var1_total = var1_total if var1.sign else var1_total * -1
+    var2_total = int(var2.decimal + var2_fraction)
+    var2_total = var2_total if var2.sign else var2_total * -1
+    return var1_total, var2_total, len(var1_fraction)
+
+def legacy_format_result(result, float_len):
+    sign = ''
+    if result[0] == '-':
+        sign = '-'
+        result = result[1:]
+    if len(result) <= float_len:
+        fraction = ('0' *(float_len - len(result))) + result
+        decimal = '0'
+    else:
+        fraction = result[len(result) - float_len:]
+        decimal = result[:len(result) - float_len]
+    return decimal, fraction, sign
+
+
+def legacy_fold(totals):
+    total = LegacyExactFloat('0')
+    for value in totals:
+        total = total + LegacyExactFloat(value)
+    return total
+
+def loop_fold(totals):
+    total = ExactFloat('0')
+    for value in totals:
+        total = total + ExactFloat(value)
+    return total
+
+def random_totals(rows, seed=0):
+    generator = random.Random(seed)
+    return [f'{generator.choice(("", "-"))}{generator.randint(0, 5000)}.{generator.randint(0, 99):02d}' for _ in range(rows)]
+
+def bench(label, function, repeat):
+    best = min(timeit.repeat(function, number=1, repeat=repeat))
+    print(f'{label:<40}{best * 1000:>10.2f} ms')
+    return best
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='ExactFloat micro-benchmarks.')
+    parser.add_argument('--rows', type=int, default=50000, help='Number of totals folded per run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark, the best one is reported.')
+    args = parser.parse_args()
+
+    totals = random_totals(args.rows)
+    assert str(legacy_fold(totals)) == str(ExactFloat.sum(totals)) == str(loop_fold(totals))
+    print(f'Folding {args.rows} totals (best of {args.repeat})')
+    legacy = bench('legacy string add loop', lambda: legacy_fold(totals), args.repeat)
+    loop = bench('ExactFloat add loop', lambda: loop_fold(totals), args.repeat)
+    parsed = [ExactFloat(value) for value in totals]
+    fold = bench('ExactFloat.sum (from strings)', lambda: ExactFloat.sum(totals), args.repeat)
+    bench('ExactFloat.sum (pre-parsed)', lambda: ExactFloat.sum(parsed), args.repeat)
+    legacy_parsed = [LegacyExactFloat(value) for value in totals]
+    bench('legacy parse', lambda: [LegacyExactFloat(value) for value in totals], args.repeat)
+    bench('ExactFloat parse', lambda: [ExactFloat(value) for value in totals], args.repeat)
+    bench('legacy str', lambda: [str(value) for value in legacy_parsed], args.repeat)
+    bench('ExactFloat str', lambda: [str(value) for value in parsed], args.repeat)
+    bench('ExactFloat compare', lambda: sorted(parsed), args.repeat)
+    print(f'Speed-up add loop: {legacy / loop:.1f}x, sum: {legacy / fold:.1f}x')
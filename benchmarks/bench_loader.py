@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+'''Load time and memory per million rows of the bill and saving tables, before and after the typed schema.
+
+"inferred" is how the ledgers were read before Ledger.Schema: read_csv inferring the dtypes (float Total,
+object strings) and to_datetime guessing the date format. "typed" is read_typed: int64 cents, category
+Category/Essential, interned names and an explicit date format. Memory counts the strings too: a pointer per
+row plus every distinct string object once, which is what interning saves (memory_usage(deep=True) would count
+a shared string once per row). Ledgers come from generate_ledger.py like in bench_suite.py.
+Run from the repository root: python3 benchmarks/bench_loader.py [--rows 1000000] [--output loader.json]
+'''
+
+import os
+import sys
+import json
+import time
+import tempfile
+from argparse import ArgumentParser
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Ledger.Schema import read_typed
+from bench_suite import get_ledgers, get_metadata
+
+ROWS = 1000000
+RUNS = 3
+
+
+def read_inferred(path):
+    '''Ledger read the way it was before the typed schema'''
+    table = pd.read_csv(path, sep='\t', header=0)
+    table['Date'] = pd.to_datetime(table['Date'])
+    return table
+
+def get_column_bytes(column):
+    '''Bytes held by a column, counting a string object shared by several rows once'''
+    if column.dtype.kind in 'iufcmMb' or isinstance(column.dtype, pd.CategoricalDtype):
+        return int(column.memory_usage(index=False, deep=True))
+    values = column.to_numpy(dtype=object)
+    shared = {id(value): value for value in values}
+    return values.nbytes + sum(sys.getsizeof(value) for value in shared.values())
+
+def measure(read, path, runs):
+    '''Return (best seconds, deep memory of every column in bytes, rows) of reading path with read'''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        table = read(path)
+        times.append(time.perf_counter() - start)
+    return min(times), {field: get_column_bytes(table[field]) for field in table.columns}, len(table)
+
+def run(rows, data_directory, runs):
+    '''Dict ledger -> loader -> {rows, best seconds, bytes and bytes of every column per million rows}'''
+    ledgers = get_ledgers(rows, data_directory)
+    results = dict()
+    for name in ('finance.csv', 'savings.csv'):
+        path = os.path.join(ledgers, name)
+        results[name] = dict()
+        for loader, read in (('inferred', read_inferred), ('typed', read_typed)):
+            seconds, columns, count = measure(read, path, runs)
+            scale = ROWS / max(count, 1)
+            results[name][loader] = {
+                'rows': count, 'seconds': seconds, 'bytes': int(sum(columns.values()) * scale),
+                'columns': {field: int(value * scale) for field, value in columns.items()}
+            }
+    return results
+
+def print_results(results):
+    print(f'{"ledger":<14}{"loader":<10}{"column":<12}{"MB / 1M rows":>14}{"rows":>10}{"seconds":>10}')
+    for name, loaders in results.items():
+        for loader, result in loaders.items():
+            for field, value in result['columns'].items():
+                print(f'{name:<14}{loader:<10}{field:<12}{value / 2 ** 20:>14.1f}')
+            print(f'{name:<14}{loader:<10}{"all":<12}{result["bytes"] / 2 ** 20:>14.1f}{result["rows"]:>10}{result["seconds"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Load time and memory per million rows of the ledger loaders.')
+    parser.add_argument('--rows', type=int, default=ROWS, help=f'Bills in the generated ledger, default {ROWS}.')
+    parser.add_argument('--runs', type=int, default=RUNS, help='Reads per loader, the best time is kept.')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'finances-bench'), help='Directory keeping the generated ledgers between runs.')
+    parser.add_argument('--output', required=False, help='JSON file receiving the results.')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.data, args.runs)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': get_metadata(), 'results': results}, file, indent=2)
+        print('Results:', args.output)
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+'''Time of month reports, date-filtered and full queries, add and delete on a plain TSV ledger against the same
+ledger split into year and month shards (see Ledger.Shards).
+
+For every layout the ledger made by generate_ledger.py (like in bench_suite.py) is copied to a temporary directory
+and migrated. "first" includes building the sidecar indexes and aggregate caches of the files it touches, which for
+shards is one shard; "report after writes" runs after an add and a delete of a bill in the reported month.
+Run from the repository root: python3 benchmarks/bench_shards.py [--rows 1000000] [--output shards.json]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import finances
+from finances import Bill
+from Ledger.Shards import PERIODS
+from Ledger.Writer import FSYNC_NEVER
+from bench_suite import get_ledgers, get_metadata, measure
+from generate_ledger import get_span, FIRST_DAY
+
+ROWS = 1000000
+RUNS = 3
+LAYOUTS = ('tsv', *PERIODS)
+
+
+def get_cases(rows):
+    '''List of (case name, function(run), runs) timing the API on a ledger of rows bills'''
+    middle = pd.Timestamp(FIRST_DAY) + pd.Timedelta(days=get_span(rows) // 2)
+    month = middle.strftime('%m/%Y')
+    day = middle.strftime('%d/%m/%Y')
+    week = f'{day}~{(middle + pd.Timedelta(days=6)).strftime("%d/%m/%Y")}'
+    bill = Bill('Bench bill', 'Food', 'Yes', day, '12.34')
+    return [
+        ('report month', lambda run: finances.get_bill_report(category='Food', date=month), RUNS),
+        ('show week', lambda run: finances.query_bill_table(date=week), RUNS),
+        ('show category', lambda run: finances.query_bill_table(category='Health'), 1),
+        ('add bill', lambda run: finances.add_bill(bill), RUNS),
+        ('delete bill', lambda run: finances.delete_bill(bill), RUNS),
+        ('report after writes', lambda run: finances.get_bill_report(category='Food', date=month), RUNS),
+    ]
+
+def run_layout(layout, rows, data_directory):
+    '''Time every case on a fresh copy of the ledger of rows bills moved to layout, return dict case -> timings'''
+    ledgers = get_ledgers(rows, data_directory)
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        finances.FILE_PATH_FINANCES = os.path.join(directory, 'finance.csv')
+        shutil.copy(os.path.join(ledgers, 'finance.csv'), finances.FILE_PATH_FINANCES)
+        start = time.perf_counter()
+        finances.migrate_ledger(finances.FILE_PATH_FINANCES, layout)
+        print(f'{layout:<7}{"migrate":<22}{(time.perf_counter() - start) * 1000:>12.1f} ms')
+        for case, function, runs in get_cases(rows):
+            results[case] = measure(function, runs)
+            print(f'{layout:<7}{case:<22}{results[case]["first"] * 1000:>12.1f}{results[case]["best"] * 1000:>12.1f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Time of the API on a plain TSV ledger against year and month shards.')
+    parser.add_argument('--rows', type=int, default=ROWS, help=f'Bills in the generated ledger, default {ROWS}.')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'finances-bench'), help='Directory keeping the generated ledgers between runs.')
+    parser.add_argument('--output', required=False, help='JSON file receiving the results.')
+    args = parser.parse_args()
+
+    finances.FSYNC = FSYNC_NEVER
+    print(f'{"layout":<7}{"case":<22}{"first":>12}{"best":>12}')
+    results = {layout: run_layout(layout, args.rows, args.data) for layout in LAYOUTS}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': get_metadata(), 'results': results}, file, indent=2)
+        print('Results:', args.output)
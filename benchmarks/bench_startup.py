@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+'''Wall time of `finances.py --bill --add` with every argument given, against a bare interpreter start.
+
+The ledger lives in a temporary HOME, also set as $FINANCES_DIR, so neither the real one nor an exported
+$FINANCES_DIR is touched.
+Run from the repository root: python3 benchmarks/bench_startup.py [--runs N]
+'''
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADD_ARGS = ['--bill', '--add', '-N', 'Bench', '-C', 'Food', '-E', 'Yes', '-D', '01/02/2022', '-T', '12.50']
+TARGET_MS = 50
+
+
+def best_of(command, runs, env):
+    '''Best wall time in milliseconds of running command runs times'''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Startup time of finances.py --bill --add.')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per command, the best one is reported.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, FINANCES_DIR=os.path.join(home, 'finances'))
+        bare = best_of([sys.executable, '-c', 'pass'], args.runs, env)
+        add = best_of([sys.executable, os.path.join(ROOT, 'finances.py'), *ADD_ARGS], args.runs, env)
+    print(f'{"python -c pass":<30}{bare:>10.1f} ms')
+    print(f'{"finances.py --bill --add":<30}{add:>10.1f} ms')
+    print(f'{"finances.py own time":<30}{add - bare:>10.1f} ms (target {TARGET_MS} ms)')
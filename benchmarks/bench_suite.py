@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+'''Benchmark suite of the finances API over synthetic ledgers of several sizes.
+
+For every size, ledgers made by generate_ledger.py are copied to a temporary HOME and the bill filters
+(one per filter type and all of them together), the month report, its export, add and delete of a bill,
+the saving report and ExactFloat arithmetic are timed. Every case runs --runs times: "first" includes
+building the sidecar indexes and caches, "best" and "median" are warm. Results are written as JSON;
+with --baseline the best time of every case is compared to a stored result and the run fails when one
+is slower than the tolerance allows (and by more than a few milliseconds, to ignore timer noise).
+Run from the repository root: python3 benchmarks/bench_suite.py [--sizes 10k,1m,10m] [--output results.json] [--baseline old.json]
+'''
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import contextmanager, redirect_stdout
+from argparse import ArgumentParser
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import finances
+from finances import Bill
+from ExactCalc.ExactFloat import ExactFloat
+from generate_ledger import generate, get_span, FIRST_DAY
+
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000, '10m': 10000000}
+EXACT_FLOAT_ROWS = 100000
+TOLERANCE = 0.2
+MIN_DELTA = 0.005
+
+
+@contextmanager
+def no_prompts():
+    '''Answer every prompt of the API with an empty line and hide what it prints'''
+    stdin = sys.stdin
+    sys.stdin = io.StringIO('\n' * 100)
+    try:
+        with redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        sys.stdin = stdin
+
+def measure(function, runs):
+    '''Call function runs times (with the run number), return dict of first, best and median seconds'''
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        with no_prompts():
+            function(run)
+        times.append(time.perf_counter() - start)
+    return {'first': times[0], 'best': min(times), 'median': statistics.median(times), 'runs': runs}
+
+def get_ledgers(rows, data_directory):
+    '''Directory holding generated ledgers of rows bills, generated once per data_directory'''
+    directory = os.path.join(data_directory, f'ledger-{rows}')
+    if not os.path.exists(os.path.join(directory, 'savings.csv')):
+        generate(directory, rows)
+    return directory
+
+def get_cases(rows, work_directory):
+    '''Dict case name -> function(run) timing the API on a ledger of rows bills'''
+    middle = pd.Timestamp(FIRST_DAY) + pd.Timedelta(days=get_span(rows) // 2)
+    month = middle.strftime('%m/%Y')
+    day = middle.strftime('%d/%m/%Y')
+    week = f'{day}~{(middle + pd.Timedelta(days=6)).strftime("%d/%m/%Y")}'
+    bill = lambda run: Bill(f'Bench bill {run}', 'Food', 'Yes', day, '12.34')
+    empty = dict(name=None, category=None, essential=None, date=None, total=None)
+    filters = {
+        'name': dict(name='Supermarket'), 'category': dict(category='Health'), 'essential': dict(essential='No'),
+        'date': dict(date=week), 'total': dict(total='100.00~100.50'),
+        'all': dict(name='Supermarket', category='Food', essential='Yes', date=f'>={day}', total='<50.00'),
+    }
+    cases = {f'filter_bill_table.{label}': (lambda run, kwargs=kwargs: finances.filter_bill_table(**{**empty, **kwargs})) for label, kwargs in filters.items()}
+    cases['get_bill_report'] = lambda run: finances.get_bill_report(category=None, date=month)
+    cases['export_bill_report'] = lambda run: finances.export_bill_report(work_directory, category='Food', date=month)
+    cases['add_bill'] = lambda run: finances.add_bill(bill(run))
+    cases['delete_bill'] = lambda run: finances.delete_bill(bill(run))
+    cases['get_saving_report'] = lambda run: finances.get_saving_report()
+    return cases
+
+def get_exact_float_cases():
+    '''Dict case name -> function(run) timing ExactFloat arithmetic, independent of the ledger size'''
+    generator = random.Random(0)
+    totals = [f'{generator.choice(("", "-"))}{generator.randint(0, 5000)}.{generator.randint(0, 99):02d}' for _ in range(EXACT_FLOAT_ROWS)]
+    parsed = [ExactFloat(total) for total in totals]
+    rate = ExactFloat('1.0215')
+
+    def add_loop(run):
+        total = ExactFloat('0')
+        for value in parsed:
+            total = total + value
+    return {
+        'ExactFloat.parse': lambda run: [ExactFloat(total) for total in totals],
+        'ExactFloat.sum': lambda run: ExactFloat.sum(totals),
+        'ExactFloat.add_loop': add_loop,
+        'ExactFloat.mul_rescale': lambda run: [(value * rate).rescale(2) for value in parsed],
+        'ExactFloat.str': lambda run: [str(value) for value in parsed],
+    }
+
+def run_size(label, rows, data_directory, runs):
+    '''Time every case on a fresh copy of the ledgers of rows bills, return dict case -> timings'''
+    ledgers = get_ledgers(rows, data_directory)
+    with tempfile.TemporaryDirectory() as home:
+        directory = os.path.join(home, 'Documents', 'finances')
+        os.makedirs(directory)
+        for name in ('finance.csv', 'savings.csv'):
+            shutil.copy(os.path.join(ledgers, name), directory)
+        finances.FILE_PATH_FINANCES = os.path.join(directory, 'finance.csv')
+        finances.FILE_PATH_SAVINGS = os.path.join(directory, 'savings.csv')
+        results = dict()
+        for case, function in get_cases(rows, home).items():
+            results[case] = measure(function, runs)
+            print(f'{label:<6}{case:<36}{results[case]["first"] * 1000:>12.1f}{results[case]["median"] * 1000:>12.1f} ms')
+    return results
+
+def get_metadata():
+    '''Where the results come from: commit, interpreter, libraries and machine'''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    import numpy as np
+    return {
+        'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+        'pandas': pd.__version__, 'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count(),
+    }
+
+def compare(results, baseline, tolerance, min_delta=MIN_DELTA):
+    '''Print the best time of every case against the baseline, return the cases slower than tolerance allows'''
+    regressions = []
+    print(f'\n{"size":<6}{"case":<36}{"baseline":>12}{"now":>12}{"change":>10}')
+    for size, cases in results['results'].items():
+        for case, timing in cases.items():
+            old = baseline.get('results', dict()).get(size, dict()).get(case)
+            if old is None:
+                continue
+            change = timing['best'] / old['best'] - 1 if old['best'] else 0.0
+            flag = ''
+            if change > tolerance and timing['best'] - old['best'] > min_delta:
+                flag = '  REGRESSION'
+                regressions.append(f'{size} {case}')
+            print(f'{size:<6}{case:<36}{old["best"] * 1000:>10.1f}ms{timing["best"] * 1000:>10.1f}ms{change:>+10.0%}{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmark suite over synthetic ledgers.')
+    parser.add_argument('--sizes', default='10k,1m', help=f'Comma separated ledger sizes from {list(SIZES)}. Default 10k,1m.')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per case, the first one is cold.')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'finances-bench'), help='Directory keeping the generated ledgers between runs.')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file receiving the results.')
+    parser.add_argument('--baseline', required=False, help='JSON results of an earlier run to compare against.')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f'Allowed slowdown of a best time against the baseline, default {TOLERANCE} (20%%).')
+    args = parser.parse_args()
+
+    sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f'Sizes {unknown} not valid, use {list(SIZES)}.')
+    results = {'metadata': get_metadata(), 'results': dict()}
+    print(f'{"size":<6}{"case":<36}{"first":>12}{"median":>12}')
+    for size in sizes:
+        results['results'][size] = run_size(size, SIZES[size], args.data, args.runs)
+    results['results']['exact'] = dict()
+    for case, function in get_exact_float_cases().items():
+        results['results']['exact'][case] = measure(function, args.runs)
+        print(f'{"exact":<6}{case:<36}{results["results"]["exact"][case]["first"] * 1000:>12.1f}{results["results"]["exact"][case]["median"] * 1000:>12.1f} ms')
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print('Results:', args.output)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f'Slower than the baseline by more than {args.tolerance:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+'''Stress test of concurrent writers: parallel processes adding bills while another one deletes and compacts.
+
+Checks that every added row is in the ledger exactly once, that deleted rows are gone, that every
+line is well formed and that the aggregate cache matches a rebuild, then reports rows per second of
+group-committed adds against one locked append and fsync per row.
+The ledger lives in a temporary directory so the real one is not touched.
+Run from the repository root: python3 benchmarks/bench_writers.py [--writers N] [--rows N] [--fsync always|never]
+'''
+
+import os
+import sys
+import csv
+import time
+import tempfile
+import multiprocessing
+from collections import Counter
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import finances
+from finances import Bill, CSV_FINANCES_FIELDS
+from ExactCalc.ExactFloat import ExactFloat
+from Ledger.AggregateCache import AggregateCache
+from Ledger.Journal import Journal
+from Ledger.Writer import append_rows, ledger_lock, sync, FSYNC_POLICIES
+
+WRITER_DATE = '01/02/2022'
+VICTIM_DATE = '01/01/2021'
+COMPACT_EVERY = 20
+
+
+def group_add(bill):
+    '''Group-committed add, as finances.add_bill does it'''
+    return append_rows(finances.FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, [bill.to_dict()], get_caches=lambda: [AggregateCache(finances.FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)], fsync=finances.FSYNC)
+
+def direct_add(bill):
+    '''Baseline: take the lock and append one row with its own write and fsync'''
+    path = finances.FILE_PATH_FINANCES
+    with ledger_lock(path):
+        aggregates = AggregateCache(path, CSV_FINANCES_FIELDS)
+        with open(path, 'a', newline='') as file:
+            csv.DictWriter(file, CSV_FINANCES_FIELDS, delimiter='\t').writerow(bill.to_dict())
+            sync(file, finances.FSYNC)
+        aggregates.add(bill.to_dict())
+    return 1
+
+def write(writer, rows, mode, start, commits):
+    '''Add rows bills named w<writer>-<seq>, count the writes that reached the ledger'''
+    add = group_add if mode == 'group' else direct_add
+    start.wait()
+    written = sum(1 for seq in range(rows) if add(Bill(f'w{writer}-{seq}', 'Food', 'Yes', WRITER_DATE, '1.25')))
+    with commits.get_lock():
+        commits.value += written
+
+def delete(done, deleted):
+    '''Add and delete victim bills, compacting every COMPACT_EVERY deletions, until done is set'''
+    number = 0
+    while not done.is_set():
+        bill = Bill(f'victim-{number}', 'Housing', 'No', VICTIM_DATE, '7.00')
+        finances.add_bill(bill)
+        finances.delete_bill(bill)
+        number += 1
+        if number % COMPACT_EVERY == 0:
+            finances.compact_bills()
+    deleted.value = number
+
+def check(writers, rows):
+    '''Return the list of problems found in the ledger and its aggregate cache'''
+    path = finances.FILE_PATH_FINANCES
+    problems = []
+    with open(path, 'r', newline='') as file:
+        lines = list(csv.reader(file, delimiter='\t'))
+    bad = [line for line in lines if len(line) != len(CSV_FINANCES_FIELDS)]
+    if bad:
+        problems.append(f'{len(bad)} malformed lines, first {bad[0]}')
+    with open(path, 'r', newline='') as file:
+        names = Counter(row['Name'] for row in Journal(path, CSV_FINANCES_FIELDS).iter_rows(file))
+    expected = {f'w{writer}-{seq}' for writer in range(writers) for seq in range(rows)}
+    missing = [name for name in expected if names[name] == 0]
+    duplicated = [name for name in expected if names[name] > 1]
+    victims = [name for name in names if name.startswith('victim-')]
+    for label, found in (('missing', missing), ('duplicated', duplicated), ('deleted but live', victims)):
+        if found:
+            problems.append(f'{len(found)} rows {label}, e.g. {sorted(found)[:3]}')
+    aggregates = AggregateCache(path, CSV_FINANCES_FIELDS)
+    if not aggregates.current:
+        problems.append('aggregate cache not current')
+    else:
+        cached = {month: buckets for month, buckets in aggregates.months.items() if month not in aggregates.stale}
+        aggregates.rebuild()
+        for month, buckets in cached.items():
+            rebuilt = aggregates.months.get(month, dict())
+            for key in set(buckets) | set(rebuilt):
+                total, count = buckets.get(key, ['0', 0])
+                rebuilt_total, rebuilt_count = rebuilt.get(key, ['0', 0])
+                if ExactFloat(str(total)) != ExactFloat(str(rebuilt_total)) or count != rebuilt_count:
+                    problems.append(f'aggregate {month} {key}: cached {total}/{count}, rebuilt {rebuilt_total}/{rebuilt_count}')
+    return problems
+
+def run(mode, writers, rows):
+    '''Run one stress round in a fresh ledger, return (seconds, ledger writes, deletions, problems)'''
+    with tempfile.TemporaryDirectory() as directory:
+        finances.FILE_PATH_FINANCES = os.path.join(directory, 'finance.csv')
+        finances.FILE_PATH_SAVINGS = os.path.join(directory, 'savings.csv')
+        finances.create_file()
+        AggregateCache(finances.FILE_PATH_FINANCES, CSV_FINANCES_FIELDS).rebuild()
+        start, done = multiprocessing.Event(), multiprocessing.Event()
+        deleted, commits = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+        processes = [multiprocessing.Process(target=write, args=(writer, rows, mode, start, commits)) for writer in range(writers)]
+        deleter = multiprocessing.Process(target=delete, args=(done, deleted))
+        for process in processes:
+            process.start()
+        deleter.start()
+        begin = time.perf_counter()
+        start.set()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - begin
+        done.set()
+        deleter.join()
+        return elapsed, commits.value, deleted.value, check(writers, rows)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Concurrent writers stress test.')
+    parser.add_argument('--writers', type=int, default=8, help='Parallel writer processes.')
+    parser.add_argument('--rows', type=int, default=200, help='Bills added by every writer, one at a time.')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default='always', help='Fsync policy of the writes.')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('fork')
+    finances.FSYNC = args.fsync
+    failed = False
+    for mode, label in (('direct', 'lock + append + fsync per row'), ('group', 'group commit')):
+        elapsed, commits, deleted, problems = run(mode, args.writers, args.rows)
+        total = args.writers * args.rows
+        print(f'{label:<32}{total / elapsed:>10.0f} rows/s  ({total} rows in {elapsed:.2f} s, {commits} writes, {deleted} concurrent deletions)')
+        for problem in problems:
+            print(f'    FAILED: {problem}')
+        failed |= bool(problems)
+    sys.exit(1 if failed else 0)
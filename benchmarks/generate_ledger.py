@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+'''Synthetic finance.csv and savings.csv ledgers of any size for benchmarks.
+
+Bills follow the real schema (CSV_FINANCES_FIELDS, CATEGORY_CHOICES): rent, salary, insurance and
+subscriptions land on fixed days of every month, everyday spending is spread over the days with more
+of it on weekends, names repeat with a long tail of rarely seen ones and totals are log-normal per
+category. Rows are mostly in date order, as they are typed day after day; monthly bills and a few
+late entries are dated some days before the rows around them.
+Run from the repository root: python3 benchmarks/generate_ledger.py DIRECTORY [--rows N] [--seed N]
+'''
+
+import os
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finances import CSV_FINANCES_FIELDS, CSV_SAVING_FIELDS, CATEGORY_CHOICES
+
+FIRST_DAY = '2005-01-01'
+ROWS_PER_DAY = 12
+MAX_DAYS = 20 * 365
+CHUNK_ROWS = 1000000
+LATE_FRACTION = 0.02
+LONG_TAIL = 2000
+SAVING_FRACTION = 0.05
+SAVING_ACCOUNTS = ['Emergency fund', 'Index fund', 'Pension plan', 'Holidays', 'House deposit', 'Bonds', 'Crypto', 'Car']
+
+'''Category: (share of rows, names, essential, median total, spread, day of the month or None for any day)'''
+CATEGORIES = {
+    'Housing': (0.02, ['Rent', 'Electricity', 'Water', 'Gas', 'Internet'], 'Yes', 180.0, 0.8, 1),
+    'Food': (0.34, ['Supermarket', 'Bakery', 'Greengrocer', 'Butcher', 'Restaurant', 'Pizza Hut', 'Coffee shop'], 'Yes', 18.0, 0.9, None),
+    'Transport': (0.14, ['Uber', 'Metro card', 'Fuel', 'Parking', 'Train ticket', 'Taxi'], 'Yes', 12.0, 0.8, None),
+    'Taxes': (0.01, ['Income tax', 'Property tax', 'Vehicle tax'], 'Yes', 300.0, 0.7, 20),
+    'Donations': (0.01, ['Red Cross', 'Food bank', 'Open source'], 'No', 15.0, 0.6, 15),
+    'Insurance': (0.02, ['Health insurance', 'Car insurance', 'Home insurance'], 'Yes', 60.0, 0.4, 5),
+    'Savings/Investments': (0.02, ['Index fund', 'Pension plan', 'Bonds'], 'No', 250.0, 0.5, 26),
+    'Health': (0.04, ['Pharmacy', 'Dentist', 'Optician', 'Physio'], 'Yes', 35.0, 0.9, None),
+    'Services': (0.08, ['Netflix', 'Spotify', 'Phone', 'Gym (A+)', 'Cloud storage', 'Laundry'], 'No', 14.0, 0.5, None),
+    'Personal': (0.12, ['Clothes', 'Haircut', 'Books', 'Electronics', 'Gifts'], 'No', 30.0, 1.1, None),
+    'Recreation': (0.14, ['Cinema', 'Concert', 'Bar', 'Museum', 'Holidays', 'Games'], 'No', 25.0, 1.0, None),
+    'Debts': (0.02, ['Car loan', 'Credit card', 'Student loan'], 'Yes', 220.0, 0.3, 10),
+    'Incomes': (0.04, ['Salary', 'Freelance', 'Dividends', 'Refund'], 'No', 900.0, 0.9, 28),
+}
+
+
+def get_span(rows):
+    '''Days covered by a ledger of rows bills: ROWS_PER_DAY a day, at most MAX_DAYS (then more rows a day)'''
+    return min(max(int(rows / ROWS_PER_DAY), 31), MAX_DAYS)
+
+def get_days(rows, first_day, last_day, rng):
+    '''Sorted day numbers (days since FIRST_DAY) of rows from first_day to last_day excluded, more on weekends'''
+    span = np.arange(first_day, max(last_day, first_day + 1))
+    weights = np.where(span % 7 >= 5, 1.6, 1.0)
+    days = np.sort(rng.choice(span, size=rows, p=weights / weights.sum()))
+    '''A few rows are typed some days after they happened, so the ledger is not perfectly sorted'''
+    late = rng.random(rows) < LATE_FRACTION
+    days[late] = np.maximum(days[late] - rng.integers(1, 30, size=int(late.sum())), 0)
+    return days
+
+def get_totals(median, spread, rows, rng):
+    '''Log-normal totals as strings with two decimals'''
+    cents = np.maximum(np.round(rng.lognormal(np.log(median * 100), spread, size=rows)), 1).astype(np.int64)
+    return pd.Series(cents // 100).astype(str) + '.' + pd.Series(cents % 100).astype(str).str.zfill(2)
+
+def get_names(names, rows, rng):
+    '''Names of rows: the usual ones most of the time, a long tail of numbered ones (shops, people) otherwise'''
+    usual = np.array(names)[np.minimum(rng.zipf(1.6, size=rows) - 1, len(names) - 1)]
+    tail = rng.random(rows) < 0.15
+    names = pd.Series(usual, dtype=object)
+    names[tail] = names[tail] + ' ' + pd.Series(rng.integers(1, LONG_TAIL, size=int(tail.sum())), index=names[tail].index).astype(str)
+    return names
+
+def bill_chunk(rows, first_day, last_day, rng):
+    '''DataFrame of rows bills from first_day to last_day with the ledger columns as strings, in date order'''
+    shares = np.array([CATEGORIES[category][0] for category in CATEGORY_CHOICES])
+    categories = rng.choice(len(CATEGORY_CHOICES), size=rows, p=shares / shares.sum())
+    days = get_days(rows, first_day, last_day, rng)
+    dates = pd.Timestamp(FIRST_DAY) + pd.to_timedelta(days, unit='D')
+    table = pd.DataFrame({'Name': '', 'Category': np.array(CATEGORY_CHOICES)[categories], 'Essential': '', 'Date': dates, 'Total': ''})
+    for code, category in enumerate(CATEGORY_CHOICES):
+        _, names, essential, median, spread, day = CATEGORIES[category]
+        mask = categories == code
+        count = int(mask.sum())
+        if not count:
+            continue
+        table.loc[mask, 'Name'] = get_names(names, count, rng).to_numpy()
+        table.loc[mask, 'Essential'] = essential
+        table.loc[mask, 'Total'] = get_totals(median, spread, count, rng).to_numpy()
+        if day is not None:
+            '''Monthly bills keep their month but move to their day of the month'''
+            month_days = table.loc[mask, 'Date'].dt.days_in_month
+            table.loc[mask, 'Date'] = table.loc[mask, 'Date'] - pd.to_timedelta(table.loc[mask, 'Date'].dt.day - np.minimum(day, month_days), unit='D')
+    table['Date'] = table['Date'].dt.strftime('%Y-%m-%d')
+    return table
+
+def saving_chunk(rows, first_day, last_day, rng):
+    '''DataFrame of rows savings (deposits, some withdrawals) from first_day to last_day with the ledger columns as strings'''
+    days = get_days(rows, first_day, last_day, rng)
+    dates = pd.Timestamp(FIRST_DAY) + pd.to_timedelta(days, unit='D')
+    names = np.array(SAVING_ACCOUNTS)[np.minimum(rng.zipf(1.4, size=rows) - 1, len(SAVING_ACCOUNTS) - 1)]
+    totals = get_totals(200.0, 0.7, rows, rng)
+    withdrawals = rng.random(rows) < 0.1
+    totals[withdrawals] = '-' + totals[withdrawals]
+    return pd.DataFrame({'Name': names, 'Date': dates.strftime('%Y-%m-%d'), 'Total': totals})
+
+def write_ledger(path, fields, rows, span, make_chunk, rng):
+    '''Write a TSV ledger of rows rows over span days in chunks of consecutive days, lines ended like csv.writer does'''
+    with open(path, 'w', newline='') as file:
+        file.write('\t'.join(fields) + '\r\n')
+        written = 0
+        while written < rows:
+            count = min(CHUNK_ROWS, rows - written)
+            table = make_chunk(count, span * written // rows, span * (written + count) // rows, rng)
+            lines = table[fields[0]]
+            for field in fields[1:]:
+                lines = lines + '\t' + table[field]
+            file.write('\r\n'.join(lines.tolist()) + '\r\n')
+            written += len(table)
+
+def generate(directory, rows, seed=0):
+    '''Write finance.csv with rows bills and savings.csv with a twentieth of that over the same days in directory, return their paths'''
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    finance_path = os.path.join(directory, 'finance.csv')
+    saving_path = os.path.join(directory, 'savings.csv')
+    span = get_span(rows)
+    write_ledger(finance_path, CSV_FINANCES_FIELDS, rows, span, bill_chunk, rng)
+    write_ledger(saving_path, CSV_SAVING_FIELDS, max(int(rows * SAVING_FRACTION), 1), span, saving_chunk, rng)
+    return finance_path, saving_path
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generate synthetic finance.csv and savings.csv ledgers.')
+    parser.add_argument('directory', help='Directory receiving finance.csv and savings.csv.')
+    parser.add_argument('--rows', type=int, default=10000, help='Bill rows, savings get a twentieth of them.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same ledgers.')
+    args = parser.parse_args()
+    for path in generate(args.directory, args.rows, args.seed):
+        print(path)
@@ -1,30 +1,54 @@
 #!/usr/bin/python3
 
 import os
+import sys
 import csv
 import datetime
 import calendar
-import re
+from itertools import islice
+from functools import partial
+from contextlib import ExitStack, suppress
 from argparse import ArgumentParser
 
-import pandas as pd
+from ExactCalc.ExactFloat import ExactFloat, MIN_SCALE
+from Ledger.AggregateCache import AggregateCache
+from Ledger.Journal import Journal, COMPACT_THRESHOLD
+from Ledger.Profile import phase, count_rows
+from Ledger.Shards import ShardCatalog, is_sharded, PERIODS
+from Ledger.Timeline import Timeline
+from Ledger.Writer import append_rows, ledger_lock, FSYNC_ALWAYS, FSYNC_POLICIES
 
-from ExactCalc.ExactFloat import ExactFloat
-
-FILE_PATH_FINANCES = os.path.expanduser('~/Documents/finances/finance.csv')
-FILE_PATH_SAVINGS = os.path.expanduser('~/Documents/finances/savings.csv')
+'''Directory of the ledgers and the daemon socket: $FINANCES_DIR or ~/Documents/finances, changed by --ledger-dir'''
+LEDGER_DIRECTORY = os.path.expanduser(os.environ.get('FINANCES_DIR') or '~/Documents/finances')
+FILE_PATH_FINANCES = os.path.join(LEDGER_DIRECTORY, 'finance.csv')
+FILE_PATH_SAVINGS = os.path.join(LEDGER_DIRECTORY, 'savings.csv')
+SOCKET_PATH = os.path.join(LEDGER_DIRECTORY, 'finances.sock')
 
 
 CSV_FINANCES_FIELDS = ['Name', 'Category', 'Essential', 'Date', 'Total']
 CSV_SAVING_FIELDS = ['Name', 'Date', 'Total']
 CATEGORY_CHOICES = ['Housing', 'Food', 'Transport', 'Taxes', 'Donations', 'Insurance', 'Savings/Investments', 'Health', 'Services', 'Personal', 'Recreation', 'Debts', 'Incomes']
 DATE_FORMAT = "%d/%m/%Y"
+NAME_INDEX_MAX_FRACTION = 0.05
+DATE_INDEX_MAX_FRACTION = 0.2
+'''Ledgers kept in memory (Ledger.Memory.LedgerMemory) while serving, None otherwise'''
+MEMORY = None
+'''Fsync policy of the writes of the running command (see Ledger.Writer), set by --fsync'''
+FSYNC = FSYNC_ALWAYS
+
 
+def set_ledger_directory(directory):
+    '''Point the API to finance.csv, savings.csv and the daemon socket of directory'''
+    global LEDGER_DIRECTORY, FILE_PATH_FINANCES, FILE_PATH_SAVINGS, SOCKET_PATH
+    LEDGER_DIRECTORY = os.path.abspath(os.path.expanduser(directory))
+    FILE_PATH_FINANCES = os.path.join(LEDGER_DIRECTORY, 'finance.csv')
+    FILE_PATH_SAVINGS = os.path.join(LEDGER_DIRECTORY, 'savings.csv')
+    SOCKET_PATH = os.path.join(LEDGER_DIRECTORY, 'finances.sock')
 
 def create_file():
     '''Create files in PATH and create directories if they doesn't exist'''
     for path, fields in ((FILE_PATH_FINANCES, CSV_FINANCES_FIELDS), (FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)):
-        if not os.path.exists(path):
+        if not os.path.exists(path) and not is_sharded(path):
             os.makedirs(os.path.dirname(path), exist_ok=True)
             with open(path, 'w') as file:
                 writer = csv.writer(file, delimiter='\t')
@@ -82,27 +106,103 @@ class Saving:
         return f'{self.name}\t{self.entry_date.strftime(DATE_FORMAT)}\t{self.total}'
 
 
-def validate_range(str_value):
-    '''Check if entry data for date or total is in correct format and return the value(s) and comparision symbol(s), if not return False.'''
-    value_components =[value for value in re.split(r'([=><~]+)', str_value) if value != '']
-    if len(value_components) == 1:
-        value = value_components[0]
-        return [value]
-    elif len(value_components) == 2:
-        value = value_components[1]
-        evaluation = value_components[0]
-        if evaluation == '<=' or evaluation == '>=' or evaluation == '<' or evaluation == '>':
-            return value, evaluation
-        else:
-            return False
-    else:
-        value1 = value_components[0]
-        value2 = value_components[2]
-        evaluation = value_components[1]
-        if evaluation =='~':
-            return value1, value2, evaluation
-        else:
-            return False
+def read_ledger(path, fields, low_date=None, high_date=None, name=None):
+    '''Read ledger as pandas DataFrame typed by Ledger.Schema (Date as date type, Total as int64 cents or ExactFloat), without deleted rows. With a name match (Query Match)
+    matching few rows only those are read through the name index. With a date window only the rows inside it are read
+    through the date index, in date order. Otherwise (or when the window holds most of the rows) reads from the columnar
+    store when there is one or the whole TSV, callers filter the dates again. While serving
+    the table kept in memory is returned. A sharded ledger (see Ledger.Shards) is read shard by shard, only the
+    shards that can hold the date window'''
+    if is_sharded(path):
+        return read_shards(path, fields, low_date, high_date, name)
+    if MEMORY is not None:
+        return MEMORY.read(path, fields)
+    from Ledger.ColumnStore import ColumnStore, get_store_path
+    from Ledger.DateIndex import DateIndex
+    from Ledger.NameIndex import NameIndex
+    from Ledger.Schema import read_typed
+    store_path = get_store_path(path)
+    table = None
+    '''A sidecar another process replaces while it is read loses its files (FileNotFoundError): the next way of
+    reading the ledger is used instead'''
+    if name is not None:
+        with phase('name index'), suppress(FileNotFoundError):
+            table = NameIndex(path).read(name, NAME_INDEX_MAX_FRACTION)
+            if table is not None:
+                count_rows(len(table))
+    if table is None and (low_date is not None or high_date is not None):
+        with phase('date index'), suppress(FileNotFoundError):
+            table = DateIndex(path).read(low_date, high_date, DATE_INDEX_MAX_FRACTION)
+            if table is not None:
+                count_rows(len(table))
+    if table is None and os.path.isdir(store_path):
+        with phase('columnar store'), suppress(FileNotFoundError):
+            store = ColumnStore(store_path)
+            if not store.is_valid(path):
+                store = ColumnStore.build(path, store_path)
+            table = store.read(path)
+            count_rows(len(table))
+    if table is None:
+        table = read_typed(path)
+    with phase('journal'):
+        table = Journal(path, fields).apply(table)
+        count_rows(len(table))
+    return table
+
+def read_shards(path, fields, low_date=None, high_date=None, name=None):
+    '''Read the shards of a ledger that can hold dates low_date to high_date like read_ledger does, as one DataFrame
+    indexed by row position in the whole ledger'''
+    import pandas as pd
+    from Ledger.Schema import concat_typed, to_typed
+    with phase('shard catalog'):
+        catalog = ShardCatalog(path, fields)
+        keys = catalog.keys(low_date, high_date)
+        offsets = catalog.offsets()
+        count_rows(len(keys))
+    tables = []
+    for key in keys:
+        table = read_ledger(catalog.path(key), fields, low_date, high_date, name)
+        tables.append(table.set_axis(table.index + offsets[key], axis=0))
+    if not tables:
+        return to_typed(pd.DataFrame({field: [] for field in fields}, dtype=object))
+    return concat_typed(tables)
+
+def get_ledger_paths(path, fields, low_date=None, high_date=None):
+    '''Files of a ledger that can hold dates low_date to high_date: path itself or, when sharded, its shards in date order'''
+    if not is_sharded(path):
+        return [path]
+    catalog = ShardCatalog(path, fields)
+    return [catalog.path(key) for key in catalog.keys(low_date, high_date)]
+
+def get_bill_path(entry_date, create=False):
+    '''File holding the bills of entry_date: the bill csv file or, when sharded, the shard of that date.
+    A missing shard is created with create, its path returned anyway otherwise'''
+    if not is_sharded(FILE_PATH_FINANCES):
+        return FILE_PATH_FINANCES
+    catalog = ShardCatalog(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)
+    path = catalog.path(catalog.key(entry_date))
+    if create and not os.path.exists(path):
+        with ledger_lock(FILE_PATH_FINANCES):
+            path = catalog.create(catalog.key(entry_date))
+    return path
+
+def migrate_ledger(path, backend, fields=CSV_FINANCES_FIELDS):
+    '''Move ledger in path to columnar backend, to shards of one year or month or back to plain TSV, return the backend used'''
+    from Ledger.ColumnStore import ColumnStore, get_store_path
+    store_path = get_store_path(path)
+    with ledger_lock(path):
+        if is_sharded(path):
+            ShardCatalog(path, fields).merge(fsync=FSYNC)
+        if backend in PERIODS:
+            ShardCatalog.split(path, fields, backend, fsync=FSYNC)
+        elif backend == 'columnar':
+            ColumnStore.build(path, store_path)
+        elif os.path.isdir(store_path):
+            store = ColumnStore(store_path)
+            if not os.path.exists(path):
+                store.to_tsv(path)
+            store.drop()
+    return backend
 
 def get_range_month(str_date):
     '''Get date for first day and last day of corresponding month/year, return (first_date, last_date)'''
@@ -113,76 +213,13 @@ def get_range_month(str_date):
 
 def get_date_filter(str_date, table):
     '''Filter date in pandas DataFrame, return DataFrame or raise an Error'''
-    values = validate_range(str_date)
-    if values:
-        if len(values) == 1:
-            '''For evaluate ='''
-            date_value_str = values[0].split('/')
-            date_value = datetime.date(int(date_value_str[2]), int(date_value_str[1]), int(date_value_str[0]))
-            return table[table['Date'] == str(date_value)]
-        elif len(values) == 2:
-            '''For evaluate >, <, >= or <='''
-            date_value_str = values[0].split('/')
-            date_value = datetime.date(int(date_value_str[2]), int(date_value_str[1]), int(date_value_str[0]))
-            evaluation = values[1]
-            if evaluation == '>':
-                return table[table['Date'] > str(date_value)]
-            elif evaluation == '>=':
-                return table[table['Date'] >= str(date_value)]
-            elif evaluation == '<':
-                return table[table['Date'] < str(date_value)]
-            elif evaluation == '<=':
-                return table[table['Date'] <= str(date_value)]
-            else:
-                raise ValueError('Date filter in wrong format.')
-        else:
-            '''for evaluate a range'''
-            evaluation = values[2]
-            date_value_str1 = values[0].split('/')
-            date_value_str2 = values[1].split('/')
-            date_value1 = datetime.date(int(date_value_str1[2]), int(date_value_str1[1]), int(date_value_str1[0]))
-            date_value2 = datetime.date(int(date_value_str2[2]), int(date_value_str2[1]), int(date_value_str2[0]))
-
-            if evaluation == '~':
-                return table[(table['Date'] >= str(date_value1)) & (table['Date'] <= str(date_value2))]
-            else:
-                raise ValueError('Date filter in wrong format.')
-    else:
-        raise ValueError('Date filter in wrong format.')
+    from Ledger.Query import compile_query, DATE
+    return table[compile_query((('Date', DATE, str_date),)).mask(table)]
 
 def get_total_filter(str_total, table):
     '''Filter total in pandas DataFrame, return DataFrame or raise an Error'''
-    values = validate_range(str_total)
-    if values:
-        if len(values) == 1:
-            '''For evaluate ='''
-            total_value = values[0]
-            return table[table['Total'].astype(float) == float(total_value)]
-        elif len(values) == 2:
-            '''For evaluate >, <, >= or <='''
-            total_value = values[0]
-            evaluation = values[1]
-            if evaluation == '>':
-                return table[table['Total'].astype(float) > float(total_value)]
-            elif evaluation == '>=':
-                return table[table['Total'].astype(float) >= float(total_value)]
-            elif evaluation == '<':
-                return table[table['Total'].astype(float) < float(total_value)]
-            elif evaluation == '<=':
-                return table[table['Total'].astype(float) <= float(total_value)]
-            else:
-                raise ValueError('Total filter in wrong format.')
-        else:
-            '''for evaluate a range'''
-            total_value1 = values[0]
-            total_value2 = values[1]
-            evaluation = values[2]
-            if evaluation == '~':
-                return table[(table['Total'].astype(float) >= float(total_value1)) & (table['Total'].astype(float) <= float(total_value2))]
-            else:
-                raise ValueError('Total filter in wrong format.')
-    else:
-        raise ValueError('Total filter in wrong format.')
+    from Ledger.Query import compile_query, TOTAL
+    return table[compile_query((('Total', TOTAL, str_total),)).mask(table)]
 
 def get_bill_search_parameters(**kwargs):
     '''Create bill object with parameters given and ask for missing parameters'''
@@ -217,31 +254,66 @@ def get_bill_search_parameters(**kwargs):
     return {'name':name, 'category':category, 'essential':essential, 'date':date, 'total':total}
 
 
-def filter_bill_table(**kwargs):
-    '''Filter pandas DataFrame by Name, Category, Essential, Date and/or Total, return DataFrame'''
-    filter_data = get_bill_search_parameters(**kwargs)
-    name = filter_data['name']
-    category = filter_data['category']
-    essential = filter_data['essential']
-    date =  filter_data['date']
-    total = filter_data['total']
-    finance_table = pd.read_csv(FILE_PATH_FINANCES, sep='\t', header=0)
-    '''Make column Date into date type'''
-    finance_table['Date'] = pd.to_datetime(finance_table['Date'])
-    if name != None:
-        finance_table = finance_table[finance_table['Name'].str.contains(name)]
-    if category != None:
-        finance_table = finance_table[finance_table['Category'] == category]
-    if essential != None:
-        finance_table = finance_table[finance_table['Essential'] == essential]
-    if date != None:
-        finance_table = get_date_filter(date, finance_table)
-    if total != None:
-        finance_table = get_total_filter(total, finance_table)
-    finance_table = finance_table.sort_values(by='Date')
-    finance_table['Date'] = finance_table['Date'].dt.strftime(DATE_FORMAT)
+def filter_bill_table(match='contains', ignore_case=False, **kwargs):
+    '''Filter pandas DataFrame by Name, Category, Essential, Date and/or Total, ask for missing parameters, return DataFrame'''
+    return query_bill_table(**get_bill_search_parameters(**kwargs), match=match, ignore_case=ignore_case)
+
+def query_bill_table(name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Filter pandas DataFrame by Name, Category, Essential, Date and/or Total, return DataFrame.
+    match is how name is searched: contains or prefix (literal text) or regex'''
+    from Ledger.Schema import format_totals
+    finance_table = select_bill_table(name, category, essential, date, total, match, ignore_case)
+    with phase('format totals'):
+        finance_table = format_totals(finance_table)
+    with phase('strftime'):
+        finance_table['Date'] = finance_table['Date'].dt.strftime(DATE_FORMAT)
+    return finance_table
+
+def select_bill_table(name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Filter pandas DataFrame by Name, Category, Essential, Date and/or Total, return typed DataFrame (see Ledger.Schema) sorted by date'''
+    query = compile_bill_query(name, category, essential, date, total, match, ignore_case)
+    with phase('read ledger'):
+        finance_table = read_ledger(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, *query.bounds('Date'), name=query.predicate('Name'))
+    with phase('filter'):
+        finance_table = query.filter(finance_table)
+        count_rows(len(finance_table))
+    with phase('sort_values'):
+        finance_table = finance_table.sort_values(by='Date', kind='mergesort')
     return finance_table
 
+def stream_bill_table(name=None, category=None, essential=None, date=None, total=None, limit=None, offset=0, match='contains', ignore_case=False):
+    '''Filter csv file by Name, Category, Essential, Date and/or Total in constant memory, yield rows [index, name, category, essential, date, total] sorted by date'''
+    filter_chunk = lambda table: filter_bill_rows(table, name, category, essential, date, total, match, ignore_case)
+    bounds = compile_bill_query(name, category, essential, date, total, match, ignore_case).bounds('Date')
+    for row in stream_rows(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, filter_chunk, limit, offset, *bounds):
+        row[4] = datetime.date.fromisoformat(row[4]).strftime(DATE_FORMAT)
+        yield row
+
+def stream_rows(path, fields, filter_chunk, limit=None, offset=0, low_date=None, high_date=None):
+    '''Yield [position, *fields] of the ledger rows kept by filter_chunk sorted by date, see Ledger.Stream. Shards of a
+    sharded ledger are streamed one after the other in date order, only those that can hold low_date to high_date'''
+    from Ledger.Stream import stream_ledger
+    if not is_sharded(path):
+        yield from stream_ledger(path, fields, filter_chunk, limit, offset)
+        return
+    catalog = ShardCatalog(path, fields)
+    offsets = catalog.offsets()
+    keep = None if limit is None else offset + limit
+    rows = (
+        [position + offsets[key], *row] for key in catalog.keys(low_date, high_date)
+        for position, *row in stream_ledger(catalog.path(key), fields, filter_chunk, keep)
+    )
+    yield from islice(rows, offset, keep)
+
+def filter_bill_rows(finance_table, name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Filter pandas DataFrame of bills by Name, Category, Essential, Date and/or Total, return DataFrame'''
+    return compile_bill_query(name, category, essential, date, total, match, ignore_case).filter(finance_table)
+
+def compile_bill_query(name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Compile bill filters into one reusable Query'''
+    from Ledger.Query import compile_query, DATE, TOTAL, TEXT
+    return compile_query((('Name', match, name, ignore_case), ('Category', TEXT, category), ('Essential', TEXT, essential), ('Date', DATE, date), ('Total', TOTAL, total)))
+
 def get_bill_parameters(**kwargs):
     '''Create bill object with parameters given and ask for missing parameters'''
     if kwargs['name']:
@@ -272,24 +344,116 @@ def get_bill_parameters(**kwargs):
         total = total if total else None
     return Bill(name, category, essential, date, total)
 
+def get_bill_caches(path):
+    '''Caches recording the rows appended to the bill file path (the csv file or a shard): its aggregates and the
+    catalog of the shards'''
+    return [AggregateCache(path, CSV_FINANCES_FIELDS)] + ([ShardCatalog(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)] if path != FILE_PATH_FINANCES else [])
+
 def add_bill(bill):
     '''Add bill to csv file and return added bill as Bill object. entry bill must be [name, category, essential, date, total]'''
-    with open(FILE_PATH_FINANCES, 'a') as file:
-        writer = csv.DictWriter(file, CSV_FINANCES_FIELDS, delimiter='\t')
-        writer.writerow(bill.to_dict())
+    path = get_bill_path(bill.entry_date, create=True)
+    append_rows(path, CSV_FINANCES_FIELDS, [bill.to_dict()], get_caches=partial(get_bill_caches, path), fsync=FSYNC)
     return bill
 
 def delete_bill(bill):
     '''Remove bill from csv fil end return deleted bill as Bill object. exit bill must be [name, category, essential, date, total] '''
-    with open(FILE_PATH_FINANCES, 'r') as file:
-        table = [row for row in csv.DictReader(file, CSV_FINANCES_FIELDS, delimiter='\t') if (row['Name'] != bill.name) or (row['Category'] != bill.category) or (row['Essential'] != bill.essential) or (row['Date'] != str(bill.entry_date)) or (row['Total'] != str(bill.total)) ]
-    with open(FILE_PATH_FINANCES, 'w') as file:
-        writer = csv.DictWriter(file, CSV_FINANCES_FIELDS, delimiter='\t')
-        writer.writerows(table)
+    path = get_bill_path(bill.entry_date)
+    if not os.path.exists(path):
+        return bill
+    with ledger_lock(path):
+        aggregates = AggregateCache(path, CSV_FINANCES_FIELDS)
+        journal = Journal(path, CSV_FINANCES_FIELDS)
+        day_table = None
+        if aggregates.current:
+            '''Every live row equal to bill is deleted: the live rows of its day (read through the date index) that
+            the tombstone drops are the ones to remove from the aggregates'''
+            with suppress(ValueError):
+                day_table = read_ledger(path, CSV_FINANCES_FIELDS, bill.entry_date, bill.entry_date)
+        tombstones = journal.append(bill.to_dict(), fsync=FSYNC)
+        if day_table is not None:
+            aggregates.remove(bill.to_dict(), len(day_table) - len(journal.apply(day_table)))
+        else:
+            '''The rows could not be read: the month is recomputed on its next lookup'''
+            aggregates.invalidate(bill.to_dict())
+        if tombstones >= COMPACT_THRESHOLD:
+            compact_bill_file(path)
     return bill
 
-def get_bill_report(**kwargs):
-    '''Get month DataFrame. Return DataFrame and sum of total DataFrame column'''
+def delete_bills(name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False, dry_run=False):
+    '''Remove every bill matching the filters (same syntax as --show) in one pass over the csv file, return number of matching bills.
+    With dry_run only count them'''
+    return rewrite_bills(None, name, category, essential, date, total, match, ignore_case, dry_run)
+
+def update_bills(changes, name=None, category=None, essential=None, date=None, total=None, match='contains', ignore_case=False, dry_run=False):
+    '''Set the fields of changes (list of "Field=value") on every bill matching the filters in one pass over the csv file,
+    return number of matching bills. With dry_run only count them'''
+    return rewrite_bills(get_changes(changes, CSV_FINANCES_FIELDS), name, category, essential, date, total, match, ignore_case, dry_run)
+
+def rewrite_bills(changes, name, category, essential, date, total, match, ignore_case, dry_run):
+    '''Delete (changes None) or update the bills matching the filters, return number of matching bills'''
+    from Ledger.Bulk import rewrite_ledger
+    query = compile_bill_query(name, category, essential, date, total, match, ignore_case)
+    if not query.predicates:
+        raise ValueError('Filter not defined.')
+    matched = 0
+    moved = []
+    with ledger_lock(FILE_PATH_FINANCES):
+        target = get_bill_path(changes['Date']) if changes and 'Date' in changes else None
+        for path in get_ledger_paths(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, *query.bounds('Date')):
+            with ledger_lock(path):
+                aggregates = AggregateCache(path, CSV_FINANCES_FIELDS)
+                '''Rows getting a date of another shard are moved there once every shard was rewritten'''
+                rows = rewrite_ledger(path, CSV_FINANCES_FIELDS, query, changes, dry_run, fsync=FSYNC, moved=moved if target not in (None, path) else None)
+                if not rows and aggregates.current:
+                    '''Only the journal may have been compacted: the aggregates did not change'''
+                    aggregates.save()
+            matched += rows
+        if moved:
+            '''Appended like --add, so the aggregates and the catalog of the target shard record them'''
+            target = get_bill_path(changes['Date'], create=True)
+            rows = list(csv.DictReader(moved, fieldnames=CSV_FINANCES_FIELDS, delimiter='\t'))
+            append_rows(target, CSV_FINANCES_FIELDS, rows, get_caches=partial(get_bill_caches, target), fsync=FSYNC)
+    return matched
+
+def import_bills(path):
+    '''Add every valid bill of a csv/tsv file with columns [name, category, essential, date, total]. Return (imported, rejected, rejects file path)'''
+    from Ledger.Importer import import_ledger
+    with ledger_lock(FILE_PATH_FINANCES):
+        if not is_sharded(FILE_PATH_FINANCES):
+            aggregates = AggregateCache(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)
+            return import_ledger(path, FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, categories=CATEGORY_CHOICES, date_format=DATE_FORMAT, on_rows=aggregates.add_rows, fsync=FSYNC)
+        catalog = ShardCatalog(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)
+        caches = dict()
+        with ExitStack() as locks:
+            def get_path(entry_date):
+                '''Shard of a row, created and locked (its aggregates opened before writing) on first use'''
+                shard_path = catalog.path(catalog.key(entry_date))
+                if shard_path not in caches:
+                    catalog.create(catalog.key(entry_date))
+                    locks.enter_context(ledger_lock(shard_path))
+                    caches[shard_path] = AggregateCache(shard_path, CSV_FINANCES_FIELDS)
+                return shard_path
+            def on_rows(shard_path, rows):
+                caches[shard_path].add_rows(rows)
+                catalog.add_rows(rows)
+            return import_ledger(path, FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, categories=CATEGORY_CHOICES, date_format=DATE_FORMAT, on_rows=on_rows, fsync=FSYNC, get_path=get_path)
+
+def compact_bills():
+    '''Rewrite bill csv file (every shard when sharded) without deleted bills, return number of removed rows'''
+    with ledger_lock(FILE_PATH_FINANCES):
+        return sum(compact_bill_file(path) for path in get_ledger_paths(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS))
+
+def compact_bill_file(path):
+    '''Rewrite one bill file (the csv file or a shard) without deleted bills, return number of removed rows'''
+    with ledger_lock(path):
+        aggregates = AggregateCache(path, CSV_FINANCES_FIELDS)
+        removed = Journal(path, CSV_FINANCES_FIELDS).compact(fsync=FSYNC)
+        if aggregates.current:
+            aggregates.save()
+    return removed
+
+def get_bill_report_parameters(**kwargs):
+    '''Month (mm/yyyy) and category of a report, ask for missing parameters. Return (date, category)'''
     if kwargs['date']:
         date = str(kwargs['date']).strip()
     else:
@@ -301,17 +465,115 @@ def get_bill_report(**kwargs):
         print(f"Category options: {CATEGORY_CHOICES}")
         category = input("Bill category: ").strip()
         category = category if category else None
+    return date, category
+
+def get_bill_report(**kwargs):
+    '''Get month DataFrame. Return DataFrame and sum of total DataFrame column'''
+    date, category = get_bill_report_parameters(**kwargs)
     if date != None:
         date1, date2 = get_range_month(date)
-        finance_table = filter_bill_table(category=category, date=f'{date1}~{date2}')
-        total_list = [ExactFloat(str(total)) for total in finance_table['Total'].to_list()]
-        total = ExactFloat('0')
-        for value in total_list:
-            total =total + value
+        finance_table = query_bill_table(category=category, date=f'{date1}~{date2}')
+        with phase('ExactFloat total'):
+            total, rows = get_bill_total(date, category)
+            count_rows(rows)
         return finance_table, total
     else:
         raise ValueError('Total filter in wrong format.')
 
+def get_bill_total(date, category=None):
+    '''Exact total and number of the bills of month date (mm/yyyy) and category (None for all, or a filter expression
+    like --category), from the aggregate cache. Return (ExactFloat, rows)'''
+    query = compile_bill_query(category=category)
+    month, year = date.split('/')
+    path = get_bill_path(f'{int(year):04d}-{int(month):02d}-01')
+    if path != FILE_PATH_FINANCES and not os.path.exists(path):
+        '''No shard holds that month'''
+        return ExactFloat('0'), 0
+    return AggregateCache(path, CSV_FINANCES_FIELDS).total(year, month, query)
+
+def export_bill_report(path, **kwargs):
+    '''Write month report as .csv in directory path, return the file path'''
+    date, category = get_bill_report_parameters(**kwargs)
+    if date == None:
+        raise ValueError('Total filter in wrong format.')
+    return write_bill_report(path, date, category)
+
+def write_bill_report(path, date, category=None):
+    '''Write report of month date (mm/yyyy) and category (None for all) as .csv in directory path, return the file path'''
+    from Ledger.Export import write_report, get_report_stem, TSV
+    date1, date2 = get_range_month(date)
+    finance_table = select_bill_table(category=category, date=f'{date1}~{date2}')
+    if path[-1] != '/':
+        path = f'{path}/'
+    month, year = date.split('/')
+    file_path = f'{path}{get_report_stem(category, f"{year}-{month}")}'
+    with phase('to_csv'):
+        write_report(finance_table, file_path, [TSV])
+    return f'{file_path}.csv'
+
+def export_bill_months(path, first_month=None, last_month=None, category=None, by_category=False, formats='tsv', workers=None):
+    '''Write one month report per month from first_month to last_month (mm/yyyy), per category too with by_category,
+    in directory path, as tsv and/or parquet/feather, with a pool of workers processes. Return the manifest file path'''
+    from Ledger.Export import export_months, write_manifest, get_formats
+    from Ledger.Pivot import get_month_key
+    if first_month is None and last_month is None:
+        raise ValueError('Date filter in wrong format.')
+    first_month, last_month = get_month_key(first_month or last_month), get_month_key(last_month or first_month)
+    if first_month > last_month:
+        raise ValueError('Date filter in wrong format.')
+    formats = get_formats(formats)
+    date1, _ = get_range_month(f'{first_month[5:]}/{first_month[:4]}')
+    _, date2 = get_range_month(f'{last_month[5:]}/{last_month[:4]}')
+    finance_table = select_bill_table(category=category, date=f'{date1}~{date2}')
+    os.makedirs(path, exist_ok=True)
+    with phase('write reports'):
+        entries = export_months(finance_table, path, category, by_category, formats, workers)
+        count_rows(sum(entry['rows'] for entry in entries if entry['format'] == formats[0]))
+    first_month, last_month = f'{first_month[5:]}-{first_month[:4]}', f'{last_month[5:]}-{last_month[:4]}'
+    description = {
+        'ledger': FILE_PATH_FINANCES, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'from': first_month, 'to': last_month, 'category': category, 'by_category': by_category, 'formats': formats
+    }
+    return write_manifest(os.path.join(path, f'finance_report_manifest_{first_month}_{last_month}.json'), description, entries)
+
+def get_bill_pivot(first_month=None, last_month=None, group_by=None, category=None, essential=None):
+    '''Get totals, counts, essential split and month over month deltas of bills from first_month to last_month (mm/yyyy),
+    grouped by group_by (comma separated month, category, essential; month by default). Return DataFrame'''
+    from Ledger.Pivot import pivot, get_group_columns, get_month_key, get_previous_month
+    from Ledger.Query import compile_query, TEXT
+    if first_month is None and last_month is None:
+        raise ValueError('Date filter in wrong format.')
+    first_month, last_month = get_month_key(first_month or last_month), get_month_key(last_month or first_month)
+    if first_month > last_month:
+        raise ValueError('Date filter in wrong format.')
+    group_by = get_group_columns(group_by or 'month')
+    buckets, scale = get_bill_buckets(get_previous_month(first_month), last_month)
+    buckets = compile_query((('Category', TEXT, category), ('Essential', TEXT, essential))).filter(buckets)
+    return pivot(buckets, scale, first_month, last_month, group_by)
+
+def get_bill_buckets(first_month, last_month):
+    '''Aggregate buckets of months first_month to last_month ("yyyy-mm"), of every shard holding them when sharded.
+    Return (DataFrame, scale) like AggregateCache.frame'''
+    import pandas as pd
+    paths = get_ledger_paths(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS, f'{first_month}-01', f'{last_month}-31')
+    frames = [AggregateCache(path, CSV_FINANCES_FIELDS).frame(first_month, last_month) for path in paths]
+    if len(frames) == 1:
+        return frames[0]
+    if not frames:
+        return pd.DataFrame(columns=['Month', 'Category', 'Essential', 'Total', 'Count']).astype({'Total': 'int64', 'Count': 'int64'}), MIN_SCALE
+    scale = max(frame_scale for _, frame_scale in frames)
+    return pd.concat([frame.assign(Total=frame['Total'] * 10 ** (scale - frame_scale)) for frame, frame_scale in frames], ignore_index=True), scale
+
+def export_bill_pivot(path, pivot_table, first_month, last_month):
+    '''Write pivot report as .csv in directory path, return the file path'''
+    if path[-1] != '/':
+        path = f'{path}/'
+    first_month = (first_month or last_month).replace('/', '-')
+    last_month = (last_month or first_month).replace('/', '-')
+    file_path = f'{path}finance_pivot_{first_month}_{last_month}.csv'
+    pivot_table.to_csv(file_path, sep='\t', index=False)
+    return file_path
+
 def get_saving_search_parameters(**kwargs):
     '''Create saving object with parameters given and ask for missing parameters'''
     if kwargs['name']:
@@ -333,25 +595,85 @@ def get_saving_search_parameters(**kwargs):
         total = total if total else None
     return {'name':name, 'date':date, 'total':total}
 
-def filter_saving_table(**kwargs):
-    '''Filter pandas DataFrame by Name, Date and/or Total, return DataFrame'''
-    filter_data = get_saving_search_parameters(**kwargs)
-    name = filter_data['name']
-    date =  filter_data['date']
-    total = filter_data['total']
-    saving_table = pd.read_csv(FILE_PATH_SAVINGS, sep='\t', header=0)
-    '''Make column Date into date type'''
-    saving_table['Date'] = pd.to_datetime(saving_table['Date'])
-    if name != None:
-        saving_table = saving_table[saving_table['Name'].str.contains(name)]
-    if date != None:
-        saving_table = get_date_filter(date, saving_table)
-    if total != None:
-        saving_table = get_total_filter(total, saving_table)
-    saving_table = saving_table.sort_values(by='Date')
-    saving_table['Date'] = saving_table['Date'].dt.strftime(DATE_FORMAT)
+def filter_saving_table(match='contains', ignore_case=False, **kwargs):
+    '''Filter pandas DataFrame by Name, Date and/or Total, ask for missing parameters, return DataFrame'''
+    return query_saving_table(**get_saving_search_parameters(**kwargs), match=match, ignore_case=ignore_case)
+
+def query_saving_table(name=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Filter pandas DataFrame by Name, Date and/or Total, return DataFrame.
+    match is how name is searched: contains or prefix (literal text) or regex'''
+    from Ledger.Schema import format_totals
+    query = compile_saving_query(name, date, total, match, ignore_case)
+    with phase('read ledger'):
+        saving_table = read_ledger(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS, *query.bounds('Date'), name=query.predicate('Name'))
+    with phase('filter'):
+        saving_table = query.filter(saving_table)
+        count_rows(len(saving_table))
+    with phase('sort_values'):
+        saving_table = saving_table.sort_values(by='Date', kind='mergesort')
+    with phase('format totals'):
+        saving_table = format_totals(saving_table)
+    with phase('strftime'):
+        saving_table['Date'] = saving_table['Date'].dt.strftime(DATE_FORMAT)
     return saving_table
 
+def stream_saving_table(name=None, date=None, total=None, limit=None, offset=0, match='contains', ignore_case=False):
+    '''Filter csv file by Name, Date and/or Total in constant memory, yield rows [index, name, date, total] sorted by date'''
+    from Ledger.Stream import stream_ledger
+    filter_chunk = lambda table: filter_saving_rows(table, name, date, total, match, ignore_case)
+    for row in stream_ledger(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS, filter_chunk, limit, offset):
+        row[2] = datetime.date.fromisoformat(row[2]).strftime(DATE_FORMAT)
+        yield row
+
+def filter_saving_rows(saving_table, name=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Filter pandas DataFrame of savings by Name, Date and/or Total, return DataFrame'''
+    return compile_saving_query(name, date, total, match, ignore_case).filter(saving_table)
+
+def compile_saving_query(name=None, date=None, total=None, match='contains', ignore_case=False):
+    '''Compile saving filters into one reusable Query'''
+    from Ledger.Query import compile_query, DATE, TOTAL
+    return compile_query((('Name', match, name, ignore_case), ('Date', DATE, date), ('Total', TOTAL, total)))
+
+def get_changes(assignments, fields):
+    '''Convert ["Field=value", ...] of --set to dict field -> value as stored in the csv file, raise ValueError for unknown fields or values not valid'''
+    if not assignments:
+        raise ValueError('Changes not defined.')
+    names = {field.lower(): field for field in fields}
+    changes = dict()
+    for assignment in assignments:
+        field, separator, value = assignment.partition('=')
+        field, value = names.get(field.strip().lower()), value.strip()
+        if not separator or field is None:
+            raise ValueError('Field not valid.')
+        if field == 'Name' and not value:
+            raise ValueError('Name not defined.')
+        if field == 'Category' and not (value in CATEGORY_CHOICES):
+            raise ValueError('Category not valid.')
+        if field == 'Date':
+            try:
+                value = datetime.datetime.strptime(value, DATE_FORMAT).date().isoformat()
+            except ValueError:
+                raise ValueError('Date not valid.') from None
+        if field == 'Total':
+            try:
+                total = ExactFloat(value)
+            except (ValueError, IndexError):
+                raise ValueError('Total not valid.') from None
+            value = str(total)
+        changes[field] = value
+    return changes
+
+def page_table(table, limit=None, offset=0):
+    '''Return rows offset to offset + limit of a DataFrame'''
+    stop = None if limit is None else offset + limit
+    return table.iloc[offset:stop]
+
+def print_rows(fields, rows):
+    '''Print rows [index, *fields] as tab separated lines with a header'''
+    print('\t'.join(['', *fields]))
+    for row in rows:
+        print('\t'.join(str(value) for value in row))
+
 def get_saving_parameters(**kwargs):
     '''Create saving object with parameters given and ask for missing parameters'''
     if kwargs['name']:
@@ -360,11 +682,14 @@ def get_saving_parameters(**kwargs):
         name = input("Bill name: ").strip()
         name = name if name else None
     if kwargs['date']:
-        split_date = str(kwargs['date']).strip('/')
+        date = str(kwargs['date']).strip()
+    else:
+        date = input("Bill date(dd/mm/yyyy): ").strip()
+    if date:
+        split_date = date.split('/')
         date = datetime.date(int(split_date[2]), int(split_date[1]), int(split_date[0]))
     else:
-        date = input("Bill date: ").strip()
-        date = date if date else datetime.date.today()
+        date = datetime.date.today()
     if kwargs['total']:
         total = str(kwargs['total']).strip()
     else:
@@ -374,108 +699,403 @@ def get_saving_parameters(**kwargs):
 
 def add_saving(saving):
     '''Add saving to csv file and return added saving as Saving object. entry saving must be [name, total]'''
-    with open(FILE_PATH_SAVINGS, 'a') as file:
-        writer = csv.DictWriter(file, CSV_SAVING_FIELDS, delimiter='\t')
-        writer.writerow(saving.to_dict())
+    append_rows(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS, [saving.to_dict()], get_caches=lambda: [Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)], fsync=FSYNC)
     return saving
 
 def delete_saving(saving):
     '''Remove saving from csv fil end return deleted saving as Saving object. exit saving must be [name, date, total] '''
-    with open(FILE_PATH_SAVINGS, 'r') as file:
-        table = [row for row in csv.DictReader(file, CSV_SAVING_FIELDS, delimiter='\t') if (row['Name'] != saving.name) or (row['Date'] != str(saving.entry_date)) or (row['Total'] != str(saving.total)) ]
-    with open(FILE_PATH_SAVINGS, 'w') as file:
-        writer = csv.DictWriter(file, CSV_SAVING_FIELDS, delimiter='\t')
-        writer.writerows(table)
+    with ledger_lock(FILE_PATH_SAVINGS):
+        timeline = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)
+        if timeline.current:
+            '''Every live row equal to saving is deleted, count them before the tombstone hides them'''
+            saving_table = query_saving_table(name=saving.name, date=saving.entry_date.strftime(DATE_FORMAT), total=str(saving.total))
+            deleted = int((saving_table['Name'] == saving.name).sum())
+        tombstones = Journal(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS).append(saving.to_dict(), fsync=FSYNC)
+        if timeline.current:
+            timeline.remove(saving.to_dict(), deleted)
+        if tombstones >= COMPACT_THRESHOLD:
+            compact_savings()
     return saving
 
-def get_saving_report():
-    '''Get summary DataFrame. Return DataFrame of total savings'''
-    dict_savings = dict()
-    with open(FILE_PATH_SAVINGS, 'r') as file:
-        table = [row for row in csv.DictReader(file, CSV_SAVING_FIELDS, delimiter='\t')][1:]
-    for row in table:
-        total = ExactFloat(row['Total'])
-        if row['Name'] in dict_savings.keys():
-            dict_savings[row['Name']] += total
-        else:
-            dict_savings[row['Name']] = total
+def delete_savings(name=None, date=None, total=None, match='contains', ignore_case=False, dry_run=False):
+    '''Remove every saving matching the filters (same syntax as --show) in one pass over the csv file, return number of matching savings.
+    With dry_run only count them'''
+    return rewrite_savings(None, name, date, total, match, ignore_case, dry_run)
+
+def update_savings(changes, name=None, date=None, total=None, match='contains', ignore_case=False, dry_run=False):
+    '''Set the fields of changes (list of "Field=value") on every saving matching the filters in one pass over the csv file,
+    return number of matching savings. With dry_run only count them'''
+    return rewrite_savings(get_changes(changes, CSV_SAVING_FIELDS), name, date, total, match, ignore_case, dry_run)
+
+def rewrite_savings(changes, name, date, total, match, ignore_case, dry_run):
+    '''Delete (changes None) or update the savings matching the filters, return number of matching savings'''
+    from Ledger.Bulk import rewrite_ledger
+    query = compile_saving_query(name, date, total, match, ignore_case)
+    if not query.predicates:
+        raise ValueError('Filter not defined.')
+    with ledger_lock(FILE_PATH_SAVINGS):
+        timeline = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)
+        matched = rewrite_ledger(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS, query, changes, dry_run, fsync=FSYNC)
+        if not matched and timeline.current:
+            '''Only the journal may have been compacted: the balances did not change'''
+            timeline.save()
+    return matched
+
+def import_savings(path):
+    '''Add every valid saving of a csv/tsv file with columns [name, date, total]. Return (imported, rejected, rejects file path)'''
+    from Ledger.Importer import import_ledger
+    with ledger_lock(FILE_PATH_SAVINGS):
+        timeline = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)
+        return import_ledger(path, FILE_PATH_SAVINGS, CSV_SAVING_FIELDS, date_format=DATE_FORMAT, on_rows=timeline.add_rows, fsync=FSYNC)
+
+def compact_savings():
+    '''Rewrite saving csv file without deleted savings, return number of removed rows'''
+    with ledger_lock(FILE_PATH_SAVINGS):
+        timeline = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)
+        removed = Journal(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS).compact(fsync=FSYNC)
+        if timeline.current:
+            timeline.save()
+    return removed
+
+def get_saving_report(date=None):
+    '''Get summary DataFrame. Return DataFrame of total savings, as of date (dd/mm/yyyy) when given'''
+    import pandas as pd
+    if date:
+        split_date = date.split('/')
+        date = datetime.date(int(split_date[2]), int(split_date[1]), int(split_date[0]))
+    with phase('timeline balances'):
+        dict_savings = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS).balances(date)
+        count_rows(len(dict_savings))
     return pd.DataFrame.from_dict(dict_savings, orient='index', columns=['Total'])
 
+def get_saving_timeline(frequency='month'):
+    '''Get balance of every saving (columns) at the end of every day or month. Return DataFrame'''
+    timeline = Timeline(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS).series(frequency)
+    if frequency == 'month':
+        timeline.index = [f'{month[5:]}/{month[:4]}' for month in timeline.index]
+    else:
+        timeline.index = [datetime.date.fromisoformat(day).strftime(DATE_FORMAT) for day in timeline.index]
+    return timeline
+
+def get_bill_totals(date, category=None):
+    '''Exact total and number of the bills of month date (mm/yyyy) and category (None for all). Return DataFrame of one row'''
+    import pandas as pd
+    total, rows = get_bill_total(date, category)
+    return pd.DataFrame({'Rows': [rows], 'Total': [str(total)]})
+
+def get_saving_totals(date=None):
+    '''Total of every saving, as of date (dd/mm/yyyy) when given. Return DataFrame with Name and Total columns'''
+    return get_saving_report(date).rename_axis('Name').reset_index()
+
+def get_ledger_table(function, kwargs, name, directory):
+    '''Run function(**kwargs) of the API on the ledgers of directory, in a --batch worker. A path keyword is taken as
+    the root of one directory per ledger. Return the DataFrame (or file path as a File column) of function with a
+    first Ledger column name'''
+    import pandas as pd
+    if not os.path.isdir(directory):
+        raise ValueError('Ledger directory not found.')
+    set_ledger_directory(directory)
+    if 'path' not in kwargs:
+        result = function(**kwargs)
+    else:
+        path = os.path.join(kwargs['path'], name)
+        os.makedirs(path, exist_ok=True)
+        try:
+            result = function(**{**kwargs, 'path': path})
+        except Exception:
+            '''No empty directory for a ledger that failed'''
+            if not os.listdir(path):
+                os.rmdir(path)
+            raise
+    table = pd.DataFrame({'File': [result]}) if isinstance(result, str) else result.reset_index(drop=True)
+    table.insert(0, 'Ledger', name)
+    return table
+
+def run_batch(directories, function, kwargs, workers=None):
+    '''Run function(**kwargs) of the API (get_bill_totals, get_bill_pivot, write_bill_report, export_bill_months,
+    get_saving_totals...) on the ledgers of every directory with a pool of workers processes, all CPUs when None.
+    Exports go to one directory per ledger under path. A ledger that fails does not stop the others. Return
+    (DataFrame of every result with a Ledger column, DataFrame with Ledger and Error of the ledgers that failed)'''
+    import pandas as pd
+    from Ledger.Batch import get_ledger_names, run_ledgers
+    global LEDGER_DIRECTORY, FILE_PATH_FINANCES, FILE_PATH_SAVINGS, SOCKET_PATH
+    names = get_ledger_names(directories)
+    paths = LEDGER_DIRECTORY, FILE_PATH_FINANCES, FILE_PATH_SAVINGS, SOCKET_PATH
+    try:
+        with phase('batch'):
+            results = run_ledgers(partial(get_ledger_table, function, kwargs), list(zip(names, directories)), workers)
+            count_rows(len(results))
+    finally:
+        '''Workers run in this process with one worker'''
+        LEDGER_DIRECTORY, FILE_PATH_FINANCES, FILE_PATH_SAVINGS, SOCKET_PATH = paths
+    tables = [table for table, error in results if error is None]
+    errors = [(name, error) for name, (table, error) in zip(names, results) if error is not None]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame({'Ledger': []})
+    return table, pd.DataFrame(errors, columns=['Ledger', 'Error'])
+
+
+
+def serve():
+    '''Answer finances commands sent to SOCKET_PATH until interrupted, keeping the ledgers in memory'''
+    global MEMORY
+    from Ledger.Daemon import serve as serve_socket
+    from Ledger.Memory import LedgerMemory
+    create_file()
+    MEMORY = LedgerMemory()
+    read_ledger(FILE_PATH_FINANCES, CSV_FINANCES_FIELDS)
+    MEMORY.read(FILE_PATH_SAVINGS, CSV_SAVING_FIELDS)
+    print('Serving on', SOCKET_PATH)
+    try:
+        serve_socket(SOCKET_PATH, main)
+    finally:
+        MEMORY = None
+
+def get_parser():
+    '''Build the command line parser'''
+    parser = ArgumentParser(
+        prog='finances',
+        description='Manage personal finances.',
+        epilog=f'Run "finances serve" to start a daemon that keeps the ledgers in memory (those of --ledger-dir or $FINANCES_DIR when set); while it runs every command is sent to it through {SOCKET_PATH}.'
+    )
+    parser.add_argument('--bill', action='store_true', required=False, help=f'Select operations for bill.')
+    parser.add_argument('--saving', action='store_true', required=False, help='Select operations for savings.')
+    parser.add_argument('--add', '-a', action='store_true', required=False, help=f'Add bill or saving. Needs to defiend {CSV_FINANCES_FIELDS} commands for bill. Needs to defiend {[field for field in CSV_SAVING_FIELDS if field != "Date"]} commands for saving.')
+    parser.add_argument('--delete', '-d', action='store_true', required=False, help=f'Delete bill or saving. Needs to defiend {CSV_FINANCES_FIELDS} commands for bill. Needs to defiend {CSV_SAVING_FIELDS} commands for saving. With --where deletes every row matching the filters instead.')
+    parser.add_argument('--where', action='store_true', required=False, help='With --delete, delete every bill or saving matching NAME, CATEGORY, ESSENTIAL, DATE and TOTAL filters, same syntax as --show, in one pass over the file.')
+    parser.add_argument('--update', action='store_true', required=False, help='Change every bill or saving matching NAME, CATEGORY, ESSENTIAL, DATE and TOTAL filters, same syntax as --show, in one pass over the file. Needs --set.')
+    parser.add_argument('--set', action='append', metavar='FIELD=VALUE', required=False, help=f'With --update, new value of a field, e.g. --set Category=Health --set Total=12.50. Can be repeated. Fields {CSV_FINANCES_FIELDS} for bill and {CSV_SAVING_FIELDS} for saving, dates as dd/mm/yyyy.')
+    parser.add_argument('--dry-run', action='store_true', required=False, help='With --delete --where or --update, only print how many rows match, without changing the file.')
+    parser.add_argument('--show', '-s', action='store_true', required=False, help=f'Show all table of bill or saving. In guided filter click enter without filling for fields to not considere in filter.')
+    parser.add_argument('--name', '-N', required=False, help=f'bill or saving name. In filters it is searched as literal text contained in the name, see --match.')
+    parser.add_argument('--category', '-C', required=False, help=f'bill category. It must be one of those options {CATEGORY_CHOICES}. To show several categories separate them with | (or), ! excludes a category.')
+    parser.add_argument('--essential', '-E', required=False, help=f'bill essential value.')
+    parser.add_argument('--date', '-D', required=False, help=f'bill or saving date value. For dates in a range of greater than (>), greater or equal than (>=), smaller than (<), smaller or equal than (<=), adds its corresponding symbol at the start of the date as delimeters, and for a range between two dates, place the first date, then the symbol (~), and at the end the second date. Example 12/10/2021 for equal, >=12/10/2021 for grater or equal than, 12/10/2021~14/10/2021, for between the range. Conditions can be combined with | (or), & (and), ! (not) and parentheses, example 01/01/2021~31/01/2021|01/03/2021~31/03/2021.')
+    parser.add_argument('--total', '-T', required=False, help=f'bill or saving total value. For total in a range of greater than (>), greater or equal than (>=), smaller than (<), smaller or equal than (<=), adds its corresponding symbol at the start of the quantity as delimeters, and for a range between two quantities, place the first quantity, then the symbol (~), and at the end the second quantity. Example 120.00 for equal, >=120.00 for grater or equal than, 120.00~150.00 for between the range. Conditions can be combined with | (or), & (and), ! (not) and parentheses, example !100.00~200.00.')
+    parser.add_argument('--report', '-r', action='store_true', required=False, help=f'Shows bill month report or total saving. For bill report needs DATE argument, CATEGORY argument is optional. For saving report DATE (dd/mm/yyyy) is optional and gives the totals as of that date.')
+    parser.add_argument('--timeline', choices=['day', 'month'], required=False, help='Shows the running balance of every saving at the end of every day or month.')
+    parser.add_argument('--export', '-e', nargs=1, required=False, help=f'Exports report as .csv to given path. Needs DATE argument, CATEGORY argument is optional. With --from/--to exports the pivot report.')
+    parser.add_argument('--from', dest='from_month', required=False, help='First month (mm/yyyy) of a bill pivot report. Totals, counts, essential split and month over month deltas for every month up to --to, in one pass.')
+    parser.add_argument('--to', dest='to_month', required=False, help='Last month (mm/yyyy) of a bill pivot report, --from month by default.')
+    parser.add_argument('--group-by', required=False, help='Groups of a bill pivot report, comma separated from month, category, essential. Default month. CATEGORY and ESSENTIAL arguments filter the report.')
+    parser.add_argument('--archive', required=False, help='Export one bill report per month from --from to --to (mm/yyyy) to directory ARCHIVE in one pass, plus a JSON manifest of the files with their rows, exact total and SHA-256. CATEGORY argument filters the reports.')
+    parser.add_argument('--by-category', action='store_true', required=False, help='With --archive, one report per month and category.')
+    parser.add_argument('--format', default='tsv', required=False, help='With --archive, comma separated formats of the reports from tsv, parquet, feather (these two need pyarrow). Default tsv.')
+    parser.add_argument('--workers', type=int, required=False, help='Processes writing --archive reports or running --batch ledgers in parallel, all CPUs by default.')
+    parser.add_argument('--batch', required=False, help='Run the same bill --report (--date, or --from/--to pivot), --export, --archive or saving --report on the ledgers of every directory listed in file BATCH (- for standard input), one per line, with a pool of --workers processes. Prints one tab separated table of every result with a Ledger column; exports go to one directory per ledger under the export directory. Ledgers that fail are listed with their error on stderr and do not stop the others.')
+    parser.add_argument('--ledger-dir', required=False, help='Directory of finance.csv, savings.csv and the daemon socket. Default $FINANCES_DIR or ~/Documents/finances.')
+    parser.add_argument('--import', dest='import_path', required=False, help=f'Add every bill or saving of a .csv/.tsv file with a header row. Needs columns {CSV_FINANCES_FIELDS} for bill and {CSV_SAVING_FIELDS} for saving, dates as dd/mm/yyyy. Rows that are not valid are written with their line number to <file>.rejects.tsv.')
+    parser.add_argument('--compact', action='store_true', required=False, help=f'Rewrite bill or saving file without deleted entries. Runs by itself after {COMPACT_THRESHOLD} deletions.')
+    parser.add_argument('--migrate', choices=['columnar', 'tsv', *PERIODS], required=False, help='Move bill or saving ledger to the memory-mapped columnar backend, or back to plain TSV. The TSV file stays the source of truth, the columnar copy is refreshed when the TSV changes. For bills, year or month split the ledger into one file per year or month under <ledger>.shards with a catalog of their dates and row counts: queries, reports and exports with a date window only read the files holding it, add and delete write one file. tsv merges the files back.')
+    parser.add_argument('--stream', action='store_true', required=False, help='Show bill or saving table reading the file in chunks, in constant memory. Prints tab separated rows.')
+    parser.add_argument('--match', choices=['contains', 'prefix', 'regex'], default='contains', required=False, help='How NAME is searched in filters: as literal text anywhere in the name (contains), at its start (prefix) or as a regular expression (regex). Default contains.')
+    parser.add_argument('--ignore-case', '-i', action='store_true', required=False, help='Search NAME ignoring upper and lower case.')
+    parser.add_argument('--limit', type=int, required=False, help='Show at most LIMIT rows.')
+    parser.add_argument('--offset', type=int, default=0, required=False, help='Skip the first OFFSET rows of the result.')
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_ALWAYS, required=False, help='Force every write to disk before returning (always, default) or leave it to the operating system (never), faster but the last writes can be lost on power failure. Concurrent writers are always serialized by a lock on <ledger>.lock.')
+    parser.add_argument('--profile', nargs='?', const='text', choices=['text', 'json'], required=False, help='After the command, print to stderr the time, row count and peak memory of every phase (pandas import, reading, filter masks, sorting, formatting, sums) as a table (text, default) or as JSON.')
+    parser.add_argument('--stats', required=False, help='Run the command under cProfile and write its statistics to STATS, to read with "python -m pstats STATS".')
+    parser.add_argument('--local', action='store_true', required=False, help='Run the command in this process even if a daemon is serving.')
+    return parser
+
+def get_serve_parser():
+    '''Build the command line parser of "finances serve"'''
+    parser = ArgumentParser(prog='finances serve', description='Keep the ledgers in memory and answer the finances commands sent to the socket of their directory.')
+    parser.add_argument('--ledger-dir', required=False, help='Directory of finance.csv, savings.csv and the daemon socket. Default $FINANCES_DIR or ~/Documents/finances.')
+    return parser
+
+def main(argv=None):
+    '''Run the command line interface'''
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['serve']:
+        args = get_serve_parser().parse_args(argv[1:])
+        if args.ledger_dir:
+            set_ledger_directory(args.ledger_dir)
+        serve()
+        return
+    args = get_parser().parse_args(argv)
+    if args.ledger_dir:
+        set_ledger_directory(args.ledger_dir)
+    if MEMORY is None and not args.local and not args.batch and os.path.exists(SOCKET_PATH):
+        from Ledger.Daemon import forward
+        code = forward(SOCKET_PATH, argv)
+        if code is not None:
+            if code:
+                sys.exit(code)
+            return
+    global FSYNC
+    FSYNC = args.fsync
+    if not args.batch:
+        create_file()
+    if args.profile or args.stats:
+        profile_command(args)
+    else:
+        run_command(args)
+
+def profile_command(args):
+    '''Run the command recording its phases (--profile) and/or under cProfile (--stats), print the phases to stderr'''
+    from Ledger import Profile
+    profiler = None
+    if args.stats:
+        import cProfile
+        profiler = cProfile.Profile()
+    if args.profile:
+        Profile.start()
+    try:
+        if profiler:
+            profiler.enable()
+        if not args.add:
+            with phase('import pandas'):
+                import pandas
+        run_command(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.stats)
+        report = Profile.stop()
+        if report is not None:
+            print(Profile.format_report(report, args.profile), file=sys.stderr)
 
+def print_rewrite(rows, args):
+    '''Print the number of rows a bulk --delete --where or --update changed, or would change with --dry-run'''
+    if args.dry_run:
+        print('Matching rows:', rows)
+    elif args.update:
+        print('Updated rows:', rows)
+    else:
+        print('Deleted rows:', rows)
 
-parser = ArgumentParser(
-    prog='finances',
-    description='Manage personal finances.'
-)
-parser.add_argument('--bill', action='store_true', required=False, help=f'Select operations for bill.')
-parser.add_argument('--saving', action='store_true', required=False, help='Select operations for savings.')
-parser.add_argument('--add', '-a', action='store_true', required=False, help=f'Add bill or saving. Needs to defiend {CSV_FINANCES_FIELDS} commands for bill. Needs to defiend {filter(lambda f: f!="Date", CSV_SAVING_FIELDS)} commands for saving.')
-parser.add_argument('--delete', '-d', action='store_true', required=False, help=f'Delete bill or saving. Needs to defiend {CSV_FINANCES_FIELDS} commands for bill. Needs to defiend {CSV_SAVING_FIELDS} commands for saving.')
-parser.add_argument('--show', '-s', action='store_true', required=False, help=f'Show all table of bill or saving. In guided filter click enter without filling for fields to not considere in filter.')
-parser.add_argument('--name', '-N', required=False, help=f'bill or saving name.')
-parser.add_argument('--category', '-C', required=False, help=f'bill category. It must be one of those options {CATEGORY_CHOICES}.')
-parser.add_argument('--essential', '-E', required=False, help=f'bill essential value.')
-parser.add_argument('--date', '-D', required=False, help=f'bill or saving date value. For dates in a range of greater than (>), greater or equal than (>=), smaller than (<), smaller or equal than (<=), adds its corresponding symbol at the start of the date as delimeters, and for a range between two dates, place the first date, then the symbol (~), and at the end the second date. Example 12/10/2021 for equal, >=12/10/2021 for grater or equal than, 12/10/2021~14/10/2021, for between the range.')
-parser.add_argument('--total', '-T', required=False, help=f'bill or saving total value. For total in a range of greater than (>), greater or equal than (>=), smaller than (<), smaller or equal than (<=), adds its corresponding symbol at the start of the quantity as delimeters, and for a range between two quantities, place the first quantity, then the symbol (~), and at the end the second quantity. Example 120.00 for equal, >=120.00 for grater or equal than, 120.00~150.00 for between the range.')
-parser.add_argument('--report', '-r', action='store_true', required=False, help=f'Shows bill month report or total saving. For bill report needs DATE argument, CATEGORY argument is optional.')
-parser.add_argument('--export', '-e', nargs=1, required=False, help=f'Exports report as .csv to given path. Needs DATE argument, CATEGORY argument is optional.')
-args = parser.parse_args()
-
-
-create_file()
-
-if args.bill:
-    if args.delete:
-        bill = get_bill_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
-        bill = delete_bill(bill)
-        finance_table=filter_bill_table(name=bill.name, category=bill.category, essential=bill.essential, date=bill.entry_date.strftime(DATE_FORMAT), total=str(bill.total))
-        print(finance_table)
-        print('Deleted:', bill.to_dict())
-    elif args.add:
-        bill = get_bill_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
-        bill = add_bill(bill)
-        finance_table = filter_bill_table(name=bill.name, category=bill.category, essential=bill.essential, date=bill.entry_date.strftime(DATE_FORMAT), total=str(bill.total))
-        print(finance_table)
-    elif args.show:
-        finance_table = filter_bill_table(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
-        print(finance_table)
-    elif args.report:
-        finance_table, total = get_bill_report(category=args.category, date=args.date)
-        print(finance_table)
-        print(f'Total report: {total}')
-    elif args.export:
-        path = args.export[0]
-        finance_table, total = get_bill_report(category=args.category, date=args.date)
-        category = f'_{args.category}'
-        if args.category == None:
-            category = ''
-        if path[-1] != '/':
-            path = f'{path}/'
-        month, year = args.date.split('/')
-        finance_table['Date'] = pd.to_datetime(finance_table['Date'], format='%d/%m/%Y')
-        finance_table['Date'] = finance_table['Date'].dt.strftime('%Y-%m-%d')
-        finance_table.to_csv(f'{path}finance_report{category}_{month}-{year}.csv', sep='\t', index=False)
+def run_batch_command(args):
+    '''Run the command selected by the parsed arguments on every ledger directory listed in args.batch, print the
+    combined results and, on stderr, the ledgers that failed'''
+    import pandas as pd
+    from Ledger.Batch import read_directories
+    directories = read_directories(args.batch)
+    if args.bill and args.archive:
+        table, errors = run_batch(directories, export_bill_months, dict(path=args.archive, first_month=args.from_month, last_month=args.to_month, category=args.category, by_category=args.by_category, formats=args.format, workers=1), args.workers)
+    elif args.bill and (args.report or args.export) and (args.from_month or args.to_month or args.group_by):
+        table, errors = run_batch(directories, get_bill_pivot, dict(first_month=args.from_month, last_month=args.to_month, group_by=args.group_by, category=args.category, essential=args.essential), args.workers)
+        if args.export:
+            '''One pivot file of every ledger'''
+            table = pd.DataFrame({'File': [export_bill_pivot(args.export[0], table, args.from_month, args.to_month)]})
+    elif args.bill and (args.report or args.export):
+        date, category = get_bill_report_parameters(category=args.category, date=args.date)
+        if date == None:
+            raise ValueError('Total filter in wrong format.')
+        get_range_month(date)
+        if args.export:
+            table, errors = run_batch(directories, write_bill_report, dict(path=args.export[0], date=date, category=category), args.workers)
+        else:
+            table, errors = run_batch(directories, get_bill_totals, dict(date=date, category=category), args.workers)
+    elif args.saving and args.report:
+        table, errors = run_batch(directories, get_saving_totals, dict(date=args.date), args.workers)
     else:
         print('Error: Command failure')
-elif args.saving:
-    if args.delete:
-        saving = get_saving_parameters(name=args.name, date=args.date, total=args.total)
-        saving = delete_saving(saving)
-        finance_table=filter_saving_table(name=saving.name, date=saving.entry_date.strftime(DATE_FORMAT), total=str(saving.total))
-        print(finance_table)
-        print('Deleted:', saving.to_dict())
-    elif args.add:
-        saving = get_saving_parameters(name=args.name, date=args.date, total=args.total)
-        saving = add_saving(saving)
-        saving_table = filter_saving_table(name=saving.name, date=saving.entry_date.strftime(DATE_FORMAT), total=str(saving.total))
-        print(saving_table)
-    elif args.show:
-        saving_table = filter_saving_table(name=args.name, date=args.date, total=args.total)
-        print(saving_table)
-    elif args.report:
-        saving_table = get_saving_report()
-        print(saving_table)
+        return
+    table.to_csv(sys.stdout, sep='\t', index=False)
+    if len(errors):
+        errors.to_csv(sys.stderr, sep='\t', index=False)
+    print(f'Ledgers: {len(directories)}, Failed: {len(errors)}', file=sys.stderr)
+
+def run_command(args):
+    '''Run the command selected by the parsed arguments'''
+    if args.batch:
+        run_batch_command(args)
+    elif args.bill:
+        if args.migrate:
+            print('Ledger backend:', migrate_ledger(FILE_PATH_FINANCES, args.migrate))
+        elif args.compact:
+            print('Removed rows:', compact_bills())
+        elif args.import_path:
+            imported, rejected, reject_path = import_bills(args.import_path)
+            print(f'Imported: {imported}, Rejected: {rejected}')
+            if reject_path:
+                print('Rejected rows:', reject_path)
+        elif args.update or (args.delete and args.where):
+            filter_data = get_bill_search_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
+            if args.update:
+                rows = update_bills(args.set, **filter_data, match=args.match, ignore_case=args.ignore_case, dry_run=args.dry_run)
+            else:
+                rows = delete_bills(**filter_data, match=args.match, ignore_case=args.ignore_case, dry_run=args.dry_run)
+            print_rewrite(rows, args)
+        elif args.delete:
+            bill = get_bill_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
+            bill = delete_bill(bill)
+            finance_table=filter_bill_table(name=bill.name, category=bill.category, essential=bill.essential, date=bill.entry_date.strftime(DATE_FORMAT), total=str(bill.total))
+            print(finance_table)
+            print('Deleted:', bill.to_dict())
+        elif args.add:
+            bill = get_bill_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
+            bill = add_bill(bill)
+            print('\t'.join(CSV_FINANCES_FIELDS))
+            print(bill)
+        elif args.show and args.stream:
+            filter_data = get_bill_search_parameters(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total)
+            print_rows(CSV_FINANCES_FIELDS, stream_bill_table(**filter_data, limit=args.limit, offset=args.offset, match=args.match, ignore_case=args.ignore_case))
+        elif args.show:
+            finance_table = filter_bill_table(name=args.name, category=args.category, essential=args.essential, date=args.date, total=args.total, match=args.match, ignore_case=args.ignore_case)
+            print(page_table(finance_table, args.limit, args.offset))
+        elif args.archive:
+            print('Manifest:', export_bill_months(args.archive, args.from_month, args.to_month, args.category, args.by_category, args.format, args.workers))
+        elif (args.report or args.export) and (args.from_month or args.to_month or args.group_by):
+            finance_table = get_bill_pivot(args.from_month, args.to_month, args.group_by, category=args.category, essential=args.essential)
+            if args.export:
+                export_bill_pivot(args.export[0], finance_table, args.from_month, args.to_month)
+            else:
+                print(finance_table.to_string(index=False))
+        elif args.report:
+            finance_table, total = get_bill_report(category=args.category, date=args.date)
+            print(finance_table)
+            print(f'Total report: {total}')
+        elif args.export:
+            export_bill_report(args.export[0], category=args.category, date=args.date)
+        else:
+            print('Error: Command failure')
+    elif args.saving:
+        if args.migrate:
+            if args.migrate in PERIODS:
+                raise ValueError('Backend not valid for savings.')
+            print('Ledger backend:', migrate_ledger(FILE_PATH_SAVINGS, args.migrate, CSV_SAVING_FIELDS))
+        elif args.compact:
+            print('Removed rows:', compact_savings())
+        elif args.import_path:
+            imported, rejected, reject_path = import_savings(args.import_path)
+            print(f'Imported: {imported}, Rejected: {rejected}')
+            if reject_path:
+                print('Rejected rows:', reject_path)
+        elif args.update or (args.delete and args.where):
+            filter_data = get_saving_search_parameters(name=args.name, date=args.date, total=args.total)
+            if args.update:
+                rows = update_savings(args.set, **filter_data, match=args.match, ignore_case=args.ignore_case, dry_run=args.dry_run)
+            else:
+                rows = delete_savings(**filter_data, match=args.match, ignore_case=args.ignore_case, dry_run=args.dry_run)
+            print_rewrite(rows, args)
+        elif args.delete:
+            saving = get_saving_parameters(name=args.name, date=args.date, total=args.total)
+            saving = delete_saving(saving)
+            finance_table=filter_saving_table(name=saving.name, date=saving.entry_date.strftime(DATE_FORMAT), total=str(saving.total))
+            print(finance_table)
+            print('Deleted:', saving.to_dict())
+        elif args.add:
+            saving = get_saving_parameters(name=args.name, date=args.date, total=args.total)
+            saving = add_saving(saving)
+            print('\t'.join(CSV_SAVING_FIELDS))
+            print(saving)
+        elif args.show and args.stream:
+            filter_data = get_saving_search_parameters(name=args.name, date=args.date, total=args.total)
+            print_rows(CSV_SAVING_FIELDS, stream_saving_table(**filter_data, limit=args.limit, offset=args.offset, match=args.match, ignore_case=args.ignore_case))
+        elif args.show:
+            saving_table = filter_saving_table(name=args.name, date=args.date, total=args.total, match=args.match, ignore_case=args.ignore_case)
+            print(page_table(saving_table, args.limit, args.offset))
+        elif args.timeline:
+            print(get_saving_timeline(args.timeline))
+        elif args.report:
+            saving_table = get_saving_report(args.date)
+            print(saving_table)
+        else:
+            print('Error: Command failure')
     else:
         print('Error: Command failure')
-else:
-    print('Error: Command failure')
\ No newline at end of file
+
+
+if __name__ == '__main__':
+    main()
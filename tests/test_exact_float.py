@@ -0,0 +1,80 @@
+import unittest
+from decimal import Decimal, ROUND_HALF_EVEN as DECIMAL_HALF_EVEN, ROUND_HALF_UP as DECIMAL_HALF_UP, ROUND_DOWN as DECIMAL_DOWN, ROUND_UP as DECIMAL_UP, ROUND_FLOOR as DECIMAL_FLOOR, ROUND_CEILING as DECIMAL_CEILING
+
+from ExactCalc.ExactFloat import ExactFloat, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_DOWN, ROUND_UP, ROUND_FLOOR, ROUND_CEILING
+
+'''Rounding modes of ExactFloat and the decimal module ones they must agree with'''
+ROUNDINGS = {
+    ROUND_HALF_EVEN: DECIMAL_HALF_EVEN, ROUND_HALF_UP: DECIMAL_HALF_UP, ROUND_DOWN: DECIMAL_DOWN,
+    ROUND_UP: DECIMAL_UP, ROUND_FLOOR: DECIMAL_FLOOR, ROUND_CEILING: DECIMAL_CEILING
+}
+VALUES = ['0.125', '0.135', '-0.125', '-0.135', '2.5', '-2.5', '1.005', '-1.005', '0.001', '-0.001', '7', '-0.00', '123456789.987654321']
+
+
+class TestParse(unittest.TestCase):
+    def test_text(self):
+        self.assertEqual(str(ExactFloat('12.5')), '12.50')
+        self.assertEqual(str(ExactFloat('-3')), '-3.00')
+        self.assertEqual(str(ExactFloat('+.75')), '0.75')
+        self.assertEqual(str(ExactFloat(' 1.234 ')), '1.234')
+        self.assertEqual(str(ExactFloat(4)), '4.00')
+
+    def test_not_valid(self):
+        for text in ('', 'abc', '1e3', '1.2.3', '--1', '.'):
+            with self.assertRaises((ValueError, IndexError)):
+                ExactFloat(text)
+
+
+class TestRounding(unittest.TestCase):
+    def test_rescale_like_decimal(self):
+        for rounding, decimal_rounding in ROUNDINGS.items():
+            for value in VALUES:
+                for scale in (0, 1, 2):
+                    expected = Decimal(value).quantize(Decimal(1).scaleb(-scale), rounding=decimal_rounding)
+                    self.assertEqual(Decimal(str(ExactFloat(value).rescale(scale, rounding))), expected, (value, scale, rounding))
+
+    def test_rescale_up_keeps_value(self):
+        self.assertEqual(str(ExactFloat('1.5').rescale(4)), '1.5000')
+
+    def test_divide(self):
+        self.assertEqual(str(ExactFloat('10').divide(ExactFloat('3'))), '3.33')
+        self.assertEqual(str(ExactFloat('2').divide(ExactFloat('3'), 4)), '0.6667')
+        self.assertEqual(str(ExactFloat('0.05').divide(2)), '0.02')
+        self.assertEqual(str(ExactFloat('0.05').divide(2, rounding=ROUND_HALF_UP)), '0.03')
+        with self.assertRaises(ZeroDivisionError):
+            ExactFloat('1') / ExactFloat('0')
+
+
+class TestArithmetic(unittest.TestCase):
+    def test_exact_sums(self):
+        self.assertEqual(ExactFloat('0.1') + ExactFloat('0.2'), ExactFloat('0.3'))
+        self.assertEqual(str(ExactFloat('1.005') - ExactFloat('0.005')), '1.000')
+        self.assertEqual(str(ExactFloat('1.25') * 3), '3.75')
+        self.assertEqual(str(ExactFloat('1.5') * ExactFloat('1.5')), '2.2500')
+        self.assertEqual(str(ExactFloat.sum(['0.10', '0.005', ExactFloat('2')])), '2.105')
+        self.assertEqual(sum([ExactFloat('0.10'), ExactFloat('0.20')]), ExactFloat('0.30'))
+
+    def test_comparisons_across_scales(self):
+        self.assertEqual(ExactFloat('1.5'), ExactFloat('1.500'))
+        self.assertLess(ExactFloat('1.499'), ExactFloat('1.5'))
+        self.assertGreater(ExactFloat('2'), 1)
+        self.assertEqual(ExactFloat('3.00'), 3)
+        self.assertNotEqual(ExactFloat('3.01'), 3)
+
+
+class TestHash(unittest.TestCase):
+    def test_equal_values_hash_equally(self):
+        self.assertEqual(hash(ExactFloat('1.5')), hash(ExactFloat('1.500')))
+        self.assertEqual(hash(ExactFloat('-0.10')), hash(ExactFloat('-0.1000')))
+        self.assertEqual(len({ExactFloat('2.50'), ExactFloat('2.5000'), ExactFloat('2.5')}), 1)
+
+    def test_whole_values_hash_like_int(self):
+        for value in (0, 1, -7, 120, 10 ** 20):
+            self.assertEqual(hash(ExactFloat(str(value))), hash(value))
+            self.assertEqual(hash(ExactFloat(f'{value}.000')), hash(value))
+        self.assertEqual({ExactFloat('3.00'): 'a'}[3], 'a')
+        self.assertIn(ExactFloat('5'), {5})
+
+
+if __name__ == '__main__':
+    unittest.main()
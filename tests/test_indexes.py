@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Ledger.DateIndex import DateIndex
+from Ledger.NameIndex import NameIndex
+from Ledger.Query import Match, CONTAINS, PREFIX, REGEX
+from Ledger.Schema import read_typed
+from Ledger.Sidecar import find_row_starts
+
+HEADER = 'Name\tCategory\tEssential\tDate\tTotal\n'
+ROWS = [
+    'Rent\tHousing\tYes\t2021-01-01\t700.00\n', 'Bus\tTransport\tYes\t2021-01-05\t2.50\n',
+    'Cinema\tLeisure\tNo\t2021-02-10\t9.00\n', 'Market\tFood\tYes\t2021-02-11\t31.20\n',
+    'Rent\tHousing\tYes\t2021-02-01\t700.00\n', 'Train\tTransport\tNo\t2021-03-03\t14.75\n'
+]
+'''Lines read_csv skips, put between the rows'''
+BLANK_LINES = ['\n', '   \n', '\r\n']
+
+
+def write_ledger(path, lines):
+    with open(path, 'w', newline='') as file:
+        file.write(HEADER + ''.join(lines))
+
+def with_blank_lines(rows):
+    '''Rows with a blank line after every other one'''
+    lines = []
+    for index, row in enumerate(rows):
+        lines.append(row)
+        if index % 2 == 0:
+            lines.append(BLANK_LINES[index // 2 % len(BLANK_LINES)])
+    return lines
+
+
+class IndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'finance.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameRows(self, table, expected):
+        '''Same rows at the same positions as the TSV reader output'''
+        self.assertEqual(list(table.index), list(expected.index))
+        for field in expected.columns:
+            self.assertEqual(table[field].astype(str).tolist(), expected[field].astype(str).tolist(), field)
+
+
+class TestRowStarts(IndexTestCase):
+    def test_blank_lines_skipped(self):
+        write_ledger(self.path, with_blank_lines(ROWS))
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        starts = find_row_starts(self.path)
+        self.assertEqual(len(starts), len(ROWS) + 1)
+        for start, row in zip(starts[1:], ROWS):
+            self.assertTrue(data[start:].startswith(row.encode()))
+
+    def test_tab_only_line_is_a_row(self):
+        write_ledger(self.path, [ROWS[0], '\t\t\t\t\n', ROWS[1]])
+        self.assertEqual(len(find_row_starts(self.path)), 4)
+
+
+class TestDateIndex(IndexTestCase):
+    def check_windows(self):
+        expected = read_typed(self.path)
+        for low, high in (('2021-01-01', '2021-01-31'), ('2021-02-01', '2021-02-28'), (None, '2021-02-10'), ('2021-02-11', None)):
+            in_range = expected['Date'].between(low or '1970-01-01', high or '2100-01-01')
+            expected_rows = expected[in_range].sort_values('Date', kind='stable')
+            self.assertSameRows(DateIndex(self.path).read(low, high), expected_rows)
+
+    def test_read_like_fallback(self):
+        write_ledger(self.path, ROWS)
+        self.check_windows()
+
+    def test_read_like_fallback_with_blank_lines(self):
+        write_ledger(self.path, with_blank_lines(ROWS))
+        self.check_windows()
+
+    def test_appended_blank_lines(self):
+        write_ledger(self.path, ROWS[:3])
+        DateIndex(self.path)
+        with open(self.path, 'a', newline='') as file:
+            file.write(''.join(with_blank_lines(ROWS[3:])))
+        self.check_windows()
+
+
+class TestNameIndex(IndexTestCase):
+    def check_matches(self):
+        expected = read_typed(self.path)
+        for match in (Match(CONTAINS, 'rent', ignore_case=True), Match(PREFIX, 'Tr'), Match(REGEX, '^(Bus|Market)$'), Match(CONTAINS, 'none')):
+            expected_rows = expected[[match.matches(name) for name in expected['Name']]]
+            self.assertSameRows(NameIndex(self.path).read(match), expected_rows)
+
+    def test_read_like_fallback(self):
+        write_ledger(self.path, ROWS)
+        self.check_matches()
+
+    def test_read_like_fallback_with_blank_lines(self):
+        write_ledger(self.path, with_blank_lines(ROWS))
+        self.check_matches()
+
+    def test_appended_blank_lines(self):
+        write_ledger(self.path, with_blank_lines(ROWS[:3]))
+        NameIndex(self.path)
+        with open(self.path, 'a', newline='') as file:
+            file.write(''.join(with_blank_lines(ROWS[3:])))
+        self.check_matches()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Ledger.Files import count_lines
+from Ledger.Journal import Journal, count_rows, get_journal_path, normalize_total
+from Ledger.Schema import read_typed
+
+FIELDS = ['Name', 'Category', 'Essential', 'Date', 'Total']
+HEADER = 'Name\tCategory\tEssential\tDate\tTotal\n'
+RENT = {'Name': 'Rent', 'Category': 'Housing', 'Essential': 'Yes', 'Date': '2021-01-01', 'Total': '700.00'}
+BUS = {'Name': 'Bus', 'Category': 'Transport', 'Essential': 'Yes', 'Date': '2021-01-05', 'Total': '2.50'}
+CINEMA = {'Name': 'Cinema', 'Category': 'Leisure', 'Essential': 'No', 'Date': '2021-02-10', 'Total': '9.00'}
+
+
+def to_line(row):
+    return '\t'.join(row[field] for field in FIELDS) + '\n'
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'finance.csv')
+        self.journal = Journal(self.path, FIELDS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, *lines, mode='w'):
+        with open(self.path, mode, newline='') as file:
+            file.write(''.join(lines))
+
+    def live_names(self):
+        return self.journal.apply(read_typed(self.path))['Name'].tolist()
+
+
+class TestCountLines(unittest.TestCase):
+    def test_blank_lines(self):
+        self.assertEqual(count_lines(b'a\n\nb\n   \nc\r\n\r\n'), 3)
+        self.assertEqual(count_lines(b' \nx\n'), 1)
+
+    def test_tab_only_line_is_a_row(self):
+        self.assertEqual(count_lines(b'a\n\t\t\n'), 2)
+
+    def test_incomplete_line(self):
+        self.assertEqual(count_lines(b'a\nb'), 1)
+
+
+class TestApply(JournalTestCase):
+    def test_deleted_row_dropped(self):
+        self.write(HEADER, to_line(RENT), to_line(BUS), to_line(CINEMA))
+        self.journal.append(BUS)
+        self.assertEqual(self.live_names(), ['Rent', 'Cinema'])
+
+    def test_row_added_after_deletion_kept(self):
+        self.write(HEADER, to_line(RENT), to_line(BUS))
+        self.journal.append(BUS)
+        self.write(to_line(BUS), mode='a')
+        self.assertEqual(self.live_names(), ['Rent', 'Bus'])
+
+    def test_total_compared_by_value(self):
+        self.assertEqual(normalize_total('5.000'), '5.00')
+        self.assertEqual(normalize_total('5.125'), '5.125')
+        self.write(HEADER, to_line(RENT), to_line(BUS))
+        self.journal.append({**RENT, 'Total': '700'})
+        self.assertEqual(self.live_names(), ['Bus'])
+
+    def test_blank_lines_are_not_rows(self):
+        self.write(HEADER, to_line(RENT), '\n', '   \n', to_line(BUS), '\r\n')
+        self.assertEqual(count_rows(self.path, [os.path.getsize(self.path)]), {os.path.getsize(self.path): 2})
+        self.journal.append(BUS)
+        self.write(to_line(BUS), mode='a')
+        self.assertEqual(self.live_names(), ['Rent', 'Bus'])
+
+    def test_chunk_with_cutoffs(self):
+        self.write(HEADER, to_line(RENT), to_line(BUS), to_line(CINEMA))
+        self.journal.append(RENT)
+        table = read_typed(self.path)
+        cutoffs = self.journal.cutoffs()
+        self.assertEqual(self.journal.apply(table.iloc[:1], cutoffs)['Name'].tolist(), [])
+        self.assertEqual(self.journal.apply(table.iloc[1:], cutoffs)['Name'].tolist(), ['Bus', 'Cinema'])
+
+
+class TestCompact(JournalTestCase):
+    def test_compact_like_apply(self):
+        self.write(HEADER, to_line(RENT), '\n', to_line(BUS), '  \n', to_line(CINEMA))
+        self.journal.append(BUS)
+        self.write(to_line(BUS), mode='a')
+        self.journal.append(RENT)
+        expected = self.live_names()
+        self.assertEqual(self.journal.compact(), 2)
+        self.assertFalse(os.path.exists(get_journal_path(self.path)))
+        self.assertEqual(read_typed(self.path)['Name'].tolist(), expected)
+        self.assertEqual(expected, ['Cinema', 'Bus'])
+
+    def test_iter_rows_like_apply(self):
+        self.write(HEADER, to_line(RENT), '   \n', to_line(BUS), to_line(CINEMA))
+        self.journal.append(CINEMA)
+        with open(self.path, 'r', newline='') as file:
+            self.assertEqual([row['Name'] for row in self.journal.iter_rows(file)], self.live_names())
+
+    def test_nothing_to_compact(self):
+        self.write(HEADER, to_line(RENT))
+        self.assertEqual(self.journal.compact(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
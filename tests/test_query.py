@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ExactCalc.ExactFloat import ExactFloat
+from Ledger.Query import And, Compare, Match, Not, Or, Range, compile_filter, compile_query, DATE, TOTAL, TEXT, CONTAINS, PREFIX, REGEX
+
+TABLE = pd.DataFrame({
+    'Name': ['Rent', 'Bus', 'Cinema', 'Market', 'rental car'],
+    'Category': pd.Categorical(['Housing', 'Transport', 'Leisure', 'Food', 'Transport']),
+    'Date': pd.to_datetime(['2021-01-01', '2021-01-05', '2021-02-10', '2021-02-11', '2021-03-03']),
+    'Total': np.array([70000, 250, 900, 3120, 1475], dtype=np.int64)
+})
+
+
+def names(kind, field, expression):
+    return TABLE['Name'][np.asarray(compile_filter(kind, expression).mask(TABLE[field]), dtype=bool)].tolist()
+
+
+class TestParse(unittest.TestCase):
+    def test_tree(self):
+        node = compile_filter(TEXT, '(Food|Housing)&!Leisure')
+        self.assertIsInstance(node, And)
+        self.assertIsInstance(node.operands[0], Or)
+        self.assertIsInstance(node.operands[1], Not)
+        self.assertIsInstance(compile_filter(DATE, '01/01/2021~31/01/2021'), Range)
+        self.assertIsInstance(compile_filter(TOTAL, '>=10'), Compare)
+
+    def test_precedence(self):
+        '''& binds tighter than |'''
+        node = compile_filter(TEXT, 'Food|Housing&Transport')
+        self.assertIsInstance(node, Or)
+        self.assertIsInstance(node.operands[1], And)
+
+    def test_values(self):
+        self.assertEqual(compile_filter(DATE, '05/01/2021').value, np.datetime64('2021-01-05'))
+        self.assertEqual(compile_filter(TOTAL, '<2.5').value, ExactFloat('2.50'))
+
+    def test_not_valid(self):
+        for kind, expression in ((DATE, '2021-01-01'), (DATE, '01/01/2021~'), (TOTAL, 'abc'), (TOTAL, '>'), (TEXT, '>Food'),
+                                 (TEXT, 'a~b'), (TEXT, '(Food'), (TEXT, 'Food)'), (TEXT, 'Food|'), (REGEX, '(')):
+            with self.assertRaises(ValueError, msg=(kind, expression)):
+                compile_filter(kind, expression)
+
+
+class TestMask(unittest.TestCase):
+    def test_text(self):
+        self.assertEqual(names(TEXT, 'Category', 'Transport'), ['Bus', 'rental car'])
+        self.assertEqual(names(TEXT, 'Category', 'Food|Housing'), ['Rent', 'Market'])
+        self.assertEqual(names(TEXT, 'Category', '!Transport'), ['Rent', 'Cinema', 'Market'])
+
+    def test_date(self):
+        self.assertEqual(names(DATE, 'Date', '>=10/02/2021'), ['Cinema', 'Market', 'rental car'])
+        self.assertEqual(names(DATE, 'Date', '01/01/2021~31/01/2021|03/03/2021'), ['Rent', 'Bus', 'rental car'])
+
+    def test_total(self):
+        self.assertEqual(names(TOTAL, 'Total', '<10'), ['Bus', 'Cinema'])
+        self.assertEqual(names(TOTAL, 'Total', '!9~700'), ['Bus'])
+        self.assertEqual(names(TOTAL, 'Total', '2.5'), ['Bus'])
+        self.assertEqual(names(TOTAL, 'Total', '2.505'), [])
+
+    def test_exact_total_column(self):
+        column = pd.Series([ExactFloat('2.505'), ExactFloat('2.50')], dtype=object)
+        self.assertEqual(compile_filter(TOTAL, '2.505').mask(column).tolist(), [True, False])
+
+    def test_name_matches(self):
+        self.assertEqual(Match(CONTAINS, 'ent').mask(TABLE['Name']).tolist(), [True, False, False, False, True])
+        self.assertEqual(Match(PREFIX, 'rent', ignore_case=True).mask(TABLE['Name']).tolist(), [True, False, False, False, True])
+        self.assertEqual(Match(REGEX, '^(Bus|Market)$').mask(TABLE['Name']).tolist(), [False, True, False, True, False])
+
+
+class TestQuery(unittest.TestCase):
+    def test_conjunction(self):
+        query = compile_query((('Name', CONTAINS, 'r', True), ('Category', TEXT, '!Food'), ('Date', DATE, '>01/01/2021'), ('Total', TOTAL, None)))
+        self.assertEqual(query.filter(TABLE)['Name'].tolist(), ['rental car'])
+
+    def test_bounds(self):
+        query = compile_query((('Date', DATE, '>=01/02/2021&<=28/02/2021'),))
+        self.assertEqual(query.bounds('Date'), (np.datetime64('2021-02-01'), np.datetime64('2021-02-28')))
+        self.assertEqual(compile_query((('Date', DATE, '!01/02/2021'),)).bounds('Date'), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
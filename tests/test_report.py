@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import finances
+from ExactCalc.ExactFloat import ExactFloat
+
+ROWS = [
+    ('Rent', 'Housing', 'Yes', '2021-10-01', '700.00'), ('Bus', 'Transport', 'Yes', '2021-10-05', '2.50'),
+    ('Train', 'Transport', '', '2021-10-06', '14.755'), ('Market', 'Food', 'Yes', '2021-10-11', '31.20'),
+    ('Market', 'Food', 'Yes', '2021-10-11', '31.20'), ('Cinema', 'Recreation', 'No', '2021-10-20', '9.00'),
+    ('Rent', 'Housing', 'Yes', '2021-11-01', '700.00')
+]
+CATEGORIES = [None, 'Food', 'Housing|Transport', '!Housing', '(Food|Transport)&!Food', 'Taxes']
+
+
+class TestReportTotal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.ledger_directory = finances.LEDGER_DIRECTORY
+        finances.set_ledger_directory(self.directory)
+        finances.create_file()
+        with open(finances.FILE_PATH_FINANCES, 'a', newline='') as file:
+            for index, row in enumerate(ROWS):
+                file.write('\t'.join(row) + '\n' + ('\n' if index == 2 else ''))
+
+    def tearDown(self):
+        finances.set_ledger_directory(self.ledger_directory)
+        shutil.rmtree(self.directory)
+
+    def assertTotalOfRows(self, category):
+        '''The total of the report, from the aggregate cache, is the sum of the rows it lists'''
+        table = finances.query_bill_table(category=category, date='01/10/2021~31/10/2021')
+        total, rows = finances.get_bill_total('10/2021', category)
+        self.assertEqual(total, ExactFloat.sum(table['Total'].tolist()), category)
+        self.assertEqual(rows, len(table), category)
+        if category is not None:
+            self.assertEqual(finances.get_bill_report(date='10/2021', category=category)[1], total)
+
+    def test_total_of_listed_rows(self):
+        for category in CATEGORIES:
+            self.assertTotalOfRows(category)
+
+    def test_total_after_add_and_delete(self):
+        finances.get_bill_total('10/2021')
+        finances.add_bill(finances.Bill('Taxi', 'Transport', 'No', '07/10/2021', '20.125'))
+        finances.delete_bill(finances.Bill('Market', 'Food', 'Yes', '11/10/2021', '31.2'))
+        for category in CATEGORIES:
+            self.assertTotalOfRows(category)
+        self.assertEqual(finances.get_bill_total('10/2021', 'Food'), (ExactFloat('0'), 0))
+
+    def test_total_after_moving_rows_to_another_shard(self):
+        finances.migrate_ledger(finances.FILE_PATH_FINANCES, 'month')
+        for date in ('10/2021', '11/2021'):
+            finances.get_bill_total(date)
+        self.assertEqual(finances.update_bills(['Date=15/11/2021'], name='Market'), 2)
+        '''The moved rows were recorded, the aggregates of the target shard are not rebuilt'''
+        self.assertTrue(finances.AggregateCache(finances.get_bill_path('2021-11-01'), finances.CSV_FINANCES_FIELDS).current)
+        table = finances.query_bill_table(category='Food', date='01/11/2021~30/11/2021')
+        self.assertEqual(len(table), 2)
+        self.assertEqual(finances.get_bill_total('11/2021', 'Food'), (ExactFloat('62.40'), 2))
+        self.assertEqual(finances.get_bill_total('10/2021', 'Food'), (ExactFloat('0'), 0))
+
+    def test_export_file_name(self):
+        path = finances.write_bill_report(self.directory, '10/2021', 'Housing|Transport')
+        self.assertEqual(os.path.basename(path), 'finance_report_Housing-Transport_10-2021.csv')
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Ledger.Writer import FSYNC_NEVER, append_rows, commit, format_rows, get_committing_path, get_spool_path, spool_rows
+
+FIELDS = ['Name', 'Date', 'Total']
+HEADER = 'Name\tDate\tTotal\n'
+ROWS = [{'Name': 'Bank', 'Date': '2021-01-01', 'Total': '100.00'}, {'Name': 'Fund', 'Date': '2021-01-02', 'Total': '20.50'}]
+MORE_ROWS = [{'Name': 'Bank', 'Date': '2021-02-01', 'Total': '5.00'}]
+
+
+class TestCommit(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'savings.csv')
+        with open(self.path, 'w', newline='') as file:
+            file.write(HEADER)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path, 'r', newline='') as file:
+            return file.read()
+
+    def crash_during_commit(self, rows, written):
+        '''State left by a writer that renamed a spool file of rows to .committing and wrote its first written bytes'''
+        path = spool_rows(self.path, FIELDS, rows)
+        ledger = os.stat(self.path)
+        os.replace(path, get_committing_path(path, ledger.st_ino, ledger.st_size))
+        with open(self.path, 'ab') as file:
+            file.write(format_rows(FIELDS, rows)[:written])
+
+    def test_append(self):
+        self.assertEqual(append_rows(self.path, FIELDS, ROWS, fsync=FSYNC_NEVER), 2)
+        self.assertEqual(self.read(), HEADER + format_rows(FIELDS, ROWS).decode())
+        self.assertEqual(os.listdir(get_spool_path(self.path)) if os.path.isdir(get_spool_path(self.path)) else [], [])
+
+    def test_spooled_rows_committed_first(self):
+        spool_rows(self.path, FIELDS, ROWS)
+        self.assertEqual(len(commit(self.path, FIELDS, fsync=FSYNC_NEVER, data=format_rows(FIELDS, MORE_ROWS))), 3)
+        self.assertEqual(self.read(), HEADER + format_rows(FIELDS, ROWS + MORE_ROWS).decode())
+
+    def test_crash_after_write_not_committed_again(self):
+        self.crash_during_commit(ROWS, len(format_rows(FIELDS, ROWS)))
+        self.assertEqual(len(commit(self.path, FIELDS, fsync=FSYNC_NEVER, data=format_rows(FIELDS, MORE_ROWS))), 1)
+        self.assertEqual(self.read(), HEADER + format_rows(FIELDS, ROWS + MORE_ROWS).decode())
+        self.assertEqual(os.listdir(get_spool_path(self.path)), [])
+
+    def test_crash_before_write_committed(self):
+        self.crash_during_commit(ROWS, 0)
+        self.assertEqual(len(commit(self.path, FIELDS, fsync=FSYNC_NEVER)), 2)
+        self.assertEqual(self.read(), HEADER + format_rows(FIELDS, ROWS).decode())
+
+    def test_torn_write_cut_and_committed(self):
+        self.crash_during_commit(ROWS, 7)
+        self.assertEqual(len(commit(self.path, FIELDS, fsync=FSYNC_NEVER)), 2)
+        self.assertEqual(self.read(), HEADER + format_rows(FIELDS, ROWS).decode())
+
+
+if __name__ == '__main__':
+    unittest.main()